@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+from prometheus_client import Counter, Gauge
+
+
+# رموز الحالة التي تدل على حمل زائد لدى المزود
+OVERLOAD_STATUS_CODES = (429, 503)
+OVERLOAD_ERROR_NAMES = ('ResourceExhausted', 'ServiceUnavailable', 'TooManyRequests')
+TIMEOUT_ERROR_NAMES = ('DeadlineExceeded', 'TimeoutError')
+
+# مقاييس المحدد
+LIMITER_CONCURRENCY_LIMIT = Gauge(
+    'adaptive_limiter_concurrency_limit',
+    'Current adaptive concurrency limit',
+    ['limiter']
+)
+LIMITER_IN_FLIGHT = Gauge(
+    'adaptive_limiter_in_flight',
+    'Number of calls currently holding a limiter slot',
+    ['limiter']
+)
+LIMITER_DECREASES = Counter(
+    'adaptive_limiter_decreases_total',
+    'Multiplicative decreases of the concurrency limit',
+    ['limiter', 'reason']
+)
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """هل الخطأ رفض من المزود بسبب الحمل (429/503)"""
+    code = getattr(error, 'code', None)
+    try:
+        if int(code) in OVERLOAD_STATUS_CODES:
+            return True
+    except (TypeError, ValueError):
+        pass
+    return type(error).__name__ in OVERLOAD_ERROR_NAMES
+
+
+def is_timeout_error(error: BaseException) -> bool:
+    """هل الخطأ انتهاء مهلة الاستدعاء"""
+    return isinstance(error, asyncio.TimeoutError) or type(error).__name__ in TIMEOUT_ERROR_NAMES
+
+
+class AdaptiveConcurrencyLimiter:
+    """حد تزامن متكيف (AIMD): زيادة جمعية ما دام الزمن مستقراً وخفض ضربي عند 429/503 أو قفزات الزمن"""
+
+    def __init__(
+            self,
+            name: str = 'default',
+            initial_limit: int = 4,
+            min_limit: int = 1,
+            max_limit: int = 32,
+            decrease_factor: float = 0.5,
+            latency_tolerance: float = 2.0,
+            baseline_window: int = 50,
+            spike_threshold: int = 3,
+            decrease_cooldown: float = 1.0
+    ):
+        if min_limit < 1 or max_limit < min_limit:
+            raise ValueError("limits must satisfy 1 <= min_limit <= max_limit")
+        if not 0 < decrease_factor < 1:
+            raise ValueError("decrease_factor must be in (0, 1)")
+        if latency_tolerance <= 1:
+            raise ValueError("latency_tolerance must be greater than 1")
+        if baseline_window < 1 or spike_threshold < 1:
+            raise ValueError("baseline_window and spike_threshold must be positive")
+
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.baseline_window = baseline_window
+        self.spike_threshold = spike_threshold
+        self.decrease_cooldown = decrease_cooldown
+
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # نافذة أزمنة كل فئة استدعاء (مثل رقم المهمة) ووسيطها هو المرجع لكشف القفزات
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._spikes: Dict[str, int] = {}
+        self._last_decrease = float('-inf')
+        self._update_metrics()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def acquire(self) -> None:
+        """حجز مكان ضمن الحد الحالي"""
+        if not self._waiters and self._in_flight < self.limit:
+            self._in_flight += 1
+            self._update_metrics()
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # تم منح المكان قبل الإلغاء مباشرة
+                self.release()
+            else:
+                self._waiters.remove(future)
+            raise
+
+    def release(self) -> None:
+        """تحرير مكان ومنحه للمنتظرين إن سمح الحد"""
+        self._in_flight = max(0, self._in_flight - 1)
+        self._wake_waiters()
+
+    @asynccontextmanager
+    async def slot(self, key: str = 'default'):
+        """حجز مكان وقياس الاستدعاء لتعديل الحد (key: فئة الاستدعاء ذات الزمن المرجعي الخاص)"""
+        await self.acquire()
+        saturated = self._in_flight >= self.limit
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            if is_overload_error(e):
+                self.on_overload('rejected')
+            elif is_timeout_error(e):
+                self.on_overload('timeout')
+            raise
+        else:
+            self.on_success(time.monotonic() - started, saturated, key)
+        finally:
+            self.release()
+
+    def baseline(self, key: str = 'default') -> Optional[float]:
+        """الزمن المرجعي لفئة الاستدعاء: وسيط نافذة أزمنتها الأخيرة"""
+        window = self._latencies.get(key)
+        if not window:
+            return None
+        ordered = sorted(window)
+        return ordered[(len(ordered) - 1) // 2]
+
+    def on_success(self, latency: float, saturated: bool = True, key: str = 'default') -> None:
+        """زيادة الحد عند استقرار الزمن وخفضه عند تكرار القفزات مقارنة بوسيط زمن فئة الاستدعاء"""
+        baseline = self.baseline(key)
+        # القفزات تدخل النافذة أيضاً فيلحق الوسيط بأي تحول دائم في مستوى الأزمنة
+        self._latencies.setdefault(key, deque(maxlen=self.baseline_window)).append(latency)
+
+        if baseline is not None and latency > baseline * self.latency_tolerance:
+            # تفاوت أزمنة التوليد مع طول المخرجات طبيعي؛ الخفض عند تكرار القفزة فقط
+            self._spikes[key] = self._spikes.get(key, 0) + 1
+            if self._spikes[key] >= self.spike_threshold:
+                self._spikes[key] = 0
+                self.on_overload('latency')
+            return
+        self._spikes[key] = 0
+
+        # لا يرتفع الحد إلا إذا كان مستغلاً بالكامل (تجنب تضخمه وقت الهدوء)
+        if saturated and self._limit < self.max_limit:
+            self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+            self._wake_waiters()
+
+    def on_overload(self, reason: str) -> None:
+        """خفض ضربي للحد (مرة واحدة لكل موجة رفض)"""
+        now = time.monotonic()
+        if now - self._last_decrease < self.decrease_cooldown:
+            return
+
+        self._last_decrease = now
+        previous = self.limit
+        self._limit = max(float(self.min_limit), self._limit * self.decrease_factor)
+        LIMITER_DECREASES.labels(limiter=self.name, reason=reason).inc()
+        self._update_metrics()
+        logging.warning(
+            f"Limiter {self.name} decreased concurrency {previous} -> {self.limit} ({reason})"
+        )
+
+    def _wake_waiters(self) -> None:
+        while self._waiters and self._in_flight < self.limit:
+            future = self._waiters.popleft()
+            if future.done():
+                continue
+            self._in_flight += 1
+            future.set_result(None)
+        self._update_metrics()
+
+    def _update_metrics(self) -> None:
+        LIMITER_CONCURRENCY_LIMIT.labels(limiter=self.name).set(self.limit)
+        LIMITER_IN_FLIGHT.labels(limiter=self.name).set(self._in_flight)
+
+    def snapshot(self) -> Dict:
+        """حالة المحدد للعرض في فحص الصحة"""
+        return {
+            'limit': self.limit,
+            'in_flight': self._in_flight,
+            'waiting': len(self._waiters),
+            'baseline_latencies': {key: round(self.baseline(key), 3) for key in sorted(self._latencies)},
+            'min_limit': self.min_limit,
+            'max_limit': self.max_limit
+        }
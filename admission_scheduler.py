@@ -0,0 +1,224 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Callable
+
+from prometheus_client import Gauge, Histogram
+
+
+# فئات الأولوية بترتيب صارم (الأعلى أولاً)
+PRIORITY_CLASSES = ('high', 'normal', 'low')
+DEFAULT_PRIORITY = 'normal'
+
+# مقاييس القبول
+ADMISSION_QUEUE_DEPTH = Gauge(
+    'admission_queue_depth',
+    'Number of runs waiting for admission',
+    ['priority']
+)
+ADMISSION_WAIT_TIME = Histogram(
+    'admission_wait_seconds',
+    'Time runs spend waiting for admission',
+    ['priority'],
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+)
+ADMISSION_ACTIVE_RUNS = Gauge(
+    'admission_active_runs',
+    'Number of admitted runs currently executing'
+)
+
+
+def parse_user_weights(value: str) -> Dict[str, float]:
+    """تحليل أوزان المستخدمين بصيغة user_a:2,user_b:0.5"""
+    weights = {}
+    for item in filter(None, (part.strip() for part in value.split(','))):
+        user_id, _, weight = item.rpartition(':')
+        if not user_id:
+            raise ValueError(f"Invalid user weight entry: {item}")
+        weights[user_id.strip()] = float(weight)
+    return weights
+
+
+@dataclass(order=True)
+class AdmissionTicket:
+    """تذكرة انتظار تشغيل في طابور القبول"""
+    finish_tag: float
+    sequence: int
+    user_id: str = field(compare=False)
+    priority: str = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    future: asyncio.Future = field(compare=False, repr=False)
+    admitted_at: Optional[float] = field(default=None, compare=False)
+    cancelled: bool = field(default=False, compare=False)
+
+
+class AdmissionScheduler:
+    """مجدول قبول التشغيلات: أولويات صارمة وطابور عادل موزون لكل مستخدم"""
+
+    def __init__(
+            self,
+            max_active_runs: int = 4,
+            user_weights: Optional[Dict[str, float]] = None,
+            pressure_check: Optional[Callable[[], bool]] = None,
+            pressure_poll_interval: float = 1.0
+    ):
+        if not isinstance(max_active_runs, int) or max_active_runs < 1:
+            raise ValueError("max_active_runs must be a positive integer")
+
+        self.max_active_runs = max_active_runs
+        if user_weights is None:
+            user_weights = parse_user_weights(os.getenv('ADMISSION_USER_WEIGHTS', ''))
+        if any(weight <= 0 for weight in user_weights.values()):
+            raise ValueError("user weights must be positive")
+        self.user_weights = dict(user_weights)
+        self.pressure_check = pressure_check
+        self.pressure_poll_interval = pressure_poll_interval
+
+        self._queues: Dict[str, List[AdmissionTicket]] = {p: [] for p in PRIORITY_CLASSES}
+        # الساعة الافتراضية وآخر وسم انتهاء لكل مستخدم ضمن كل فئة
+        self._virtual_time: Dict[str, float] = {p: 0.0 for p in PRIORITY_CLASSES}
+        self._last_finish: Dict[str, Dict[str, float]] = {p: {} for p in PRIORITY_CLASSES}
+        self._sequence = itertools.count()
+        self._active = 0
+        self._poll_handle: Optional[asyncio.TimerHandle] = None
+
+    async def acquire(self, user_id: str, priority: str = DEFAULT_PRIORITY, cost: float = 1.0) -> AdmissionTicket:
+        """انتظار دور التشغيل"""
+        priority = priority if priority in PRIORITY_CLASSES else DEFAULT_PRIORITY
+        loop = asyncio.get_running_loop()
+
+        # وسم الانتهاء الافتراضي: البداية = max(الساعة، آخر انتهاء للمستخدم)
+        weight = self.user_weights.get(user_id, 1.0)
+        start_tag = max(self._virtual_time[priority], self._last_finish[priority].get(user_id, 0.0))
+        finish_tag = start_tag + cost / weight
+        self._last_finish[priority][user_id] = finish_tag
+
+        ticket = AdmissionTicket(
+            finish_tag=finish_tag,
+            sequence=next(self._sequence),
+            user_id=user_id,
+            priority=priority,
+            enqueued_at=time.monotonic(),
+            future=loop.create_future()
+        )
+        heapq.heappush(self._queues[priority], ticket)
+        self._update_depth_metrics()
+        self._dispatch()
+
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            ticket.cancelled = True
+            if ticket.admitted_at is not None:
+                self.release(ticket)
+            self._update_depth_metrics()
+            raise
+
+        return ticket
+
+    def release(self, ticket: Optional[AdmissionTicket]) -> None:
+        """تحرير مكان التشغيل المنتهي"""
+        if not ticket or ticket.admitted_at is None:
+            return
+        ticket.admitted_at = None
+        self._active = max(0, self._active - 1)
+        ADMISSION_ACTIVE_RUNS.set(self._active)
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, priority: str = DEFAULT_PRIORITY, cost: float = 1.0):
+        """حجز مكان تشغيل ضمن سياق"""
+        ticket = await self.acquire(user_id, priority, cost)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def _next_ticket(self) -> Optional[AdmissionTicket]:
+        """اختيار التذكرة التالية: أعلى فئة ثم أصغر وسم انتهاء"""
+        for priority in PRIORITY_CLASSES:
+            queue = self._queues[priority]
+            while queue and (queue[0].cancelled or queue[0].future.done()):
+                heapq.heappop(queue)
+            if queue:
+                return heapq.heappop(queue)
+        return None
+
+    def _under_pressure(self) -> bool:
+        """التحقق من ضغط الموارد (يُسمح دائماً بتشغيل واحد على الأقل)"""
+        if not self.pressure_check or self._active == 0:
+            return False
+        try:
+            return bool(self.pressure_check())
+        except Exception as e:
+            logging.error(f"Admission pressure check failed: {str(e)}")
+            return False
+
+    def _dispatch(self) -> None:
+        """قبول التشغيلات المنتظرة حسب السعة المتاحة"""
+        while self._active < self.max_active_runs:
+            if any(self._queues.values()) and self._under_pressure():
+                self._schedule_poll()
+                break
+
+            ticket = self._next_ticket()
+            if not ticket:
+                break
+
+            self._virtual_time[ticket.priority] = ticket.finish_tag
+            self._prune_finish_tags(ticket.priority)
+            ticket.admitted_at = time.monotonic()
+            self._active += 1
+            ADMISSION_ACTIVE_RUNS.set(self._active)
+            ADMISSION_WAIT_TIME.labels(priority=ticket.priority).observe(
+                ticket.admitted_at - ticket.enqueued_at
+            )
+            ticket.future.set_result(True)
+
+        self._update_depth_metrics()
+
+    def _prune_finish_tags(self, priority: str) -> None:
+        """حذف أوسمة المستخدمين التي تجاوزتها الساعة الافتراضية (البداية لهم = الساعة)"""
+        virtual_time = self._virtual_time[priority]
+        last_finish = self._last_finish[priority]
+        for user_id in [u for u, tag in last_finish.items() if tag <= virtual_time]:
+            del last_finish[user_id]
+
+    def _schedule_poll(self) -> None:
+        """إعادة المحاولة لاحقاً عند انخفاض ضغط الموارد"""
+        if self._poll_handle and not self._poll_handle.cancelled():
+            return
+        loop = asyncio.get_running_loop()
+
+        def poll():
+            self._poll_handle = None
+            self._dispatch()
+
+        self._poll_handle = loop.call_later(self.pressure_poll_interval, poll)
+
+    def _update_depth_metrics(self) -> None:
+        for priority, queue in self._queues.items():
+            ADMISSION_QUEUE_DEPTH.labels(priority=priority).set(
+                sum(1 for t in queue if not t.cancelled and not t.future.done())
+            )
+
+    def snapshot(self) -> Dict:
+        """حالة الطابور الحالية"""
+        now = time.monotonic()
+        queues = {}
+        for priority, queue in self._queues.items():
+            waiting = [t for t in queue if not t.cancelled and not t.future.done()]
+            queues[priority] = {
+                'depth': len(waiting),
+                'oldest_wait_seconds': round(max((now - t.enqueued_at for t in waiting), default=0.0), 3)
+            }
+        return {
+            'active_runs': self._active,
+            'max_active_runs': self.max_active_runs,
+            'queues': queues
+        }
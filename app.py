@@ -81,7 +81,7 @@ from io import BytesIO, IOBase
 import aiofiles
 
 # Custom Imports
-from core_logic import AsyncStreamingCoreLogic, APIConfigurationError
+from core_logic import AsyncStreamingCoreLogic, APIConfigurationError, RunConflictError, RunOwnershipError
 from config import (
     Settings, get_settings,
     SECURITY_CONFIG,
@@ -89,6 +89,8 @@ from config import (
 )
 from redis_manager import EnhancedRedisManager, RedisServiceName
 from worker_manager import WorkerManager
+from batch_processor import BatchProcessor, MAX_BATCH_TOPICS
+from job_queue import ACTIVE_JOB_STATES, PipelineJobQueue, encrypt_job_secrets
 from routes import router as api_router
 from middleware import (
     WorkerMiddleware,
@@ -278,6 +280,8 @@ TEMP_DIR.mkdir(exist_ok=True)
 # في قسم Constants and Configuration
 REQUEST_TIMEOUT = float(os.getenv('REQUEST_TIMEOUT', '30'))
 MAX_REQUEST_SIZE = int(os.getenv('MAX_REQUEST_SIZE', '10485760'))  # 10MB default
+# وضع تنفيذ السلاسل: inline داخل خادم HTTP أو queue عبر عمال مستقلين
+PIPELINE_EXECUTION_MODE = os.getenv('PIPELINE_EXECUTION_MODE', 'inline').lower()
 
 # Configure logging
 logging.basicConfig(
@@ -454,6 +458,54 @@ class ProcessRequest(BaseModel):
         }
 
 
+class BatchProcessRequest(BaseModel):
+    """نموذج طلب معالجة دفعة من المواضيع"""
+    topics: List[str] = Field(..., min_length=1, max_length=MAX_BATCH_TOPICS)
+    api_keys: APIKeys
+    timeout: Optional[int] = Field(default=300, ge=60, le=600)
+    priority: Optional[str] = Field(default="normal", pattern="^(low|normal|high)$")
+    max_concurrency: Optional[int] = Field(default=4, ge=1, le=20)
+
+    @field_validator('topics')
+    def validate_topics(cls, v):
+        topics = [topic.strip() for topic in v if topic and topic.strip()]
+        if not topics:
+            raise ValueError('At least one topic is required')
+        if any(len(topic) > 500 for topic in topics):
+            raise ValueError('Topics must not exceed 500 characters')
+        return topics
+
+
+class CancelRequest(BaseModel):
+    """نموذج طلب إلغاء تشغيل (task_id مقبول للتوافق مع الواجهة)"""
+    process_id: Optional[str] = Field(default=None, min_length=1)
+    task_id: Optional[str] = Field(default=None, min_length=1)
+
+    @property
+    def target_id(self) -> Optional[str]:
+        return self.process_id or self.task_id
+
+
+class RegenerateRequest(BaseModel):
+    """نموذج طلب إعادة توليد مهمة والمهام التابعة لها"""
+    task_number: int = Field(..., ge=1, le=11)
+    api_keys: APIKeys
+    timeout: Optional[int] = Field(default=300, ge=60, le=600)
+    priority: Optional[str] = Field(default="normal", pattern="^(low|normal|high)$")
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "task_number": 7,
+                "api_keys": {
+                    "google_api_key": "YOUR_GOOGLE_KEY",
+                    "eleven_labs_api_key": "YOUR_ELEVEN_LABS_KEY",
+                    "eleven_labs_voice_id": "YOUR_VOICE_ID"
+                },
+                "timeout": 120,
+                "priority": "normal"
+            }
+        }
 
 
 class ErrorResponse(BaseModel):
@@ -1039,15 +1091,16 @@ async def process_content(
         timeout: int,
         priority: str,
         audio_options: Optional[AudioProcessingOptions],
-        request_tracker: RequestTracker
+        request_tracker: RequestTracker,
+        tasks: Optional[List[int]] = None
 ) -> None:
     """معالجة المحتوى"""
     try:
         # بدء المعالجة
         await request_tracker.start()
 
-        # بدء سلسلة المهام
-        await core_logic.chain_tasks(topic)
+        # بدء سلسلة المهام (أو المهام المعاد توليدها فقط) ضمن سياق التشغيل الخاص بها
+        await core_logic.chain_tasks(topic, process_id=process_id, timeout=timeout, tasks=tasks)
 
         # تسجيل النجاح
         await request_tracker.complete({
@@ -1088,6 +1141,22 @@ async def process_request(
         )
 
         try:
+            await register_run_owner(process_id, current_user)
+            await reject_active_run(process_id)
+
+            # في وضع الطابور: التحقق من المفاتيح ثم إدراج التشغيل لعمال السلاسل
+            if PIPELINE_EXECUTION_MODE == 'queue':
+                return await enqueue_process_request(request, process_id, current_user)
+
+            # إنشاء سياق تشغيل معزول لهذا الطلب
+            app.state.core_logic.create_run(
+                process_id,
+                user_id=current_user.username,
+                topic=request.topic,
+                priority=request.priority,
+                timeout=request.timeout
+            )
+
             # التحقق من مفاتيح API
             await app.state.core_logic.validate_api_keys(
                 request.api_keys.google_api_key,
@@ -1095,11 +1164,12 @@ async def process_request(
                 request.api_keys.eleven_labs_voice_id
             )
 
-            # تهيئة APIs
+            # تهيئة APIs الخاصة بالتشغيل
             await app.state.core_logic.configure_apis(
                 request.api_keys.google_api_key,
                 request.api_keys.eleven_labs_api_key,
-                request.api_keys.eleven_labs_voice_id
+                request.api_keys.eleven_labs_voice_id,
+                process_id=process_id
             )
 
             # إضافة مهمة المعالجة
@@ -1137,6 +1207,336 @@ async def process_request(
             detail=str(e)
         )
 
+async def register_run_owner(process_id: str, current_user: UserInDB) -> None:
+    """حفظ مالك التشغيل قبل إنشائه أو إدراجه (معرف تشغيل يملكه مستخدم آخر مرفوض)"""
+    try:
+        await app.state.core_logic.register_run_owner(process_id, current_user.username)
+    except RunOwnershipError as e:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
+
+
+async def reject_active_run(process_id: str) -> None:
+    """رفض إعادة إرسال تشغيل ما زال قيد التنفيذ محلياً أو في الطابور"""
+    try:
+        app.state.core_logic.ensure_run_not_active(process_id)
+    except RunConflictError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+    if PIPELINE_EXECUTION_MODE == 'queue':
+        job_state = await app.state.job_queue.get_job_state(process_id)
+        if job_state.get('state') in ACTIVE_JOB_STATES:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Run {process_id} is already {job_state['state']}"
+            )
+
+
+async def enqueue_process_request(
+        request: ProcessRequest,
+        process_id: str,
+        current_user: UserInDB
+) -> JSONResponse:
+    """إدراج طلب المعالجة في طابور Redis الدائم"""
+    valid = await app.state.core_logic.validate_api_keys(
+        request.api_keys.google_api_key,
+        request.api_keys.eleven_labs_api_key,
+        request.api_keys.eleven_labs_voice_id
+    )
+    if not valid:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="API key validation failed"
+        )
+
+    message_id = await app.state.job_queue.enqueue({
+        'process_id': process_id,
+        'user_id': current_user.username,
+        'topic': request.topic,
+        'timeout': request.timeout,
+        'priority': request.priority,
+        'audio_options': request.audio_options.model_dump() if request.audio_options else None,
+        'secrets': encrypt_job_secrets(request.api_keys.model_dump()),
+        'submitted_at': datetime.now(timezone.utc).isoformat()
+    })
+
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={
+            "status": "queued",
+            "message": "Task chain queued successfully",
+            "process_id": process_id,
+            "job_id": message_id,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+    )
+
+
+async def parse_batch_request(request: Request) -> BatchProcessRequest:
+    """قراءة طلب الدفعة بصيغة JSON أو NDJSON"""
+    body = await request.body()
+    try:
+        if 'ndjson' in request.headers.get('content-type', ''):
+            # كل سطر موضوع ({"topic": ...} أو نص)، والسطر بدون topic يحمل خيارات الدفعة
+            options, topics = {}, []
+            for line in body.decode('utf-8').splitlines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                if isinstance(item, str):
+                    topics.append(item)
+                elif isinstance(item, dict) and 'topic' in item:
+                    topics.append(item['topic'])
+                elif isinstance(item, dict):
+                    options.update(item)
+            return BatchProcessRequest(topics=topics, **options)
+
+        return BatchProcessRequest(**json.loads(body))
+
+    except (ValueError, TypeError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
+
+
+@app.post("/api/process/batch")
+async def process_batch(
+    request: Request,
+    current_user: UserInDB = Depends(get_current_user)
+) -> StreamingResponse:
+    """معالجة دفعة من المواضيع مع بث التقدم بصيغة NDJSON"""
+    try:
+        if "process" not in current_user.scopes:
+            raise PermissionError("Insufficient permissions")
+
+        if not app.state.core_logic or not app.state.core_logic.redis:
+            raise ServiceConfigError("Service not properly initialized")
+
+        batch = await parse_batch_request(request)
+
+        # التحقق من المفاتيح مرة واحدة للدفعة كلها
+        valid = await app.state.core_logic.validate_api_keys(
+            batch.api_keys.google_api_key,
+            batch.api_keys.eleven_labs_api_key,
+            batch.api_keys.eleven_labs_voice_id
+        )
+        if not valid:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="API key validation failed"
+            )
+
+        batch_id = str(uuid.uuid4())
+
+        if PIPELINE_EXECUTION_MODE == 'queue':
+            events = enqueue_batch(batch, batch_id, current_user)
+        else:
+            events = BatchProcessor(
+                app.state.core_logic,
+                max_concurrency=batch.max_concurrency
+            ).stream(
+                batch.topics,
+                batch.api_keys.model_dump(),
+                user_id=current_user.username,
+                timeout=batch.timeout,
+                priority=batch.priority,
+                batch_id=batch_id
+            )
+
+        async def ndjson_generator():
+            async for event in events:
+                yield json.dumps(event, ensure_ascii=False, default=str) + "\n"
+
+        return StreamingResponse(
+            ndjson_generator(),
+            media_type="application/x-ndjson",
+            headers={"Cache-Control": "no-cache", "X-Batch-ID": batch_id}
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Batch request error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
+async def enqueue_batch(batch: BatchProcessRequest, batch_id: str, current_user: UserInDB):
+    """إدراج مواضيع الدفعة في الطابور بمفاتيح مشفرة مرة واحدة"""
+    secrets = encrypt_job_secrets(batch.api_keys.model_dump())
+    submitted_at = datetime.now(timezone.utc).isoformat()
+
+    for index, topic in enumerate(batch.topics):
+        process_id = f'{batch_id}-{index}'
+        try:
+            await app.state.core_logic.register_run_owner(process_id, current_user.username)
+            message_id = await app.state.job_queue.enqueue({
+                'process_id': process_id,
+                'user_id': current_user.username,
+                'topic': topic,
+                'timeout': batch.timeout,
+                'priority': batch.priority,
+                'batch_id': batch_id,
+                'secrets': secrets,
+                'submitted_at': submitted_at
+            })
+            yield {'type': 'run_queued', 'batch_id': batch_id, 'index': index,
+                   'process_id': process_id, 'topic': topic, 'job_id': message_id}
+        except Exception as e:
+            logger.error(f"Error enqueuing batch {batch_id} topic {index}: {str(e)}")
+            yield {'type': 'run_failed', 'batch_id': batch_id, 'index': index,
+                   'process_id': process_id, 'topic': topic, 'error': str(e)}
+
+    yield {'type': 'batch_completed', 'batch_id': batch_id, 'total': len(batch.topics),
+           'timestamp': datetime.now(timezone.utc).isoformat()}
+
+
+@app.post("/api/cancel", status_code=status.HTTP_202_ACCEPTED)
+async def cancel_process(
+    request: CancelRequest,
+    current_user: UserInDB = Depends(get_current_user)
+) -> JSONResponse:
+    """إلغاء تشغيل جارٍ أو في الطابور"""
+    try:
+        process_id = request.target_id
+        if not process_id:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="process_id is required"
+            )
+
+        if not app.state.core_logic or not app.state.core_logic.redis:
+            raise ServiceConfigError("Service not properly initialized")
+
+        # التحقق من ملكية التشغيل (المالك محفوظ منذ الإنشاء أو الإدراج في الطابور)
+        owner = await app.state.core_logic.get_run_owner(process_id)
+        if not owner:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Process not found")
+        if owner != current_user.username:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to cancel this process")
+
+        delivered = await app.state.core_logic.cancel_run(process_id)
+
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={
+                "status": "cancelling" if delivered else "cancel_requested",
+                "process_id": process_id,
+                "timestamp": datetime.now(timezone.utc).isoformat()
+            }
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Cancel request error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
+@app.post("/api/process/{process_id}/regenerate", status_code=status.HTTP_202_ACCEPTED)
+async def regenerate_task(
+    process_id: str,
+    request: RegenerateRequest,
+    background_tasks: BackgroundTasks,
+    current_user: UserInDB = Depends(get_current_user)
+) -> JSONResponse:
+    """إعادة توليد مهمة واحدة والمهام التابعة لها من النتائج المخزنة"""
+    try:
+        if "process" not in current_user.scopes:
+            raise PermissionError("Insufficient permissions")
+
+        if not app.state.core_logic or not app.state.core_logic.redis:
+            raise ServiceConfigError("Service not properly initialized")
+
+        try:
+            plan = await app.state.core_logic.prepare_regeneration(process_id, request.task_number)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+        if plan['user_id'] != current_user.username:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not allowed to modify this process")
+        await register_run_owner(process_id, current_user)
+        await reject_active_run(process_id)
+
+        if PIPELINE_EXECUTION_MODE == 'queue':
+            message_id = await app.state.job_queue.enqueue({
+                'process_id': process_id,
+                'user_id': current_user.username,
+                'topic': plan['topic'],
+                'tasks': plan['tasks'],
+                'timeout': request.timeout,
+                'priority': request.priority,
+                'secrets': encrypt_job_secrets(request.api_keys.model_dump()),
+                'submitted_at': datetime.now(timezone.utc).isoformat()
+            })
+            return JSONResponse(
+                status_code=status.HTTP_202_ACCEPTED,
+                content={
+                    "status": "queued",
+                    "process_id": process_id,
+                    "job_id": message_id,
+                    "tasks": plan['tasks'],
+                    "timestamp": datetime.now(timezone.utc).isoformat()
+                }
+            )
+
+        app.state.core_logic.create_run(
+            process_id,
+            user_id=current_user.username,
+            topic=plan['topic'],
+            priority=request.priority,
+            timeout=request.timeout
+        )
+        await app.state.core_logic.configure_apis(
+            request.api_keys.google_api_key,
+            request.api_keys.eleven_labs_api_key,
+            request.api_keys.eleven_labs_voice_id,
+            process_id=process_id
+        )
+
+        request_tracker = RequestTracker(
+            process_id=process_id,
+            user_id=current_user.username,
+            request_data={'task_number': request.task_number, 'tasks': plan['tasks']}
+        )
+        background_tasks.add_task(
+            process_content,
+            app.state.core_logic,
+            process_id,
+            plan['topic'],
+            request.timeout,
+            request.priority,
+            None,
+            request_tracker,
+            plan['tasks']
+        )
+
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content={
+                "status": "processing",
+                "message": "Task regeneration started successfully",
+                "process_id": process_id,
+                "tasks": plan['tasks'],
+                "timestamp": datetime.now(timezone.utc).isoformat()
+            }
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Regenerate request error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
 @app.get("/api/audio/{process_id}")
 async def get_audio(
         process_id: str,
@@ -1148,15 +1548,16 @@ async def get_audio(
         if not app.state.core_logic:
             raise ServiceConfigError("Service not properly initialized")
 
-        # استرداد معلومات الصوت
-        task_status = await app.state.core_logic.get_task_status(8)
+        # استرداد معلومات الصوت الخاصة بالتشغيل
+        task_status = await app.state.core_logic.get_task_status(8, process_id)
 
-        if not task_status or task_status.get('status') != 'completed':
+        if not task_status or task_status.get('status') != 'completed' or not task_status.get('result'):
             raise ResourceNotFoundError("Audio not ready")
 
         # الحصول على معلومات الصوت
         audio_info = task_status['result']['content']
-        eleven_labs_voice_id = app.state.core_logic.eleven_labs_config.get('voice_id')
+        run = app.state.core_logic.get_run(process_id)
+        eleven_labs_voice_id = (run.eleven_labs_config or {}).get('voice_id') if run else None
 
         if not eleven_labs_voice_id:
             raise APIConfigurationError("Voice ID not configured")
@@ -1322,6 +1723,22 @@ async def health_check():
             "workers": len(worker_manager.active_workers) if worker_manager else 0
         }
 
+        # حالة طابور القبول وضوابط استدعاء المزودين
+        core_logic = getattr(app.state, 'core_logic', None)
+        if core_logic:
+            system_info["admission"] = core_logic.admission_scheduler.snapshot()
+            system_info["gemini_limiter"] = core_logic.gemini_limiter.snapshot()
+            system_info["event_loop"] = core_logic.loop_lag_monitor.snapshot()
+            system_info["provider_quotas"] = core_logic.quota_limiter.snapshot()
+            system_info["hedging"] = core_logic.hedger.snapshot()
+            system_info["llm_cache"] = core_logic.llm_cache.snapshot()
+            system_info["prompt_cache"] = core_logic.prompt_prefix_cache.snapshot()
+            system_info["circuit_breakers"] = core_logic.circuit_breakers.snapshot()
+
+            # الدائرة غير المغلقة تعني تعطل المزود (حالة متدهورة)
+            for name, breaker in system_info["circuit_breakers"].items():
+                components_status[f"circuit:{name}"] = "ok" if breaker["state"] == "closed" else breaker["state"]
+
         # الحالة الإجمالية
         overall_status = "healthy" if all(v == "ok" for v in components_status.values()) else "degraded"
 
@@ -1618,6 +2035,22 @@ async def startup_event():
             )
             await app.state.redis_manager.init_connections()
 
+        # تهيئة طابور التشغيلات عند تفعيل وضع العمال المستقلين
+        if PIPELINE_EXECUTION_MODE == 'queue':
+            clients = await app.state.redis_manager.get_current_clients()
+            app.state.job_queue = PipelineJobQueue(clients['text'])
+            await app.state.job_queue.ensure_group()
+            logging.info("✅ Pipeline job queue initialized")
+
+        # الاستماع لطلبات إلغاء التشغيلات المنفذة في هذه العملية
+        core_logic = getattr(app.state, 'core_logic', None)
+        if core_logic and core_logic.redis:
+            app.state.cancellation_listener = asyncio.create_task(core_logic.listen_for_cancellations())
+
+        # قياس تأخر حلقة الأحداث (يكشف الاستدعاءات الحاجبة)
+        if core_logic:
+            core_logic.loop_lag_monitor.start()
+
         # إضافة المسارات
         app.include_router(api_router, prefix="/api")
 
@@ -1677,6 +2110,8 @@ async def cleanup_resources():
             logging.info("Cleaning up core logic...")
             if hasattr(app.state.core_logic, 'redis'):
                 app.state.core_logic.redis = None
+            app.state.core_logic.loop_lag_monitor.stop()
+            app.state.core_logic.gemini_client.close()
             delattr(app.state, 'core_logic')
 
         # تنظيف redis_manager
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, AsyncIterator, Set
+
+from core_logic import AsyncStreamingCoreLogic
+
+
+MAX_BATCH_TOPICS = 500
+DEFAULT_BATCH_CONCURRENCY = 4
+
+# مراجع مهام الدفعات الجارية (تستمر حتى بعد انقطاع العميل)
+_running_batches: Set[asyncio.Task] = set()
+
+
+class BatchProcessor:
+    """تنفيذ دفعة من المواضيع بتكوين مزودين مشترك وتزامن محدود"""
+
+    def __init__(
+            self,
+            core_logic: AsyncStreamingCoreLogic,
+            max_concurrency: int = DEFAULT_BATCH_CONCURRENCY
+    ):
+        if not isinstance(max_concurrency, int) or max_concurrency < 1:
+            raise ValueError("max_concurrency must be a positive integer")
+
+        self.core_logic = core_logic
+        self.max_concurrency = max_concurrency
+
+    async def stream(
+            self,
+            topics: List[str],
+            api_keys: Dict[str, str],
+            user_id: Optional[str] = None,
+            timeout: Optional[float] = None,
+            priority: str = 'normal',
+            batch_id: Optional[str] = None
+    ) -> AsyncIterator[Dict]:
+        """تشغيل الدفعة في الخلفية وبث أحداث التقدم لكل موضوع"""
+        if not topics:
+            raise ValueError("Batch requires at least one topic")
+        if len(topics) > MAX_BATCH_TOPICS:
+            raise ValueError(f"Batch exceeds {MAX_BATCH_TOPICS} topics")
+
+        batch_id = batch_id or str(uuid.uuid4())
+        events: asyncio.Queue = asyncio.Queue()
+
+        runner = asyncio.create_task(
+            self._run_batch(batch_id, topics, api_keys, user_id, timeout, priority, events)
+        )
+        _running_batches.add(runner)
+        runner.add_done_callback(_running_batches.discard)
+
+        while True:
+            event = await events.get()
+            yield event
+            if event['type'] in ['batch_completed', 'batch_failed']:
+                break
+
+    async def _run_batch(
+            self,
+            batch_id: str,
+            topics: List[str],
+            api_keys: Dict[str, str],
+            user_id: Optional[str],
+            timeout: Optional[float],
+            priority: str,
+            events: asyncio.Queue
+    ) -> None:
+        """تنفيذ جميع مواضيع الدفعة"""
+        process_ids = [f'{batch_id}-{index}' for index in range(len(topics))]
+        summary = {'completed': 0, 'failed': 0}
+
+        def emit(event_type: str, **data) -> None:
+            events.put_nowait({
+                'type': event_type,
+                'batch_id': batch_id,
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                **data
+            })
+
+        try:
+            # تكوين المزودين مرة واحدة للدفعة (المفاتيح تم التحقق منها مسبقاً)
+            for process_id, topic in zip(process_ids, topics):
+                if user_id:
+                    await self.core_logic.register_run_owner(process_id, user_id)
+                self.core_logic.create_run(process_id, user_id=user_id, topic=topic, priority=priority)
+            await self.core_logic.configure_apis(
+                api_keys['google_api_key'],
+                api_keys['eleven_labs_api_key'],
+                api_keys['eleven_labs_voice_id'],
+                process_id=process_ids[0],
+                validate=False
+            )
+            for process_id in process_ids[1:]:
+                self.core_logic.share_api_config(process_ids[0], process_id)
+
+        except Exception as e:
+            logging.error(f"Batch {batch_id} setup failed: {str(e)}")
+            emit('batch_failed', error=str(e))
+            return
+
+        emit('batch_accepted', total=len(topics), process_ids=process_ids)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run_topic(index: int, process_id: str, topic: str) -> None:
+            async with semaphore:
+                emit('run_started', index=index, process_id=process_id, topic=topic)
+                try:
+                    await self.core_logic.chain_tasks(topic, process_id=process_id, timeout=timeout)
+                    chain_status = await self.core_logic.get_chain_status(process_id)
+                    failed = chain_status.get('failed_tasks', [])
+                    critical = set(self.core_logic.pipeline.critical_tasks())
+                    # فشل السلسلة نفسها (أو غياب حالتها) فشل للموضوع حتى دون مهام فاشلة
+                    succeeded = (
+                        chain_status.get('status') not in ('error', 'unknown')
+                        and not chain_status.get('error')
+                        and not set(failed) & critical
+                    )
+                    summary['completed' if succeeded else 'failed'] += 1
+                    emit(
+                        'run_completed' if succeeded else 'run_failed',
+                        index=index,
+                        process_id=process_id,
+                        topic=topic,
+                        completed_tasks=chain_status.get('completed_tasks', []),
+                        failed_tasks=failed,
+                        error=chain_status.get('error')
+                    )
+                except Exception as e:
+                    logging.error(f"Batch {batch_id} run {process_id} failed: {str(e)}")
+                    summary['failed'] += 1
+                    emit('run_failed', index=index, process_id=process_id, topic=topic, error=str(e))
+
+        try:
+            async with asyncio.TaskGroup() as tg:
+                for index, (process_id, topic) in enumerate(zip(process_ids, topics)):
+                    tg.create_task(run_topic(index, process_id, topic))
+        finally:
+            emit('batch_completed', total=len(topics), **summary)
+            logging.info(
+                f"Batch {batch_id} finished: {summary['completed']} completed, {summary['failed']} failed"
+            )
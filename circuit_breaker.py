@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from enum import Enum
+from typing import Dict, Optional, Tuple, Type
+
+from prometheus_client import Counter, Gauge
+
+
+class CircuitState(Enum):
+    """حالات قاطع الدائرة"""
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+
+
+# قيم رقمية للحالة في المقاييس
+STATE_VALUES = {CircuitState.CLOSED: 0, CircuitState.HALF_OPEN: 1, CircuitState.OPEN: 2}
+
+CIRCUIT_STATE = Gauge(
+    'circuit_breaker_state',
+    'Circuit breaker state (0 closed, 1 half-open, 2 open)',
+    ['breaker']
+)
+CIRCUIT_TRANSITIONS = Counter(
+    'circuit_breaker_transitions_total',
+    'Circuit breaker state transitions',
+    ['breaker', 'state']
+)
+CIRCUIT_REJECTIONS = Counter(
+    'circuit_breaker_rejections_total',
+    'Calls rejected immediately by an open circuit',
+    ['breaker']
+)
+
+
+def is_provider_failure(error: BaseException) -> bool:
+    """هل يدل الخطأ على تعطل المزود (5xx أو مهلة أو اتصال) لا على خطأ المستدعي (4xx)"""
+    code = getattr(error, 'code', None)
+    try:
+        code = int(code)
+    except (TypeError, ValueError):
+        code = None
+    if code is not None and 400 <= code < 600:
+        return code >= 500 or code == 408
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, OSError)):
+        return True
+    # أخطاء الاتصال في المكتبات (مثل aiohttp.ClientConnectionError) لا ترث دائماً من OSError
+    return any(cls.__name__.endswith('ConnectionError') for cls in type(error).__mro__)
+
+
+class CircuitOpenError(Exception):
+    """الدائرة مفتوحة: المزود متعطل والاستدعاء مرفوض فوراً"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit {name} is open, retry after {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """قاطع دائرة لمزود ونقطة نهاية: يفشل فوراً عند الفتح ويختبر المزود في الحالة نصف المفتوحة"""
+
+    def __init__(
+            self,
+            name: str,
+            failure_threshold: int = 5,
+            recovery_timeout: float = 30.0,
+            half_open_max_calls: int = 1,
+            ignored_errors: Tuple[Type[BaseException], ...] = ()
+    ):
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold must be at least 1")
+        if half_open_max_calls < 1:
+            raise ValueError("half_open_max_calls must be at least 1")
+
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.ignored_errors = (CircuitOpenError,) + tuple(ignored_errors)
+
+        self._state = CircuitState.CLOSED
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probes = 0
+        self._last_error: Optional[str] = None
+        CIRCUIT_STATE.labels(breaker=name).set(STATE_VALUES[self._state])
+
+    @property
+    def state(self) -> CircuitState:
+        # انتقال تلقائي إلى نصف مفتوح بعد مهلة التعافي
+        if self._state == CircuitState.OPEN and self._retry_after() <= 0:
+            self._transition(CircuitState.HALF_OPEN)
+        return self._state
+
+    def _retry_after(self) -> float:
+        if self._opened_at is None:
+            return 0.0
+        return self._opened_at + self.recovery_timeout - time.monotonic()
+
+    def _transition(self, state: CircuitState) -> None:
+        if state == self._state:
+            return
+        previous = self._state
+        self._state = state
+        if state == CircuitState.OPEN:
+            self._opened_at = time.monotonic()
+        elif state == CircuitState.CLOSED:
+            self._opened_at = None
+            self._failures = 0
+        self._probes = 0
+        CIRCUIT_STATE.labels(breaker=self.name).set(STATE_VALUES[state])
+        CIRCUIT_TRANSITIONS.labels(breaker=self.name, state=state.value).inc()
+        log = logging.warning if state == CircuitState.OPEN else logging.info
+        log(f"Circuit {self.name} {previous.value} -> {state.value}")
+
+    def before_call(self) -> None:
+        """رفض الاستدعاء فوراً إذا كانت الدائرة مفتوحة أو امتلأت فرص الاختبار"""
+        state = self.state
+        if state == CircuitState.OPEN or (
+                state == CircuitState.HALF_OPEN and self._probes >= self.half_open_max_calls
+        ):
+            CIRCUIT_REJECTIONS.labels(breaker=self.name).inc()
+            raise CircuitOpenError(self.name, max(0.0, self._retry_after()))
+        if state == CircuitState.HALF_OPEN:
+            self._probes += 1
+
+    def record_success(self) -> None:
+        self._failures = 0
+        if self._state == CircuitState.HALF_OPEN:
+            self._transition(CircuitState.CLOSED)
+
+    def record_failure(self, error: Optional[BaseException] = None) -> None:
+        if error is not None:
+            self._last_error = str(error)[:200]
+        if self._state == CircuitState.HALF_OPEN:
+            self._transition(CircuitState.OPEN)
+            return
+        self._failures += 1
+        if self._failures >= self.failure_threshold:
+            self._transition(CircuitState.OPEN)
+
+    @asynccontextmanager
+    async def guard(self):
+        """تنفيذ استدعاء المزود تحت حماية القاطع"""
+        self.before_call()
+        was_probe = self._state == CircuitState.HALF_OPEN
+        try:
+            yield
+        except self.ignored_errors:
+            raise
+        except Exception as e:
+            # مفتاح API غير صالح أو طلب مرفوض (4xx) يخص مستخدماً واحداً فلا يفتح الدائرة للجميع
+            if is_provider_failure(e):
+                self.record_failure(e)
+            raise
+        else:
+            self.record_success()
+        finally:
+            # تحرير فرصة الاختبار إذا أُلغي الاستدعاء دون نتيجة
+            if was_probe and self._state == CircuitState.HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def snapshot(self) -> Dict:
+        state = self.state
+        return {
+            'state': state.value,
+            'consecutive_failures': self._failures,
+            'retry_after': round(max(0.0, self._retry_after()), 1) if state == CircuitState.OPEN else 0,
+            'last_error': self._last_error
+        }
+
+
+class CircuitBreakerRegistry:
+    """قواطع الدائرة لكل مزود ونقطة نهاية"""
+
+    def __init__(self, **defaults):
+        self.defaults = defaults
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, provider: str, endpoint: str) -> CircuitBreaker:
+        name = f'{provider}:{endpoint}'
+        if name not in self._breakers:
+            self._breakers[name] = CircuitBreaker(name, **self.defaults)
+        return self._breakers[name]
+
+    def snapshot(self) -> Dict[str, Dict]:
+        return {name: breaker.snapshot() for name, breaker in sorted(self._breakers.items())}
@@ -1026,6 +1026,25 @@ Make sure the titles include trending hashtags and are based on strong keywords
 Make sure that your response contains only one title and nothing else
 """
 
+
+# الكلمات المفتاحية والوصف والعنوان في استدعاء واحد (وضع المراحل 5–7 المدمج)
+
+task_seo_fused_prompt = """Act as an expert in YouTube SEO and as an experienced YouTube Shorts creator. Using the niche {niche}, the trend analysis {Analyse_Trends} and the video script {Script}, produce the three SEO assets of one YouTube Short in a single response.
+
+1. keywords: 12 long-tail keywords, highly relevant and low in competition, separated by commas, limited to a maximum of 500 characters.
+2. description: a professional, SEO-optimized video description built on these keywords. Give a brief overview of the video that entices viewers to watch, include calls to action (like, comment, subscribe) and relevant hashtags, limited to a maximum of 5000 characters.
+3. title: exactly one attention-grabbing, SEO-friendly title built on the strongest keywords, including trending hashtags and EMOJIS, limited to a maximum of 100 characters, and accurately reflecting the content of the video.
+
+Make sure all three outputs are in Arabic, specific and targeted especially in Arab geographical regions.
+
+Respond with JSON only, in exactly this structure:
+{{
+  "keywords": "long-tail keywords, word, long-tail keywords",
+  "description": "video description",
+  "title": "video title"
+}}
+"""
+
 # المهمة 9
 
 task_9_prompt = """You are tasked with creating a sequence of images that visually narrate a story based on a given {Script}. Use your artistic abilities to effectively represent key moments and emotions of the story, making sure to captivate and engage the audience. Focus on brainstorming creative themes and concepts for a photoshoot centered around the storyline. Think about the scenes you want to convey through the images and how you can visually narrate the story or evoke specific emotions. Break down the content into at least {secend} scenes, each illustrating a compelling segment of the story. Your response should include these {secend} prompt storyboard scenes, with each scene labeled sequentially from 1 onward, and use a variety of colors to create a smooth and cohesive flow. Pay attention to details to guide the audience through the story seamlessly.
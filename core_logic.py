@@ -5,8 +5,7 @@ import json
 import os
 import re
 import requests
-import google.generativeai as genai
-from typing import Dict, Optional, List, Any, Union, Tuple
+from typing import Dict, Optional, List, Any, Union, Tuple, Iterable, Callable, Set
 from datetime import datetime, timezone
 import base64
 from urllib.parse import quote
@@ -15,6 +14,8 @@ from pydub import AudioSegment
 from io import BytesIO
 import asyncio
 import async_timeout
+import contextvars
+from contextlib import contextmanager
 from dataclasses import dataclass, field
 from enum import Enum
 import psutil
@@ -24,6 +25,27 @@ import aiohttp
 from aiohttp import ClientTimeout, ClientSession
 from cryptography.fernet import Fernet
 from redis_manager import EnhancedRedisManager, RedisServiceName
+from task_scheduler import TaskGraphScheduler
+from admission_scheduler import AdmissionScheduler, DEFAULT_PRIORITY
+from deadline import LatencyTracker, RunDeadline, task_budget, should_skip_optional
+from speech_estimator import SpeechDurationEstimator
+from pipeline_registry import (
+    PipelineRegistry, default_pipeline, fuse_seo_stages, PROVIDER_GEMINI, PROVIDER_ELEVENLABS
+)
+from adaptive_limiter import AdaptiveConcurrencyLimiter
+from quota_limiter import QuotaLimiter, QuotaWaitTimeout
+from circuit_breaker import CircuitBreakerRegistry, CircuitOpenError
+from retry_policy import RetryPolicy, RetryBudget, ProviderHTTPError
+from gemini_client import GeminiClient, GeminiModelPool, json_generation_config
+from loop_monitor import EventLoopLagMonitor
+from llm_cache import LLMResponseCache, cache_key
+from topic_similarity import TopicSimilarityIndex
+from hedging import RequestHedger, HedgeBudget
+from token_stream import DeltaCoalescer
+from prompt_budget import PromptBudgeter
+from prompt_cache import GeminiContextCacheProvider, PromptPrefixCache, split_template
+from scene_parser import STORYBOARD_SCHEMA, has_scenes, parse_scenes
+from seo_fusion import FUSED_SEO_SCHEMA, FUSED_SEO_SECTIONS, parse_fused_seo
 import uuid
 import aiofiles
 import shutil
@@ -31,7 +53,7 @@ from logging.handlers import RotatingFileHandler
 from config import (
     task_1_prompt, task_2_prompt, task_3_prompt, task_4_prompt,
     task_5_prompt, task_6_prompt, task_7_prompt,
-    task_9_prompt, task_10_prompt
+    task_9_prompt, task_10_prompt, task_seo_fused_prompt
 )
 import time
 
@@ -44,6 +66,17 @@ MAX_RETRIES = 3
 MAX_AUDIO_SIZE = 10 * 1024 * 1024  # 10MB
 MAX_RETRIES_PER_SCENE = 3  # أضفنا هذا
 MAX_CONCURRENT_SCENES = 5  # أضفنا هذا
+RUN_DATA_TTL = 24 * 3600  # مدة الاحتفاظ ببيانات التشغيل في Redis
+FINISHED_RUN_RETENTION = 3600  # مدة الاحتفاظ بالتشغيلات المنتهية في الذاكرة
+CANCEL_CHANNEL = 'pipeline_run_cancellations'  # قناة إلغاء التشغيلات بين العمليات
+TASK_LATENCY_KEY = 'task_latency_ewma'  # تقديرات أزمنة المهام المشتركة بين العمليات
+PROMPT_TEMPLATES = {
+    1: task_1_prompt, 2: task_2_prompt, 3: task_3_prompt, 4: task_4_prompt,
+    5: task_5_prompt, 6: task_6_prompt, 7: task_7_prompt,
+    9: task_9_prompt, 10: task_10_prompt
+}
+SEO_FUSED_LAYOUT = 'seo_fused'
+RUN_STREAM_MAXLEN = 5000  # حد تيار التشغيل (يتسع للنتائج ودفعات النص المتدفق)
 
 
 class TaskStatus(Enum):
@@ -54,6 +87,7 @@ class TaskStatus(Enum):
     FAILED = "failed"
     FAILED_CONTINUING = "failed_continuing"
     CANCELLED = "cancelled"
+    SKIPPED = "skipped"
 
 
 class TaskResult:
@@ -94,6 +128,94 @@ class TaskResult:
         return result
 
 
+class PipelineRun:
+    """سياق تشغيل معزول لسلسلة مهام واحدة"""
+
+    KEY_PREFIX = 'run'
+
+    def __init__(
+            self,
+            process_id: str,
+            user_id: Optional[str] = None,
+            topic: Optional[str] = None,
+            priority: str = DEFAULT_PRIORITY,
+            task_numbers: Iterable[int] = range(1, 12)
+    ):
+        self.process_id = process_id
+        self.user_id = user_id
+        self.topic = topic
+        self.priority = priority or DEFAULT_PRIORITY
+        self.admission_ticket = None
+
+        # الموعد النهائي للتشغيل المشتق من مهلة الطلب
+        self.deadline: Optional[RunDeadline] = None
+
+        # مهمة asyncio المنفذة للتشغيل (للإلغاء)
+        self.task: Optional[asyncio.Task] = None
+        self.cancel_requested = False
+
+        # المهام المطلوب إعادة توليدها (تتجاوز ذاكرة الاستجابات للحصول على نتيجة جديدة)
+        self.regenerated_tasks: List[int] = []
+
+        # أحجام النصوص المرسلة للنموذج لكل مهمة (لربط زمن التنفيذ بحجم المدخلات)
+        self.prompt_stats: Dict[int, Dict] = {}
+
+        # نتائج المهام التابعة المولدة ضمن استدعاء مدمج (رقم المهمة -> النص)
+        self.fused_sections: Dict[int, str] = {}
+
+        # حالة المهام الخاصة بهذا التشغيل
+        self.results = {f'task{i}': TaskResult() for i in task_numbers}
+        self.statuses = {f'task{i}': TaskStatus.PENDING for i in task_numbers}
+        self.locks = {f'task{i}': asyncio.Lock() for i in task_numbers}
+
+        # تكوين المزودين الخاص بهذا التشغيل
+        self.google_model = None
+        self.google_api_key: Optional[str] = None
+        self.eleven_labs_config: Optional[Dict] = None
+
+        self.created_at = datetime.now(timezone.utc)
+        self.finished_at: Optional[datetime] = None
+
+    @classmethod
+    def key_for(cls, process_id: str, name: str) -> str:
+        """مفتاح Redis ضمن نطاق التشغيل"""
+        return f'{cls.KEY_PREFIX}:{process_id}:{name}'
+
+    def key(self, name: str) -> str:
+        return self.key_for(self.process_id, name)
+
+    @property
+    def stream_key(self) -> str:
+        return self.key('stream')
+
+    @property
+    def is_finished(self) -> bool:
+        return self.finished_at is not None
+
+    @property
+    def is_running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+
+# التشغيل الحالي ضمن سياق المهام غير المتزامنة
+_current_run: contextvars.ContextVar[Optional[PipelineRun]] = contextvars.ContextVar(
+    'current_pipeline_run',
+    default=None
+)
+
+# رقم المهمة الجارية (لسياسات الاستدعاء الخاصة بكل مرحلة)
+_current_task: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar(
+    'current_task_number',
+    default=None
+)
+
+# الموعد النهائي (monotonic) للمهمة الجارية، يُمرر إلى استدعاءات المزودين
+_task_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    'current_task_deadline',
+    default=None
+)
+
+
 class CustomError(Exception):
     """قاعدة للأخطاء المخصصة"""
     pass
@@ -114,6 +236,16 @@ class ResourceExhaustionError(CustomError):
     pass
 
 
+class RunOwnershipError(CustomError):
+    """معرف التشغيل يخص مستخدماً آخر"""
+    pass
+
+
+class RunConflictError(CustomError):
+    """تشغيل بالمعرف نفسه ما زال قيد التنفيذ"""
+    pass
+
+
 class AsyncStreamingCoreLogic:
     """منطق المعالجة الأساسي للتدفق غير المتزامن"""
 
@@ -123,7 +255,8 @@ class AsyncStreamingCoreLogic:
             max_retries: int = 3,
             timeout: int = 30,
             chunk_size: int = 1024 * 1024,
-            max_concurrent_tasks: int = 5
+            max_concurrent_tasks: int = 5,
+            pipeline: Optional[PipelineRegistry] = None
     ):
         if not redis_manager:
             raise ValueError("Redis manager is required")
@@ -143,9 +276,9 @@ class AsyncStreamingCoreLogic:
 
         # تهيئة المتغيرات الأساسية
         self.redis = None
-        self.stream_key = "task_results_stream"
-        self.google_model = None
-        self.eleven_labs_config = None
+        self._google_model = None
+        self._google_api_key = None
+        self._eleven_labs_config = None
 
 
 
@@ -174,10 +307,105 @@ class AsyncStreamingCoreLogic:
             'max_concurrent_tasks': max_concurrent_tasks
         }
 
-        # تهيئة إدارة المهام
-        self._results = {f'task{i}': TaskResult() for i in range(1, 12)}
-        self._task_statuses = {f'task{i}': TaskStatus.PENDING for i in range(1, 12)}
-        self._task_locks = {f'task{i}': asyncio.Lock() for i in range(1, 12)}
+        # تهيئة إدارة التشغيلات (لكل process_id سياقه المعزول)
+        # سجل مراحل السلسلة (التبعيات والموارد والحرجية)
+        self.pipeline = pipeline or default_pipeline()
+        # الوضع المدمج للمراحل 5–7 (استدعاء واحد بدلاً من ثلاثة)
+        if pipeline is None and bool(int(os.getenv('SEO_FUSED_ENABLED', 0))):
+            self.pipeline = fuse_seo_stages(self.pipeline)
+        self.pipeline.validate()
+
+        self._runs: Dict[str, PipelineRun] = {}
+        self._default_run = PipelineRun(process_id='default', task_numbers=self.pipeline.task_numbers)
+
+        # تقديرات أزمنة المهام لتوزيع الموعد النهائي
+        self.latency_tracker = LatencyTracker(defaults=self.pipeline.expected_latencies())
+
+        # تقدير مدة الصوت قبل توليده لتشغيل لوحة القصة بالتوازي مع المهمة 8
+        self.speech_estimator = SpeechDurationEstimator()
+
+        # مجدول قبول التشغيلات حسب الأولوية والعدالة بين المستخدمين
+        self.admission_scheduler = AdmissionScheduler(
+            max_active_runs=int(os.getenv('MAX_ACTIVE_RUNS', max_concurrent_tasks)),
+            pressure_check=self._is_under_resource_pressure
+        )
+
+        # عميل Gemini غير حاجب ومراقبة تأخر حلقة الأحداث
+        self.gemini_client = GeminiClient()
+        # نماذج معزولة لكل مفتاح API (بدلاً من genai.configure العام بين المستخدمين)
+        self.gemini_models = GeminiModelPool()
+
+        # ذاكرة استجابات النموذج (LRU محلي + Redis) للمراحل التي تفعلها
+        self.llm_cache_enabled = bool(int(os.getenv('LLM_CACHE_ENABLED', 1)))
+        self.llm_cache = LLMResponseCache(lambda: self.redis)
+
+        # فهرس المواضيع السابقة لإعادة استخدام نتيجة المهمة 1 للمواضيع شبه المكررة
+        self.topic_reuse_enabled = bool(int(os.getenv('TOPIC_REUSE_ENABLED', 1)))
+        self.topic_index = TopicSimilarityIndex(lambda: self.redis)
+        self.loop_lag_monitor = EventLoopLagMonitor()
+
+        # بث النص الجزئي لمراحل النص إلى تيار التشغيل في دفعات زمنية صغيرة
+        self.streaming_enabled = bool(int(os.getenv('GEMINI_STREAMING_ENABLED', 1)))
+        self.stream_delta_interval = float(os.getenv('STREAM_DELTA_INTERVAL', 0.25))
+
+        # ميزانية رموز النصوص المنسقة (تُضغط مخرجات المراحل السابقة عند تجاوزها)
+        self.prompt_budgeter = PromptBudgeter()
+
+        # قوالب بتعليمات ثابتة في البداية ومدخلات في النهاية، وتخزين البادئة لدى المزود عند دعمه
+        self.prompt_layouts = {
+            number: split_template(f'task_{number}', template)
+            for number, template in PROMPT_TEMPLATES.items()
+        }
+        self.prompt_layouts[SEO_FUSED_LAYOUT] = split_template('task_seo_fused', task_seo_fused_prompt)
+        self.prompt_cache_enabled = bool(int(os.getenv('PROMPT_CACHE_ENABLED', 1)))
+        self.prompt_prefix_cache = PromptPrefixCache(GeminiContextCacheProvider())
+
+        # حد تزامن متكيف مشترك لجميع استدعاءات Gemini
+        self.gemini_limiter = AdaptiveConcurrencyLimiter(
+            name='gemini',
+            initial_limit=int(os.getenv('GEMINI_INITIAL_CONCURRENCY', 4)),
+            min_limit=int(os.getenv('GEMINI_MIN_CONCURRENCY', 1)),
+            max_limit=int(os.getenv('GEMINI_MAX_CONCURRENCY', 32))
+        )
+
+        # التحوط ضد بطء Gemini في ذيل التوزيع (طلب مكرر بعد مئين 90 للمهمة)
+        self.hedging_enabled = bool(int(os.getenv('GEMINI_HEDGING_ENABLED', 1)))
+        self.hedger = RequestHedger(
+            percentile=float(os.getenv('GEMINI_HEDGE_PERCENTILE', 0.9)),
+            budget=HedgeBudget(ratio=float(os.getenv('GEMINI_HEDGE_BUDGET_RATIO', 0.1)))
+        )
+
+        # قواطع الدائرة لكل مزود ونقطة نهاية (فشل فوري عند تعطل المزود)
+        self.circuit_breakers = CircuitBreakerRegistry(
+            failure_threshold=int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 5)),
+            recovery_timeout=float(os.getenv('CIRCUIT_RECOVERY_TIMEOUT', 30)),
+            ignored_errors=(QuotaWaitTimeout,)
+        )
+
+        # سياسات إعادة المحاولة الموحدة (تشويش، Retry-After، ميزانية، موعد نهائي)
+        retry_budget_ratio = float(os.getenv('RETRY_BUDGET_RATIO', 0.2))
+        self.retry_policies = {
+            PROVIDER_GEMINI: RetryPolicy(
+                max_attempts=MAX_RETRIES,
+                budget=RetryBudget(ratio=retry_budget_ratio),
+                deadline=self._remaining_task_time
+            ),
+            PROVIDER_ELEVENLABS: RetryPolicy(
+                max_attempts=MAX_RETRIES,
+                budget=RetryBudget(ratio=retry_budget_ratio),
+                deadline=self._remaining_task_time
+            ),
+            # إعادة طلب وصف المشهد عند الاستجابة الفارغة فقط (أخطاء المزود تعالجها سياسة Gemini)
+            'scene': RetryPolicy(
+                max_attempts=MAX_RETRIES_PER_SCENE,
+                retryable=lambda error: False,
+                deadline=self._remaining_task_time
+            ),
+            'redis': RetryPolicy(max_attempts=self.config['max_retries'])
+        }
+
+        # حصص المزودين لكل مفتاح API مشتركة بين جميع العمال عبر Redis
+        self.quota_limiter = QuotaLimiter(lambda: self.redis)
 
         # إضافة التحكم في التزامن
         self._task_semaphores = {
@@ -186,9 +414,6 @@ class AsyncStreamingCoreLogic:
         }
         self._connection_lock = asyncio.Lock()
 
-        # تهيئة إدارة Redis
-        self.redis_manager = None
-
         # تهيئة المقاييس والمراقبة
         self._setup_metrics()
         self._performance_metrics = {
@@ -206,20 +431,6 @@ class AsyncStreamingCoreLogic:
         self._setup_logging()
         self._initialize_error_handling()
 
-        # تعريف تبعيات المهام
-        self._task_prerequisites = {
-            2: [1],
-            3: [2],
-            4: [3],
-            5: [1, 2, 4],
-            6: [2, 4, 5],
-            7: [2, 4, 5],
-            8: [4],
-            9: [4, 8],
-            10: [9],
-            11: [8, 10]
-        }
-
         # إنشاء المجلدات المؤقتة
         os.makedirs('./temp', exist_ok=True)
         os.makedirs('./temp/audio', exist_ok=True)
@@ -252,12 +463,132 @@ class AsyncStreamingCoreLogic:
             await self.redis.ping()
             logging.debug("✅ Redis ping successful.")
 
+            # تحميل أزمنة المهام التاريخية
+            self.latency_tracker.load(await self.redis.hgetall(TASK_LATENCY_KEY))
+
             return True
         except Exception as e:
             logging.error(f"❌ Redis initialization error: {e}", exc_info=True)
             self.redis = None
             return False
 
+    # إدارة التشغيلات المعزولة
+    @property
+    def _run(self) -> PipelineRun:
+        """التشغيل الحالي ضمن السياق"""
+        return _current_run.get() or self._default_run
+
+    @property
+    def _results(self) -> Dict[str, TaskResult]:
+        return self._run.results
+
+    @property
+    def _task_statuses(self) -> Dict[str, TaskStatus]:
+        return self._run.statuses
+
+    @property
+    def _task_locks(self) -> Dict[str, asyncio.Lock]:
+        return self._run.locks
+
+    @property
+    def _task_prerequisites(self) -> Dict[int, List[int]]:
+        """رسم التبعيات المبني من سجل المراحل"""
+        return self.pipeline.prerequisites()
+
+    @property
+    def google_model(self):
+        run = _current_run.get()
+        if run and run.google_model:
+            return run.google_model
+        return self._google_model
+
+    @google_model.setter
+    def google_model(self, model) -> None:
+        self._google_model = model
+
+    @property
+    def google_api_key(self) -> Optional[str]:
+        run = _current_run.get()
+        if run and run.google_api_key:
+            return run.google_api_key
+        return self._google_api_key
+
+    @google_api_key.setter
+    def google_api_key(self, api_key: Optional[str]) -> None:
+        self._google_api_key = api_key
+
+    @property
+    def eleven_labs_config(self) -> Optional[Dict]:
+        run = _current_run.get()
+        if run and run.eleven_labs_config:
+            return run.eleven_labs_config
+        return self._eleven_labs_config
+
+    @eleven_labs_config.setter
+    def eleven_labs_config(self, config: Optional[Dict]) -> None:
+        self._eleven_labs_config = config
+
+    def create_run(
+            self,
+            process_id: str,
+            user_id: Optional[str] = None,
+            topic: Optional[str] = None,
+            priority: str = DEFAULT_PRIORITY,
+            timeout: Optional[float] = None
+    ) -> PipelineRun:
+        """إنشاء سياق تشغيل جديد أو إرجاع الموجود"""
+        run = self._runs.get(process_id)
+        if run and not run.is_finished:
+            return run
+
+        run = PipelineRun(
+            process_id=process_id,
+            user_id=user_id,
+            topic=topic,
+            priority=priority,
+            task_numbers=self.pipeline.task_numbers
+        )
+        if timeout:
+            run.deadline = RunDeadline(timeout)
+        self._runs[process_id] = run
+        logging.info(f"Pipeline run {process_id} created")
+        return run
+
+    def get_run(self, process_id: str) -> Optional[PipelineRun]:
+        """استرجاع سياق التشغيل"""
+        return self._runs.get(process_id)
+
+    def ensure_run_not_active(self, process_id: str) -> None:
+        """رفض سلسلة ثانية على تشغيل جارٍ (تستبدل مهمته فلا يوقف الإلغاء إلا إحدى السلسلتين)"""
+        run = self.get_run(process_id)
+        if run and run.is_running:
+            raise RunConflictError(f"Run {process_id} is already in progress")
+
+    @contextmanager
+    def use_run(self, run: PipelineRun):
+        """تفعيل سياق التشغيل للمهام غير المتزامنة الحالية"""
+        token = _current_run.set(run)
+        try:
+            yield run
+        finally:
+            _current_run.reset(token)
+
+    def _evict_finished_runs(self) -> None:
+        """إزالة التشغيلات المنتهية القديمة من الذاكرة"""
+        now = datetime.now(timezone.utc)
+        for process_id, run in list(self._runs.items()):
+            if run.is_finished and (now - run.finished_at).total_seconds() > FINISHED_RUN_RETENTION:
+                self._runs.pop(process_id, None)
+
+    async def _expire_run_data(self, run: PipelineRun) -> None:
+        """تعيين مدة صلاحية لمفاتيح التشغيل في Redis"""
+        try:
+            # SCAN تدريجي بدلاً من KEYS الذي يحجب Redis أثناء مسح كل المفاتيح
+            async for key in self.redis.scan_iter(match=run.key('*')):
+                await self.redis.expire(key, RUN_DATA_TTL)
+        except Exception as e:
+            logging.warning(f"Warning expiring data for run {run.process_id}: {str(e)}")
+
     def _setup_metrics(self) -> None:
         """تهيئة المقاييس"""
         self.metrics = {
@@ -353,11 +684,13 @@ class AsyncStreamingCoreLogic:
                 'status': result.get('status', 'error')
             }
 
-            # إضافة النتيجة إلى التيار
+            result_data['process_id'] = self._run.process_id
+
+            # إضافة النتيجة إلى تيار التشغيل
             await self.redis.xadd(
-                self.stream_key,
+                self._run.stream_key,
                 result_data,
-                maxlen=1000  # الاحتفاظ فقط بآخر 1000 نتيجة
+                maxlen=RUN_STREAM_MAXLEN
             )
 
             logging.info(f"Task {task_number} result streamed successfully")
@@ -365,6 +698,21 @@ class AsyncStreamingCoreLogic:
         except Exception as e:
             logging.error(f"Error streaming task {task_number} result: {str(e)}")
 
+    async def stream_delta(self, task_number: int, delta: str, reset: bool = False) -> None:
+        """بث جزء من نص المهمة أثناء توليده (reset لبدء محاولة جديدة)"""
+        await self.redis.xadd(
+            self._run.stream_key,
+            {
+                'type': 'task_delta',
+                'task_number': str(task_number),
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'content': json.dumps({'delta': delta, 'reset': reset}),
+                'status': 'streaming',
+                'process_id': self._run.process_id
+            },
+            maxlen=RUN_STREAM_MAXLEN
+        )
+
     async def _health_check_loop(self) -> None:
         """حلقة فحص صحة الاتصال"""
         while True:
@@ -393,15 +741,18 @@ class AsyncStreamingCoreLogic:
 
     async def _attempt_reconnection(self) -> None:
         """محاولة إعادة الاتصال بـ Redis"""
-        for attempt in range(self.config['max_retries']):
-            try:
-                await self.init_redis()
-                if self.redis:
-                    logging.info("Successfully reconnected to Redis")
-                    return
-            except Exception as e:
-                logging.error(f"Reconnection attempt {attempt + 1} failed: {str(e)}")
-                await asyncio.sleep(2 ** attempt)
+        try:
+            await self.retry_policies['redis'].call(
+                self.init_redis,
+                operation='redis_reconnect',
+                retry_result=lambda connected: not self.redis
+            )
+            if self.redis:
+                logging.info("Successfully reconnected to Redis")
+            else:
+                logging.error("Reconnection to Redis failed")
+        except Exception as e:
+            logging.error(f"Reconnection attempt failed: {str(e)}")
 
     async def _monitor_resource_usage(self) -> None:
         """مراقبة استخدام الموارد"""
@@ -421,9 +772,10 @@ class AsyncStreamingCoreLogic:
                 resource_type='cpu'
             ).set(cpu_percent)
 
-            # عدد المهام النشطة
+            # عدد المهام النشطة في جميع التشغيلات
             active_tasks = sum(
-                1 for status in self._task_statuses.values()
+                1 for run in self._runs.values()
+                for status in run.statuses.values()
                 if status == TaskStatus.PROCESSING
             )
             self.metrics['active_tasks'].set(active_tasks)
@@ -435,11 +787,11 @@ class AsyncStreamingCoreLogic:
         """تنظيف البيانات القديمة"""
         try:
             # تنظيف Stream
-            await self.redis.xtrim(self.stream_key, maxlen=1000)
+            await self.redis.xtrim(self._run.stream_key, maxlen=RUN_STREAM_MAXLEN)
 
             # تنظيف بيانات المهام القديمة
             current_time = datetime.now(timezone.utc)
-            for task_number in range(1, 12):
+            for task_number in self.pipeline.task_numbers:
                 task_status = self._task_statuses.get(f'task{task_number}')
                 if task_status in [TaskStatus.COMPLETED, TaskStatus.FAILED]:
                     await self.cleanup_task_data(task_number)
@@ -447,6 +799,9 @@ class AsyncStreamingCoreLogic:
             # تنظيف الملفات المؤقتة
             await self._cleanup_temp_files()
 
+            # إزالة التشغيلات المنتهية من الذاكرة
+            self._evict_finished_runs()
+
             logging.info("Old data cleanup completed successfully")
 
         except Exception as e:
@@ -493,7 +848,7 @@ class AsyncStreamingCoreLogic:
             }
 
             await self.redis.hset(
-                'timeout_errors',
+                self._run.key('timeout_errors'),
                 mapping=timeout_details
             )
         except Exception as e:
@@ -555,39 +910,54 @@ class AsyncStreamingCoreLogic:
     async def configure_apis(self,
                              google_api_key: str,
                              eleven_labs_api_key: str,
-                             eleven_labs_voice_id: str) -> None:
+                             eleven_labs_voice_id: str,
+                             process_id: Optional[str] = None,
+                             validate: bool = True) -> None:
         """تكوين APIs مع التحقق من الصحة"""
         try:
-            # التحقق من المفاتيح
-            valid = await self.validate_api_keys(
-                google_api_key,
-                eleven_labs_api_key,
-                eleven_labs_voice_id
-            )
-            if not valid:
-                raise APIConfigurationError("API key validation failed")
+            # تكوين خاص بالتشغيل عند تمرير process_id
+            run = self.create_run(process_id) if process_id else None
+
+            # التحقق من المفاتيح (يمكن تخطيه إذا تم التحقق عند الإدراج في الطابور)
+            if validate:
+                valid = await self.validate_api_keys(
+                    google_api_key,
+                    eleven_labs_api_key,
+                    eleven_labs_voice_id
+                )
+                if not valid:
+                    raise APIConfigurationError("API key validation failed")
 
-            # تكوين Google Model
-            genai.configure(api_key=google_api_key)
-            self.google_model = genai.GenerativeModel('gemini-1.5-flash')
+            # نموذج Google الخاص بالمفتاح من المجمع
+            google_model = self.gemini_models.get(google_api_key)
 
             # تكوين Eleven Labs
-            self.eleven_labs_config = {
+            eleven_labs_config = {
                 'api_key': eleven_labs_api_key,
                 'voice_id': eleven_labs_voice_id
             }
 
-            # تشفير المفاتيح للتخزين المؤقت
-            encrypted_keys = await self._encrypt_api_keys({
-                'google': google_api_key,
-                'eleven_labs': eleven_labs_api_key
-            })
-
-            # حفظ التكوين المشفر في Redis
-            await self.redis.hset(
-                'api_config',
-                mapping=encrypted_keys
-            )
+            if run:
+                run.google_model = google_model
+                run.google_api_key = google_api_key
+                run.eleven_labs_config = eleven_labs_config
+            else:
+                self.google_model = google_model
+                self.google_api_key = google_api_key
+                self.eleven_labs_config = eleven_labs_config
+
+            with self.use_run(run or self._default_run):
+                # تشفير المفاتيح للتخزين المؤقت
+                encrypted_keys = await self._encrypt_api_keys({
+                    'google': google_api_key,
+                    'eleven_labs': eleven_labs_api_key
+                })
+
+                # حفظ التكوين المشفر في Redis
+                await self.redis.hset(
+                    self._run.key('api_config'),
+                    mapping=encrypted_keys
+                )
 
             logging.info("APIs configured successfully")
 
@@ -595,11 +965,177 @@ class AsyncStreamingCoreLogic:
             logging.error(f"API configuration error: {str(e)}")
             raise APIConfigurationError(f"Failed to configure APIs: {str(e)}")
 
-    async def chain_tasks(self, topic: str) -> None:
-        """تنفيذ سلسلة المهام مع مرونة محسنة"""
+    def share_api_config(self, source_process_id: str, process_id: str) -> PipelineRun:
+        """مشاركة تكوين المزودين مع تشغيل آخر دون إعادة التحقق أو التشفير (للدفعات)"""
+        source = self.get_run(source_process_id)
+        if not source or not source.google_model or not source.eleven_labs_config:
+            raise APIConfigurationError(f"Run {source_process_id} has no API configuration")
+
+        run = self.create_run(process_id)
+        run.google_model = source.google_model
+        run.google_api_key = source.google_api_key
+        run.eleven_labs_config = source.eleven_labs_config
+        return run
+
+    async def chain_tasks(
+            self,
+            topic: str,
+            process_id: Optional[str] = None,
+            resume: bool = True,
+            timeout: Optional[float] = None,
+            tasks: Optional[List[int]] = None
+    ) -> Dict:
+        """تنفيذ سلسلة المهام مع مرونة محسنة (أو مجموعة فرعية منها عند تمرير tasks) وإعادة حالتها النهائية"""
+        process_id = process_id or str(uuid.uuid4())
+        self.ensure_run_not_active(process_id)
+        run = self.create_run(process_id, topic=topic, timeout=timeout)
+        run.topic = topic
+        if timeout and not run.deadline:
+            run.deadline = RunDeadline(timeout)
+        # طلب إلغاء متبقٍ من تشغيل سابق بالمعرف نفسه لا يخص هذا التشغيل
+        await self._clear_cancel_request(run.process_id)
+        # تحقق ثانٍ دون انتظار قبل إسناد المهمة: سلسلة متزامنة ربما بدأت أثناء الانتظار
+        self.ensure_run_not_active(process_id)
+        try:
+            # تنفيذ السلسلة في مهمة مستقلة يمكن إلغاؤها دون إلغاء المستدعي
+            with self.use_run(run):
+                run.task = asyncio.create_task(
+                    self._run_chain(topic, resume=resume or bool(tasks), tasks=tasks),
+                    name=f'pipeline_run_{run.process_id}'
+                )
+            return await run.task
+        except asyncio.CancelledError:
+            if not run.cancel_requested:
+                raise
+            with self.use_run(run):
+                await self._finalize_cancelled_run()
+            return {'process_id': run.process_id, 'status': 'cancelled'}
+        finally:
+            run.task = None
+            run.finished_at = datetime.now(timezone.utc)
+            await self._expire_run_data(run)
+
+    async def register_run_owner(self, process_id: str, user_id: str) -> None:
+        """حفظ مالك التشغيل عند إنشائه أو إدراجه ليتحقق منه أي عامل أو نسخة من الواجهة"""
+        owner_key = PipelineRun.key_for(process_id, 'owner')
+        owner = await self.redis.get(owner_key)
+        if owner and owner != user_id:
+            raise RunOwnershipError(f"Run {process_id} belongs to another user")
+        await self.redis.set(owner_key, user_id, ex=RUN_DATA_TTL)
+        # الطلب الجديد للتشغيل نفسه (مثل إعادة التوليد) يلغي أثر طلبات الإلغاء السابقة
+        await self._clear_cancel_request(process_id)
+
+    async def get_run_owner(self, process_id: str) -> Optional[str]:
+        """مالك التشغيل (None إذا لم يُعرف التشغيل)"""
+        run = self.get_run(process_id)
+        if run and run.user_id:
+            return run.user_id
+        try:
+            owner = await self.redis.get(PipelineRun.key_for(process_id, 'owner'))
+        except Exception as e:
+            logging.error(f"Error reading owner of run {process_id}: {str(e)}")
+            return None
+        # التشغيلات المنتهية قبل حفظ المالك تحمله في حالة السلسلة
+        return owner or (await self.get_chain_status(process_id)).get('user_id')
+
+    async def _clear_cancel_request(self, process_id: str) -> None:
+        """حذف علامة الإلغاء المنتظرة للتشغيل"""
+        try:
+            await self.redis.delete(PipelineRun.key_for(process_id, 'cancel_requested'))
+        except Exception as e:
+            logging.warning(f"Warning clearing cancellation of run {process_id}: {str(e)}")
+
+    async def cancel_run(self, process_id: str) -> bool:
+        """إلغاء تشغيل جارٍ في هذه العملية أو نشر طلب الإلغاء لبقية العمال"""
+        if self._cancel_local_run(process_id):
+            return True
+
+        try:
+            # علامة للتشغيلات التي لم تبدأ بعد في الطابور
+            await self.redis.set(PipelineRun.key_for(process_id, 'cancel_requested'), 1, ex=RUN_DATA_TTL)
+            receivers = await self.redis.publish(CANCEL_CHANNEL, process_id)
+            logging.info(f"Cancellation of run {process_id} published to {receivers} subscribers")
+            return receivers > 0
+        except Exception as e:
+            logging.error(f"Error publishing cancellation for run {process_id}: {str(e)}")
+            return False
+
+    def _cancel_local_run(self, process_id: str) -> bool:
+        """إلغاء مهام التشغيل إذا كان يعمل في هذه العملية"""
+        run = self.get_run(process_id)
+        if not run or not run.task or run.task.done():
+            return False
+
+        run.cancel_requested = True
+        run.task.cancel()
+        logging.info(f"Run {process_id} cancellation requested")
+        return True
+
+    async def is_cancel_requested(self, process_id: str) -> bool:
+        """التحقق من طلب إلغاء تشغيل لم يبدأ بعد"""
+        try:
+            return bool(await self.redis.get(PipelineRun.key_for(process_id, 'cancel_requested')))
+        except Exception as e:
+            logging.error(f"Error checking cancellation for run {process_id}: {str(e)}")
+            return False
+
+    async def listen_for_cancellations(self) -> None:
+        """الاستماع لطلبات الإلغاء المنشورة من عمليات أخرى"""
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(CANCEL_CHANNEL)
+                async for message in pubsub.listen():
+                    if message.get('type') == 'message':
+                        self._cancel_local_run(message['data'])
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logging.error(f"Cancellation listener error: {str(e)}")
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    async def _finalize_cancelled_run(self) -> None:
+        """تسجيل إلغاء التشغيل وتنظيف موارده"""
+        try:
+            for task_number in self.pipeline.task_numbers:
+                if self._task_statuses.get(f'task{task_number}') in [TaskStatus.PENDING, TaskStatus.PROCESSING]:
+                    await self._update_task_status(task_number, TaskStatus.CANCELLED)
+
+            await self._store_chain_status({
+                'process_id': self._run.process_id,
+                'user_id': self._run.user_id,
+                'topic': self._run.topic,
+                'status': 'cancelled',
+                'end_time': datetime.now(timezone.utc)
+            })
+            await self.stream_result(0, {'status': 'cancelled', 'message': 'Run cancelled'})
+
+            # حذف الملفات المؤقتة الخاصة بالتشغيل
+            shutil.rmtree(f'./temp/{self._run.process_id}', ignore_errors=True)
+            logging.info(f"Run {self._run.process_id} cancelled")
+
+        except Exception as e:
+            logging.error(f"Error finalizing cancelled run: {str(e)}")
+
+    def chain_failure(self, chain_status: Dict) -> Optional[str]:
+        """سبب فشل التشغيل من حالته النهائية (None عند النجاح)"""
+        if chain_status.get('status') == 'error':
+            return chain_status.get('error') or 'Task chain error'
+        failed = sorted(set(chain_status.get('failed_tasks', [])) & set(self.pipeline.critical_tasks()))
+        if failed:
+            return f"Critical tasks failed: {failed}"
+        return None
+
+    async def _run_chain(self, topic: str, resume: bool = True, tasks: Optional[List[int]] = None) -> Dict:
+        """تنفيذ سلسلة المهام ضمن سياق التشغيل الحالي"""
         try:
-            logging.info("Starting task chain")
+            logging.info(f"Starting task chain for run {self._run.process_id}")
             chain_status = {
+                'process_id': self._run.process_id,
+                'user_id': self._run.user_id,
+                'topic': topic,
                 'start_time': datetime.now(timezone.utc),
                 'completed_tasks': [],
                 'failed_tasks': [],
@@ -612,25 +1148,53 @@ class AsyncStreamingCoreLogic:
                 raise ResourceExhaustionError("Failed to acquire chain resources")
 
             try:
-                # إنشاء مجموعة مهام متزامنة
-                async with asyncio.TaskGroup() as tg:
-                    for task_number in range(1, 12):
-                        # التحقق من المتطلبات المسبقة
-                        if not await self._check_prerequisites(task_number):
-                            chain_status['skipped_tasks'].append(task_number)
-                            logging.warning(f"Skipping task {task_number} due to unmet prerequisites")
-                            continue
-
-                        # تنفيذ المهمة
-                        task_func = getattr(self, f'task_{task_number}_execute', None)
-                        if task_func:
-                            if await self._execute_task(task_number, task_func, topic):
-                                chain_status['completed_tasks'].append(task_number)
-                            else:
-                                chain_status['failed_tasks'].append(task_number)
-                                if not self._can_continue_after_failure(task_number):
-                                    logging.error(f"Task chain stopped after task {task_number} failure")
-                                    break
+                # استئناف التشغيل من أول مهمة غير مكتملة
+                resumed_tasks = await self._restore_checkpoints() if resume else []
+
+                # إعادة التوليد الانتقائي: إبطال المهام المطلوبة فقط والإبقاء على نتائج ما قبلها
+                if tasks:
+                    await self._invalidate_tasks(tasks)
+                    resumed_tasks = [n for n in resumed_tasks if n not in tasks]
+                    # المهام الاختيارية السابقة بلا نقطة استئناف تُخطت في التشغيل الأصلي فتبقى متخطاة
+                    for n in self._upstream_tasks(tasks):
+                        if n not in resumed_tasks and self.pipeline.get(n).optional:
+                            self._task_statuses[f'task{n}'] = TaskStatus.SKIPPED
+                    chain_status['regenerated_tasks'] = sorted(tasks)
+                    self._run.regenerated_tasks = sorted(tasks)
+                    task_numbers = sorted(tasks)
+                else:
+                    task_numbers = [n for n in self.pipeline.task_numbers if n not in resumed_tasks]
+                chain_status['resumed_tasks'] = resumed_tasks
+
+                # تشغيل المهام وفق رسم التبعيات: تبدأ كل مهمة فور اكتمال متطلباتها
+                scheduler = TaskGraphScheduler(
+                    prerequisites=self._task_prerequisites,
+                    task_numbers=task_numbers,
+                    max_concurrency=self.config['max_concurrent_tasks']
+                )
+
+                report = await scheduler.run(
+                    lambda task_number: self._run_stage(task_number, topic),
+                    can_start=self._check_prerequisites,
+                    can_continue=self._can_continue_after_failure
+                )
+                chain_status.update(report)
+                chain_status['optional_skipped_tasks'] = [
+                    n for n in self.pipeline.optional_tasks()
+                    if self._task_statuses.get(f'task{n}') == TaskStatus.SKIPPED
+                ]
+                if self._run.deadline:
+                    chain_status['deadline'] = self._run.deadline.to_dict()
+                if self._run.prompt_stats:
+                    chain_status['prompt_stats'] = {
+                        str(n): stats for n, stats in self._run.prompt_stats.items()
+                    }
+
+                critical_path = report['critical_path']
+                logging.info(
+                    f"Critical path: {' -> '.join(map(str, critical_path['tasks']))} "
+                    f"({critical_path['duration']:.2f}s)"
+                )
 
             finally:
                 # تحرير الموارد
@@ -642,10 +1206,11 @@ class AsyncStreamingCoreLogic:
 
             await self._store_chain_status(chain_status)
             logging.info("Task chain completed")
+            return chain_status
 
         except Exception as e:
             logging.error(f"Task chain error: {str(e)}")
-            await self._handle_chain_error(e)
+            return await self._handle_chain_error(e)
 
     # إضافة الدوال المفقودة
     async def _handle_connection_error(self, error: Exception) -> None:
@@ -666,11 +1231,11 @@ class AsyncStreamingCoreLogic:
     async def _test_google_api(self, api_key: str) -> bool:
         """اختبار صلاحية Google API"""
         try:
-            genai.configure(api_key=api_key)
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            response = await model.generate_content("Test")
+            model = self.gemini_models.get(api_key)
+            response = await self.gemini_client.generate(model, "Test")
             return bool(response and response.text)
         except Exception as e:
+            self.gemini_models.discard(api_key)
             logging.error(f"Google API test failed: {str(e)}")
             return False
 
@@ -711,7 +1276,13 @@ class AsyncStreamingCoreLogic:
                 return False
 
             # حفظ النتيجة
-            self._results[f'task{task_number}'].set_success(result['content'])
+            task_result = self._results[f'task{task_number}']
+            task_result.set_success(result['content'])
+            task_result.duration = result.get('duration')
+
+            # حفظ نقطة استئناف لتجنب إعادة تنفيذ المهمة عند استئناف التشغيل
+            await self._save_checkpoint(task_number, task_result)
+
             logging.info(f"Task {task_number} completed successfully")
             return True
 
@@ -720,14 +1291,119 @@ class AsyncStreamingCoreLogic:
             await self._handle_check_error(task_number, e)
             return False
 
+    async def _save_checkpoint(self, task_number: int, task_result: TaskResult) -> None:
+        """حفظ نتيجة المهمة الناجحة كنقطة استئناف"""
+        try:
+            checkpoint_key = self._run.key('checkpoints')
+            await self.redis.hset(
+                checkpoint_key,
+                f'task{task_number}',
+                json.dumps(task_result.to_dict(), default=str)
+            )
+            await self.redis.expire(checkpoint_key, RUN_DATA_TTL)
+        except Exception as e:
+            logging.error(f"Error saving checkpoint for task {task_number}: {str(e)}")
+
+    async def _restore_checkpoints(self) -> List[int]:
+        """استعادة نتائج المهام المكتملة من نقاط الاستئناف"""
+        restored = []
+        try:
+            checkpoints = await self.redis.hgetall(self._run.key('checkpoints'))
+            for task_key, raw in (checkpoints or {}).items():
+                task_result = TaskResult.from_dict(json.loads(raw))
+                if task_key not in self._results or task_result.error or task_result.content is None:
+                    continue
+
+                self._results[task_key] = task_result
+                self._task_statuses[task_key] = TaskStatus.COMPLETED
+                restored.append(int(task_key.replace('task', '')))
+
+            # المهام 9 و11 تقرأ بيانات الصوت الوصفية من Redis
+            if 8 in restored and isinstance(self._results['task8'].content, dict):
+                await self._store_audio_metadata(self._results['task8'].content)
+
+            if restored:
+                logging.info(f"Run {self._run.process_id} resumed with completed tasks {sorted(restored)}")
+
+        except Exception as e:
+            logging.error(f"Error restoring checkpoints: {str(e)}")
+
+        return sorted(restored)
+
+    def get_dependent_tasks(self, task_number: int) -> List[int]:
+        """المهمة وجميع المهام التابعة لها مباشرة أو بشكل غير مباشر"""
+        if task_number not in self.pipeline.task_numbers:
+            raise ValueError(f"Invalid task number: {task_number}")
+        return self.pipeline.dependents(task_number)
+
+    def _upstream_tasks(self, tasks: List[int]) -> Set[int]:
+        """المتطلبات المباشرة للمهام المعاد توليدها من خارجها"""
+        return {
+            prereq
+            for task in tasks
+            for prereq in self._task_prerequisites.get(task, [])
+            if prereq not in tasks
+        }
+
+    async def prepare_regeneration(self, process_id: str, task_number: int) -> Dict:
+        """التحقق من إمكانية إعادة توليد مهمة وتحديد المهام المتأثرة"""
+        run = self.get_run(process_id)
+        if run and not run.is_finished:
+            raise ValueError(f"Run {process_id} is still in progress")
+
+        tasks = self.get_dependent_tasks(task_number)
+        chain_status = await self.get_chain_status(process_id)
+        topic = chain_status.get('topic') or (run.topic if run else None)
+        if not topic:
+            raise ValueError(f"Run {process_id} not found")
+
+        # يجب توفر نتائج المهام السابقة (الإلزامية) في نقاط الاستئناف
+        checkpoints = await self.redis.hkeys(PipelineRun.key_for(process_id, 'checkpoints'))
+        missing = sorted(
+            n for n in self._upstream_tasks(tasks)
+            if f'task{n}' not in (checkpoints or [])
+            and not self.pipeline.get(n).optional
+            and not self.pipeline.is_soft_input(n)
+        )
+        if missing:
+            raise ValueError(f"Upstream results missing for tasks {missing}")
+
+        return {
+            'process_id': process_id,
+            'topic': topic,
+            'user_id': await self.get_run_owner(process_id),
+            'tasks': tasks
+        }
+
+    async def _invalidate_tasks(self, tasks: List[int]) -> None:
+        """إبطال نتائج المهام قبل إعادة توليدها"""
+        try:
+            for task_number in tasks:
+                self._results[f'task{task_number}'] = TaskResult()
+                self._task_statuses[f'task{task_number}'] = TaskStatus.PENDING
+
+            await self.redis.hdel(self._run.key('checkpoints'), *[f'task{n}' for n in tasks])
+            await self.redis.hset(
+                self._run.key('task_status'),
+                mapping={f'task_{n}': TaskStatus.PENDING.value for n in tasks}
+            )
+            if 8 in tasks:
+                await self.redis.delete(self._run.key('task_8_metadata'))
+
+            logging.info(f"Run {self._run.process_id} invalidated tasks {sorted(tasks)}")
+
+        except Exception as e:
+            logging.error(f"Error invalidating tasks {tasks}: {str(e)}")
+
     async def _update_task_status(self, task_number: int, status: TaskStatus) -> None:
         """تحديث حالة المهمة"""
         try:
+            previous_status = self._task_statuses.get(f'task{task_number}')
             self._task_statuses[f'task{task_number}'] = status
 
             # تحديث في Redis
             await self.redis.hset(
-                'task_status',
+                self._run.key('task_status'),
                 f'task_{task_number}',
                 status.value
             )
@@ -735,7 +1411,7 @@ class AsyncStreamingCoreLogic:
             # تحديث المقاييس
             if status == TaskStatus.PROCESSING:
                 self.metrics['active_tasks'].inc()
-            elif status in [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED]:
+            elif previous_status == TaskStatus.PROCESSING:
                 self.metrics['active_tasks'].dec()
 
             logging.info(f"Task {task_number} status updated to {status.value}")
@@ -747,8 +1423,8 @@ class AsyncStreamingCoreLogic:
         """التراجع عن التغييرات غير الصالحة"""
         try:
             # استرجاع النسخ الاحتياطية
-            for task_number in range(1, 12):
-                backup_key = f'task_{task_number}_backup'
+            for task_number in self.pipeline.task_numbers:
+                backup_key = self._run.key(f'task_{task_number}_backup')
                 backup_data = await self.redis.get(backup_key)
                 if backup_data:
                     self._results[f'task{task_number}'] = TaskResult.from_dict(json.loads(backup_data))
@@ -784,22 +1460,119 @@ class AsyncStreamingCoreLogic:
         await self._store_error_details(task_number, {'message': str(error)})
         logging.error(f"Check error for task {task_number}: {str(error)}")
 
+    def _is_prerequisite_satisfied(self, task_number: int, prereq: int) -> bool:
+        """التحقق من متطلب واحد (المهام الاختيارية المتخطاة لا تمنع التابعة لها)"""
+        if self.pipeline.is_soft_input(prereq, for_stage=task_number):
+            return True
+        status = self._task_statuses.get(f'task{prereq}')
+        if status == TaskStatus.SKIPPED and self.pipeline.get(prereq).optional:
+            return True
+        return status == TaskStatus.COMPLETED
+
     async def _check_prerequisites(self, task_number: int) -> bool:
         """التحقق من المتطلبات المسبقة للمهمة"""
         prerequisites = self._task_prerequisites.get(task_number, [])
-        for prereq in prerequisites:
-            if prereq == 8 and task_number in [9, 11]:
-                continue
-            if self._task_statuses.get(f'task{prereq}') != TaskStatus.COMPLETED:
-                return False
-        return True
+        return all(self._is_prerequisite_satisfied(task_number, prereq) for prereq in prerequisites)
+
+    def _pending_tasks(self) -> List[int]:
+        """المهام التي لم تنتهِ بعد في التشغيل الحالي"""
+        return [
+            n for n in self.pipeline.task_numbers
+            if self._task_statuses.get(f'task{n}') in [TaskStatus.PENDING, TaskStatus.PROCESSING]
+        ]
+
+    def _task_time_budget(self, task_number: int) -> float:
+        """المهلة المخصصة للمهمة من الموعد النهائي للتشغيل"""
+        stage_timeout = self.pipeline.get(task_number).timeout
+        deadline = self._run.deadline
+        if not deadline:
+            return stage_timeout or self.config['timeout']
+        budget = task_budget(
+            task_number,
+            deadline.remaining(),
+            self._task_prerequisites,
+            self._pending_tasks(),
+            self.latency_tracker.estimate,
+            skippable=self.pipeline.optional_tasks()
+        )
+        return min(budget, stage_timeout) if stage_timeout else budget
 
-    async def _execute_task(self, task_number: int, task_func: callable, *args) -> bool:
-        """تنفيذ مهمة مع معالجة محسنة للحالات الاستثنائية"""
+    def _should_skip_for_deadline(self, task_number: int) -> bool:
+        """تخطي المهمة الاختيارية إذا لم يكفِ الوقت المتبقي"""
+        deadline = self._run.deadline
+        if not deadline:
+            return False
+        return should_skip_optional(
+            task_number,
+            deadline.remaining(),
+            self._task_prerequisites,
+            self._pending_tasks(),
+            self.latency_tracker.estimate,
+            self.pipeline.optional_tasks()
+        )
+
+    def _remaining_task_time(self) -> Optional[float]:
+        """الوقت المتبقي للمهمة الجارية (None خارج المهام)"""
+        expires_at = _task_deadline.get()
+        if expires_at is None:
+            return None
+        return max(0.0, expires_at - time.monotonic())
+
+    def _call_timeout(self, default: float) -> float:
+        """مهلة استدعاء المزود ضمن الوقت المتبقي للمهمة"""
+        expires_at = _task_deadline.get()
+        if expires_at is None:
+            return default
+        return max(1.0, min(default, expires_at - time.monotonic()))
+
+    async def _record_task_latency(self, task_number: int, seconds: float) -> None:
+        """تحديث تقدير زمن المهمة ومشاركته عبر Redis"""
+        estimate = self.latency_tracker.observe(task_number, seconds)
         try:
-            # التحقق من صلاحية المهمة
-            if not await self._validate_task_execution(task_number):
-                return False
+            await self.redis.hset(TASK_LATENCY_KEY, str(task_number), estimate)
+        except Exception as e:
+            logging.error(f"Error storing task {task_number} latency: {str(e)}")
+
+    async def _skip_task(self, task_number: int, reason: str) -> None:
+        """تخطي مهمة اختيارية"""
+        logging.warning(f"Skipping optional task {task_number}: {reason}")
+        self._results[f'task{task_number}'] = TaskResult()
+        await self._update_task_status(task_number, TaskStatus.SKIPPED)
+
+    async def _run_stage(self, task_number: int, topic: str) -> Optional[bool]:
+        """تنفيذ مرحلة من السجل مع سياسة إعادة المحاولة الخاصة بها"""
+        stage = self.pipeline.get(task_number)
+        handler = getattr(self, stage.handler, None)
+        if not handler:
+            logging.error(f"Stage {task_number} handler {stage.handler} not found")
+            return False
+
+        # رفض التنفيذ لعدم اكتمال المتطلبات لا تغيره إعادة المحاولة، فيُتحقق منه مرة واحدة
+        if not await self._validate_task_execution(task_number):
+            return False
+
+        # إعادة المرحلة كاملة تضاف إلى محاولات سياسة المزود والتحوط داخل كل تنفيذ،
+        # فأقصى عدد لاستدعاءات المزود = (retries + 1) × محاولات المزود × 2 مع التحوط
+        args = (topic,) if stage.passes_topic else ()
+        deadline = self._run.deadline
+        policy = RetryPolicy(
+            max_attempts=stage.retries + 1,
+            base_delay=stage.retry_backoff,
+            deadline=deadline.remaining if deadline else None
+        )
+        return await policy.call(
+            lambda: self._execute_task(task_number, handler, *args),
+            operation=f'stage_{stage.name}',
+            retry_result=lambda success: success is False
+        )
+
+    async def _execute_task(self, task_number: int, task_func: callable, *args) -> Optional[bool]:
+        """تنفيذ مهمة تم التحقق من متطلباتها (False عند فشل التنفيذ، None عند تخطي مهمة اختيارية)"""
+        try:
+            # تخطي المهام الاختيارية عند ضيق الوقت المتبقي
+            if self._should_skip_for_deadline(task_number):
+                await self._skip_task(task_number, "insufficient time before run deadline")
+                return None
 
             # تحديث حالة المهمة إلى "قيد التنفيذ"
             await self._update_task_status(task_number, TaskStatus.PROCESSING)
@@ -809,11 +1582,13 @@ class AsyncStreamingCoreLogic:
                 raise ResourceExhaustionError(f"Failed to acquire resources for task {task_number}")
 
             try:
-                # إعداد مهلة زمنية للتنفيذ
-                timeout = ClientTimeout(total=self.config['timeout'])
+                # إعداد مهلة زمنية للتنفيذ من الموعد النهائي للتشغيل
+                budget = self._task_time_budget(task_number)
+                _task_deadline.set(time.monotonic() + budget)
+                _current_task.set(task_number)
 
                 # تنفيذ المهمة مع مراقبة الوقت والموارد
-                async with async_timeout.timeout(self.config['timeout']):
+                async with async_timeout.timeout(budget):
                     start_time = datetime.now()
 
                     # تنفيذ المهمة
@@ -825,14 +1600,16 @@ class AsyncStreamingCoreLogic:
                     # تحديث قياسات الأداء
                     self.metrics['task_duration'].labels(
                         task_number=str(task_number)
-                    ).observe(execution_time)
+                    ).inc(execution_time)
 
                     # التحقق من النتيجة
                     success = await self._check_task_result(task_number, result)
+                    if success:
+                        await self._record_task_latency(task_number, execution_time)
 
                     # تحديث الحالة النهائية
                     final_status = TaskStatus.COMPLETED if success else TaskStatus.FAILED
-                    if task_number == 8 and not success:
+                    if not success and self.pipeline.is_soft_input(task_number):
                         final_status = TaskStatus.FAILED_CONTINUING
 
                     await self._update_task_status(task_number, final_status)
@@ -844,6 +1621,9 @@ class AsyncStreamingCoreLogic:
                 await self._release_task_resources(task_number)
 
         except asyncio.TimeoutError:
+            if self.pipeline.get(task_number).optional and self._run.deadline:
+                await self._skip_task(task_number, "time budget exhausted")
+                return None
             logging.error(f"Task {task_number} timed out")
             await self._handle_timeout(task_number)
             return False
@@ -859,7 +1639,7 @@ class AsyncStreamingCoreLogic:
             # التحقق من المتطلبات المسبقة
             prerequisites = self._task_prerequisites.get(task_number, [])
             for prereq in prerequisites:
-                if self._task_statuses.get(f'task{prereq}') != TaskStatus.COMPLETED:
+                if not self._is_prerequisite_satisfied(task_number, prereq):
                     logging.error(f"Task {prereq} must be completed before task {task_number}")
                     return False
 
@@ -875,20 +1655,24 @@ class AsyncStreamingCoreLogic:
             logging.error(f"Error validating task {task_number}: {str(e)}")
             return False
 
+    def _is_under_resource_pressure(self) -> bool:
+        """التحقق من ضغط الذاكرة أو المعالج"""
+        # أكثر من 90% مستخدم
+        return psutil.virtual_memory().percent > 90 or psutil.cpu_percent() > 90
+
     async def _acquire_chain_resources(self) -> bool:
         """حجز الموارد للسلسلة"""
         try:
-            # التحقق من توفر الذاكرة
-            memory = psutil.virtual_memory()
-            if memory.percent > 90:  # أكثر من 90% مستخدم
-                raise ResourceExhaustionError("Insufficient memory")
-
-            # التحقق من توفر CPU
-            if psutil.cpu_percent() > 90:  # أكثر من 90% مستخدم
-                raise ResourceExhaustionError("High CPU usage")
-
+            # انتظار دور التشغيل بدلاً من رفضه عند ضغط الموارد
+            run = self._run
+            run.admission_ticket = await self.admission_scheduler.acquire(
+                run.user_id or 'anonymous',
+                run.priority
+            )
             return True
 
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
             logging.error(f"Error acquiring chain resources: {str(e)}")
             return False
@@ -896,70 +1680,24 @@ class AsyncStreamingCoreLogic:
     async def _release_chain_resources(self) -> None:
         """تحرير موارد السلسلة"""
         try:
+            # إتاحة المكان للتشغيل التالي في طابور القبول
+            self.admission_scheduler.release(self._run.admission_ticket)
+            self._run.admission_ticket = None
+
             # تنظيف الذاكرة المؤقتة
+            # (السيمافورات مشتركة بين التشغيلات وتُحرر عند انتهاء كل مهمة)
             await self.cleanup_old_data()
 
-            # تحرير السيمافورات
-            for semaphore in self._task_semaphores.values():
-                while semaphore._value < semaphore._bound_value:
-                    semaphore.release()
-
         except Exception as e:
             logging.error(f"Error releasing chain resources: {str(e)}")
 
-        # تنفيذ المهام المحددة
-
-    async def task_1_execute(self, topic: str) -> Dict:
-        """تنفيذ المهمة 1: توليد المواضيع"""
-        return await self.task_1_generate_youtube_shorts_topics(topic)
-
-    async def task_2_execute(self, topic: str) -> Dict:
-        """تنفيذ المهمة 2: تحليل الاتجاهات"""
-        return await self.task_2_YouTube_Shorts_Analyse_Trends()
-
-    async def task_3_execute(self, topic: str) -> Dict:
-        """تنفيذ المهمة 3: تحسين المشاركة"""
-        return await self.task_3_YouTube_Shorts_Improve_Audience_Engagement()
-
-    async def task_4_execute(self, topic: str) -> Dict:
-        """تنفيذ المهمة 4: كتابة النصوص"""
-        return await self.task_4_YouTube_Shorts_Write_Scripts()
-
-    async def task_5_execute(self, topic: str) -> Dict:
-        """تنفيذ المهمة 5: بحث الكلمات المفتاحية"""
-        return await self.task_5_SEO_keyword_research()
-
-    async def task_6_execute(self, topic: str) -> Dict:
-        """تنفيذ المهمة 6: كتابة الوصف"""
-        return await self.task_6_YouTube_Shorts_Write_Description()
-
-    async def task_7_execute(self, topic: str) -> Dict:
-        """تنفيذ المهمة 7: اقتراح العنوان"""
-        return await self.task_7_YouTube_Shorts_Suggest_SEO_Title()
-
-    async def task_8_execute(self, topic: str) -> Dict:
-        """تنفيذ المهمة 8: توليد الصوت"""
-        return await self.task_8_generate_audio()
-
-    async def task_9_execute(self, topic: str) -> Dict:
-        """تنفيذ المهمة 9: إنشاء لوحة القصة"""
-        return await self.task_9_Storyboard_Scenes()
-
-    async def task_10_execute(self, topic: str) -> Dict:
-        """تنفيذ المهمة 10: تحليل المشاهد"""
-        return await self.task_10_image_Scenes()
-
-    async def task_11_execute(self, topic: str) -> Dict:
-        """تنفيذ المهمة 11: توليد الصور"""
-        return await self.task_11_generate_images()
-
         # Cleanup methods
 
     async def cleanup_all_tasks(self) -> None:
         """تنظيف جميع المهام"""
         try:
             # تنظيف بيانات المهام
-            for task_number in range(1, 12):
+            for task_number in self.pipeline.task_numbers:
                 await self.cleanup_task_data(task_number)
 
             # تنظيف البيانات المؤقتة
@@ -982,18 +1720,18 @@ class AsyncStreamingCoreLogic:
                 return
 
             # تنظيف الملفات المؤقتة
-            temp_dir = f'./temp/task_{task_number}'
+            temp_dir = f'./temp/{self._run.process_id}/task_{task_number}'
             if os.path.exists(temp_dir):
                 shutil.rmtree(temp_dir, ignore_errors=True)
 
-            # تنظيف بيانات Redis
+            # تنظيف بيانات Redis الخاصة بالتشغيل
             patterns = [
-                f'task_{task_number}_*',
-                f'temp_task_{task_number}_*'
+                self._run.key(f'task_{task_number}_*'),
+                self._run.key(f'temp_task_{task_number}_*')
             ]
             for pattern in patterns:
                 try:
-                    keys = await self.redis.keys(pattern)
+                    keys = [key async for key in self.redis.scan_iter(match=pattern)]
                     if keys:
                         await self.redis.delete(*keys)
                 except Exception as e:
@@ -1029,7 +1767,7 @@ class AsyncStreamingCoreLogic:
 
             # تخزين تفاصيل الخطأ
             await self.redis.hset(
-                f'task_{task_number}_error',
+                self._run.key(f'task_{task_number}_error'),
                 mapping=error_details
             )
 
@@ -1061,27 +1799,25 @@ class AsyncStreamingCoreLogic:
         await self.cleanup_task_data(task_number)
         await self._monitor_resource_usage()
 
-    async def _handle_chain_error(self, error: Exception) -> None:
-        """معالجة أخطاء السلسلة"""
+    async def _handle_chain_error(self, error: Exception) -> Dict:
+        """معالجة أخطاء السلسلة وإعادة حالة الخطأ"""
         error_details = {
             'error_type': type(error).__name__,
             'error_message': str(error),
             'timestamp': datetime.now(timezone.utc).isoformat(),
             'traceback': traceback.format_exc()
         }
+        chain_status = {
+            'process_id': self._run.process_id,
+            'status': 'error',
+            'error': str(error),
+            'error_type': type(error).__name__,
+            'timestamp': error_details['timestamp']
+        }
 
         try:
-            # تحديث حالة السلسلة
-            await self.redis.hset(
-                'chain_status',
-                mapping={
-                    'status_text': json.dumps({
-                        'status': 'error',
-                        'message': str(error),
-                        'timestamp': datetime.now(timezone.utc).isoformat()
-                    })
-                }
-            )
+            # تحديث حالة السلسلة في الحقل نفسه الذي تقرؤه get_chain_status
+            await self._store_chain_status(chain_status)
 
             # تسجيل الخطأ
             logging.error(f"Chain error: {error_details}")
@@ -1092,6 +1828,8 @@ class AsyncStreamingCoreLogic:
         except Exception as e:
             logging.critical(f"Error handling chain failure: {str(e)}")
 
+        return chain_status
+
     # وظائف مساعدة للمهام
     async def _store_error_details(self, task_number: int, error_info: Dict) -> None:
         """تخزين تفاصيل الخطأ"""
@@ -1102,7 +1840,7 @@ class AsyncStreamingCoreLogic:
                 **error_info
             }
             await self.redis.hset(
-                f'task_{task_number}_error',
+                self._run.key(f'task_{task_number}_error'),
                 mapping=error_details
             )
         except Exception as e:
@@ -1112,9 +1850,9 @@ class AsyncStreamingCoreLogic:
         """تخزين حالة السلسلة"""
         try:
             await self.redis.hset(
-                'chain_status',
+                self._run.key('chain_status'),
                 mapping={
-                    'status': json.dumps(status),
+                    'status': json.dumps(status, default=str),
                     'last_update': datetime.now(timezone.utc).isoformat()
                 }
             )
@@ -1125,12 +1863,10 @@ class AsyncStreamingCoreLogic:
     async def _acquire_task_resources(self, task_number: int) -> bool:
         """حجز موارد المهمة"""
         try:
-            if task_number == 8:  # مهمة الصوت
+            pool = self.pipeline.get(task_number).resource_pool
+            if pool:
                 async with async_timeout.timeout(10):
-                    await self._task_semaphores['audio'].acquire()
-            elif task_number in [9, 10, 11]:  # مهام الصور
-                async with async_timeout.timeout(10):
-                    await self._task_semaphores['image'].acquire()
+                    await self._task_semaphores[pool].acquire()
             return True
         except Exception as e:
             logging.error(f"Failed to acquire resources for task {task_number}: {str(e)}")
@@ -1139,19 +1875,31 @@ class AsyncStreamingCoreLogic:
     async def _release_task_resources(self, task_number: int) -> None:
         """تحرير موارد المهمة"""
         try:
-            if task_number == 8:
-                self._task_semaphores['audio'].release()
-            elif task_number in [9, 10, 11]:
-                self._task_semaphores['image'].release()
+            pool = self.pipeline.get(task_number).resource_pool
+            if pool:
+                self._task_semaphores[pool].release()
         except Exception as e:
             logging.error(f"Error releasing resources for task {task_number}: {str(e)}")
 
     # وظائف المراقبة والتسجيل
-    async def get_task_status(self, task_number: int) -> Dict:
+    async def get_task_status(self, task_number: int, process_id: Optional[str] = None) -> Dict:
         """الحصول على حالة المهمة"""
         try:
-            status = self._task_statuses.get(f'task{task_number}')
-            result = self._results.get(f'task{task_number}')
+            run = self.get_run(process_id) if process_id else self._run
+            if not run:
+                # التشغيل غير موجود في هذه العملية، القراءة من Redis
+                status_raw = await self.redis.hget(
+                    PipelineRun.key_for(process_id, 'task_status'),
+                    f'task_{task_number}'
+                )
+                return {
+                    'task_number': task_number,
+                    'status': status_raw or 'unknown',
+                    'result': None
+                }
+
+            status = run.statuses.get(f'task{task_number}')
+            result = run.results.get(f'task{task_number}')
 
             return {
                 'task_number': task_number,
@@ -1166,10 +1914,11 @@ class AsyncStreamingCoreLogic:
                 'error': str(e)
             }
 
-    async def get_chain_status(self) -> Dict:
+    async def get_chain_status(self, process_id: Optional[str] = None) -> Dict:
         """الحصول على حالة السلسلة"""
         try:
-            status_raw = await self.redis.hget('chain_status', 'status')
+            key = PipelineRun.key_for(process_id, 'chain_status') if process_id else self._run.key('chain_status')
+            status_raw = await self.redis.hget(key, 'status')
             if status_raw:
                 return json.loads(status_raw)
             return {
@@ -1183,6 +1932,39 @@ class AsyncStreamingCoreLogic:
                 'error': str(e)
             }
 
+    async def get_process_updates(
+            self,
+            process_id: str,
+            last_event_id: Optional[str] = None,
+            block_ms: int = 5000
+    ) -> List[Dict]:
+        """قراءة التحديثات الجديدة لتشغيل معين من Redis stream"""
+        try:
+            stream_key = PipelineRun.key_for(process_id, 'stream')
+            entries = await self.redis.xread(
+                {stream_key: last_event_id or '0-0'},
+                count=100,
+                block=block_ms
+            )
+
+            updates = []
+            for _, messages in entries or []:
+                for event_id, data in messages:
+                    updates.append({
+                        'id': event_id,
+                        'type': data.get('type', 'task_result'),
+                        'process_id': data.get('process_id', process_id),
+                        'task_number': int(data.get('task_number', 0)),
+                        'status': data.get('status'),
+                        'timestamp': data.get('timestamp'),
+                        'content': json.loads(data.get('content', '{}'))
+                    })
+            return updates
+
+        except Exception as e:
+            logging.error(f"Error reading updates for run {process_id}: {str(e)}")
+            return []
+
     # وظائف التشفير والأمان
     async def _encrypt_api_keys(self, keys: Dict[str, str]) -> Dict[str, str]:
         """تشفير مفاتيح API"""
@@ -1190,7 +1972,7 @@ class AsyncStreamingCoreLogic:
             key = Fernet.generate_key()
             f = Fernet(key)
             # تخزين مفتاح التشفير بشكل آمن
-            await self.redis.set('encryption_key', key.decode())
+            await self.redis.set(self._run.key('encryption_key'), key.decode())
             return {k: f.encrypt(v.encode()).decode() for k, v in keys.items()}
         except Exception as e:
             logging.error(f"Error encrypting API keys: {str(e)}")
@@ -1199,7 +1981,7 @@ class AsyncStreamingCoreLogic:
     async def _decrypt_api_keys(self, encrypted_keys: Dict[str, str]) -> Dict[str, str]:
         """فك تشفير مفاتيح API"""
         try:
-            key = await self.redis.get('encryption_key')
+            key = await self.redis.get(self._run.key('encryption_key'))
             if not key:
                 raise ValueError("Encryption key not found")
             f = Fernet(key.encode())
@@ -1210,27 +1992,17 @@ class AsyncStreamingCoreLogic:
 
     # وظائف التنظيف والتحكم في الموارد
     async def _cleanup_resources(self) -> None:
-        """تنظيف الموارد"""
+        """تنظيف موارد التشغيل الفاشل وحده دون المساس باتصالات Redis المشتركة أو تشغيلات أخرى"""
         try:
-            # تنظيف المهام
-            for task_number in range(1, 12):
+            # تنظيف بيانات المهام الخاصة بالتشغيل (نقاط الاستئناف تبقى لإعادة المحاولة)
+            for task_number in self.pipeline.task_numbers:
                 await self.cleanup_task_data(task_number)
 
-            # تنظيف البيانات المؤقتة
-            await self.cleanup_old_data()
-
-            # إغلاق اتصالات Redis
-            if self.redis_manager:
-                await self.redis_manager.cleanup()
-
-            # تنظيف المجلدات المؤقتة
-            shutil.rmtree('./temp', ignore_errors=True)
-            os.makedirs('./temp')
-            os.makedirs('./temp/audio')
-            os.makedirs('./temp/images')
+            # حذف المجلد المؤقت الخاص بالتشغيل؛ انتهاء صلاحية مفاتيحه يتم في chain_tasks
+            shutil.rmtree(f'./temp/{self._run.process_id}', ignore_errors=True)
 
         except Exception as e:
-            logging.error(f"Error cleaning up resources: {str(e)}")
+            logging.error(f"Error cleaning up resources for run {self._run.process_id}: {str(e)}")
 
     # وظائف مساعدة للتحقق من البيانات
     async def _validate_api_key_format(self, api_key: str, service: str) -> bool:
@@ -1247,10 +2019,151 @@ class AsyncStreamingCoreLogic:
 
     def _can_continue_after_failure(self, task_number: int) -> bool:
         """تحديد إمكانية الاستمرار بعد فشل المهمة"""
-        critical_tasks = [1, 4]  # المهام الحرجة
-        return task_number not in critical_tasks
+        return task_number not in self.pipeline.critical_tasks()
 
     # وظائف مساعدة للمهام
+    def _format_prompt(self, task_number: int, layout_key: Optional[Any] = None, **fields: Any) -> str:
+        """تنسيق نص المهمة ضمن ميزانية رموزها وتسجيل حجمه في التشغيل"""
+        stage = self.pipeline.find(task_number)
+        layout = self.prompt_layouts[layout_key or task_number]
+        prompt, stats = self.prompt_budgeter.format(
+            layout.suffix,
+            budget=stage.prompt_budget if stage else None,
+            task=str(task_number),
+            prefix=layout.prefix,
+            **fields
+        )
+        self._run.prompt_stats[task_number] = stats
+        return prompt
+
+    async def _generate_content(
+            self,
+            prompt: str,
+            generation_config: Optional[Dict] = None,
+            validate: Optional[Callable[[str], bool]] = None,
+            use_cache: bool = True
+    ):
+        """استدعاء نموذج Google ضمن الوقت المتبقي للمهمة (validate شرط تخزين الاستجابة)"""
+        if not self.google_model:
+            raise ValueError("Google Model not initialized")
+
+        task_number = _current_task.get()
+        stage = self.pipeline.find(task_number) if task_number else None
+
+        streaming = self.streaming_enabled and bool(stage and stage.stream)
+
+        async def generate():
+            model, contents = await self._prompt_target(prompt)
+            return await self.retry_policies[PROVIDER_GEMINI].call(
+                lambda: self.hedger.run(
+                    task_number,
+                    self._gemini_call_factory(
+                        contents,
+                        task_number if streaming else None,
+                        model,
+                        generation_config
+                    ),
+                    enabled=self.hedging_enabled and bool(stage and stage.hedge)
+                ),
+                operation=PROVIDER_GEMINI
+            )
+
+        if not (use_cache and self.llm_cache_enabled and stage and stage.cache):
+            return await generate()
+
+        model = self.google_model
+        key = cache_key(
+            getattr(model, 'model_name', 'gemini'),
+            prompt,
+            {**(getattr(model, '_generation_config', None) or {}), **(generation_config or {})}
+        )
+        return await self.llm_cache.get_or_generate(
+            key,
+            generate,
+            read=task_number not in self._run.regenerated_tasks,
+            accept=validate
+        )
+
+    async def _prompt_target(self, prompt: str) -> Tuple[Any, str]:
+        """النموذج والنص المرسل: اللاحقة وحدها مع نموذج مرتبط بالبادئة المخزنة لدى المزود"""
+        model = self.google_model
+        if not (self.prompt_cache_enabled and self.google_api_key):
+            return model, prompt
+
+        layout = next(
+            (l for l in self.prompt_layouts.values() if prompt.startswith(l.prefix)),
+            None
+        )
+        if layout is None:
+            return model, prompt
+
+        model_name = getattr(model, 'model_name', 'gemini')
+        handle = await self.prompt_prefix_cache.get(self.google_api_key, model_name, layout)
+        if handle is None:
+            return model, prompt
+        return (
+            self.prompt_prefix_cache.model_for(self.google_api_key, model_name, handle),
+            prompt[len(layout.prefix):]
+        )
+
+    def _gemini_call_factory(
+            self,
+            prompt: str,
+            stream_task: Optional[int] = None,
+            model: Any = None,
+            generation_config: Optional[Dict] = None
+    ):
+        """مولد استدعاءات المحاولة الواحدة: الاستدعاء الأول فقط يبث نصه (لا يُبث الطلب المكرر)"""
+        started = False
+
+        def factory():
+            nonlocal started
+            first, started = not started, True
+            return self._call_gemini(prompt, stream_task if first else None, model, generation_config)
+
+        return factory
+
+    async def _call_gemini(
+            self,
+            prompt: str,
+            stream_task: Optional[int] = None,
+            model: Any = None,
+            generation_config: Optional[Dict] = None
+    ):
+        """استدعاء واحد لـ Gemini ضمن قاطع الدائرة والحصة وحد التزامن"""
+        async with self.circuit_breakers.get(PROVIDER_GEMINI, 'generate_content').guard():
+            # انتظار إذن الحصة قبل حجز مكان في حد التزامن
+            await self.quota_limiter.acquire(
+                PROVIDER_GEMINI,
+                self.google_api_key,
+                timeout=self._call_timeout(self.config['timeout'])
+            )
+            model = model or self.google_model
+            # زمن مرجعي لكل مهمة: استدعاءات المشاهد القصيرة لا تجعل المراحل الطويلة تبدو قفزات
+            async with self.gemini_limiter.slot(key=f'task_{_current_task.get()}'):
+                request_options = {'timeout': self._call_timeout(self.config['timeout'])}
+                if stream_task is None:
+                    return await self.gemini_client.generate(
+                        model,
+                        prompt,
+                        request_options=request_options,
+                        generation_config=generation_config
+                    )
+
+                coalescer = DeltaCoalescer(
+                    lambda delta, reset: self.stream_delta(stream_task, delta, reset),
+                    interval=self.stream_delta_interval
+                )
+                response = await self.gemini_client.generate_stream(
+                    model,
+                    prompt,
+                    coalescer.add,
+                    request_options=request_options,
+                    generation_config=generation_config
+                )
+                await coalescer.flush()
+                return response
+
     async def _get_safe_task_result(self, task_number: int, key: str = None) -> Optional[Any]:
         """استرجاع نتيجة المهمة بشكل آمن"""
         try:
@@ -1280,16 +2193,30 @@ class AsyncStreamingCoreLogic:
             logging.info(f"Starting topic generation for: {topic}")
             start_time = datetime.now()
 
-            formatted_prompt = task_1_prompt.format(topic=topic)
-            response = await self.google_model.generate_content(formatted_prompt)
-            text_response = response.text
+            # إعادة استخدام نتيجة موضوع سابق مشابه (يختلف في التشكيل أو الهمزات أو ترتيب الكلمات)
+            reuse_allowed = self.topic_reuse_enabled and 1 not in self._run.regenerated_tasks
+            similar = await self.topic_index.find(topic) if reuse_allowed else None
+
+            if similar:
+                text_response = similar['result']
+                logging.info(
+                    f"Reusing topics of '{similar['topic']}' for '{topic}' "
+                    f"(similarity {similar['similarity']})"
+                )
+            else:
+                formatted_prompt = self._format_prompt(1, topic=topic)
+                response = await self._generate_content(formatted_prompt)
+                text_response = response.text
 
             if not text_response:
                 raise ValueError("Invalid response received from Google Model")
 
+            if not similar and self.topic_reuse_enabled:
+                await self.topic_index.add(topic, text_response)
+
             # حفظ النتيجة في Redis للاستخدام المستقبلي
             await self.redis.setex(
-                'task_1_result',
+                self._run.key('task_1_result'),
                 3600,  # تنتهي صلاحيتها بعد ساعة
                 json.dumps({'content': text_response})
             )
@@ -1297,12 +2224,15 @@ class AsyncStreamingCoreLogic:
             duration = (datetime.now() - start_time).total_seconds()
             logging.info(f"Topic generation completed in {duration:.2f} seconds")
 
-            return {
+            result = {
                 'status': 'success',
                 'content': text_response,
                 'duration': duration,
                 'timestamp': datetime.now(timezone.utc).isoformat()
             }
+            if similar:
+                result['reused_from'] = {'topic': similar['topic'], 'similarity': similar['similarity']}
+            return result
 
         except Exception as e:
             error_msg = f"Error in topic generation: {str(e)}"
@@ -1326,8 +2256,8 @@ class AsyncStreamingCoreLogic:
             logging.info("Starting trends analysis")
             start_time = datetime.now()
 
-            formatted_prompt = task_2_prompt.format(niche=task1_result)
-            response = await self.google_model.generate_content(formatted_prompt)
+            formatted_prompt = self._format_prompt(2, niche=task1_result)
+            response = await self._generate_content(formatted_prompt)
             text_response = response.text
 
             if not text_response:
@@ -1335,7 +2265,7 @@ class AsyncStreamingCoreLogic:
 
             # حفظ النتيجة
             await self.redis.setex(
-                'task_2_result',
+                self._run.key('task_2_result'),
                 3600,
                 json.dumps({'content': text_response})
             )
@@ -1369,11 +2299,12 @@ class AsyncStreamingCoreLogic:
             logging.info("Starting audience engagement improvement")
             start_time = datetime.now()
 
-            formatted_prompt = task_3_prompt.format(
+            formatted_prompt = self._format_prompt(
+                3,
                 Analyse_Trends=task2_result
             )
 
-            response = await self.google_model.generate_content(formatted_prompt)
+            response = await self._generate_content(formatted_prompt)
             text_response = response.text
 
             if not text_response:
@@ -1402,19 +2333,20 @@ class AsyncStreamingCoreLogic:
         """كتابة النصوص"""
         try:
             task2_result = await self._get_safe_task_result(2)
-            task3_result = await self._get_safe_task_result(3)
-            if not task2_result or not task3_result:
+            task3_result = await self._get_safe_task_result(3)  # اختيارية
+            if not task2_result:
                 raise ValueError("Required task results not found")
 
             logging.info("Starting script writing")
             start_time = datetime.now()
 
-            formatted_prompt = task_4_prompt.format(
+            formatted_prompt = self._format_prompt(
+                4,
                 Analyse_Trends=task2_result,
-                Engagement=task3_result
+                Engagement=task3_result or ''
             )
 
-            response = await self.google_model.generate_content(formatted_prompt)
+            response = await self._generate_content(formatted_prompt)
             text_response = response.text
 
             if not text_response:
@@ -1452,14 +2384,20 @@ class AsyncStreamingCoreLogic:
             logging.info("Starting SEO keyword research")
             start_time = datetime.now()
 
-            formatted_prompt = task_5_prompt.format(
-                niche=task1_result,
-                Analyse_Trends=task2_result,
-                Script=task4_result
-            )
+            text_response = None
+            if self.pipeline.get(5).fuses:
+                text_response = await self._generate_fused_seo(task1_result, task2_result, task4_result)
 
-            response = await self.google_model.generate_content(formatted_prompt)
-            text_response = response.text
+            if not text_response:
+                formatted_prompt = self._format_prompt(
+                    5,
+                    niche=task1_result,
+                    Analyse_Trends=task2_result,
+                    Script=task4_result
+                )
+
+                response = await self._generate_content(formatted_prompt)
+                text_response = response.text
 
             if not text_response:
                 raise ValueError("Invalid response received from Google Model")
@@ -1483,26 +2421,73 @@ class AsyncStreamingCoreLogic:
                 'timestamp': datetime.now(timezone.utc).isoformat()
             }
 
+    async def _generate_fused_seo(self, niche: Any, trends: Any, script: Any) -> Optional[str]:
+        """توليد الكلمات المفتاحية والوصف والعنوان في استدعاء واحد وحفظ أقسام المهام التابعة"""
+        formatted_prompt = self._format_prompt(
+            5,
+            layout_key=SEO_FUSED_LAYOUT,
+            niche=niche,
+            Analyse_Trends=trends,
+            Script=script
+        )
+        # الاستدعاء المدمج يولد الوصف والعنوان الإبداعيين (المرحلتان 6 و7 غير مخزنتين) فلا يُخزن
+        response = await self._generate_content(
+            formatted_prompt,
+            generation_config=json_generation_config(FUSED_SEO_SCHEMA),
+            use_cache=False
+        )
+        sections = parse_fused_seo(response.text)
+
+        fuses = self.pipeline.get(5).fuses
+        for name, task_number in FUSED_SEO_SECTIONS.items():
+            if task_number in fuses and name in sections:
+                self._run.fused_sections[task_number] = sections[name]
+
+        # بدون الكلمات المفتاحية تعود المهمة 5 إلى استدعائها المنفصل
+        return sections.get('keywords')
+
+    def _fused_result(self, task_number: int) -> Optional[Dict]:
+        """نتيجة المهمة من الاستدعاء المدمج بنفس بنية نتيجتها المنفصلة (None = استدعاء منفصل)"""
+        if task_number in self._run.regenerated_tasks:
+            return None
+        content = self._run.fused_sections.get(task_number)
+        if not content:
+            return None
+
+        logging.info(f"Task {task_number} result taken from fused SEO call")
+        return {
+            'status': 'success',
+            'content': content,
+            'duration': 0.0,
+            'fused': True,
+            'timestamp': datetime.now(timezone.utc).isoformat()
+        }
+
     async def task_6_YouTube_Shorts_Write_Description(self) -> Dict:
         """كتابة وصف الفيديو"""
         try:
+            fused = self._fused_result(6)
+            if fused:
+                return fused
+
             task2_result = await self._get_safe_task_result(2)
             task4_result = await self._get_safe_task_result(4)
-            task5_result = await self._get_safe_task_result(5)
+            task5_result = await self._get_safe_task_result(5)  # اختيارية
 
-            if not all([task2_result, task4_result, task5_result]):
+            if not all([task2_result, task4_result]):
                 raise ValueError("Required task results not found")
 
             logging.info("Starting description writing")
             start_time = datetime.now()
 
-            formatted_prompt = task_6_prompt.format(
+            formatted_prompt = self._format_prompt(
+                6,
                 Analyse_Trends=task2_result,
                 Script=task4_result,
-                keyword=task5_result
+                keyword=task5_result or ''
             )
 
-            response = await self.google_model.generate_content(formatted_prompt)
+            response = await self._generate_content(formatted_prompt)
             text_response = response.text
 
             if not text_response:
@@ -1530,23 +2515,28 @@ class AsyncStreamingCoreLogic:
     async def task_7_YouTube_Shorts_Suggest_SEO_Title(self) -> Dict:
         """اقتراح عنوان SEO"""
         try:
+            fused = self._fused_result(7)
+            if fused:
+                return fused
+
             task2_result = await self._get_safe_task_result(2)
             task4_result = await self._get_safe_task_result(4)
-            task5_result = await self._get_safe_task_result(5)
+            task5_result = await self._get_safe_task_result(5)  # اختيارية
 
-            if not all([task2_result, task4_result, task5_result]):
+            if not all([task2_result, task4_result]):
                 raise ValueError("Required task results not found")
 
             logging.info("Starting SEO title suggestion")
             start_time = datetime.now()
 
-            formatted_prompt = task_7_prompt.format(
+            formatted_prompt = self._format_prompt(
+                7,
                 Analyse_Trends=task2_result,
                 Script=task4_result,
-                keyword=task5_result
+                keyword=task5_result or ''
             )
 
-            response = await self.google_model.generate_content(formatted_prompt)
+            response = await self._generate_content(formatted_prompt)
             text_response = response.text
 
             if not text_response:
@@ -1585,33 +2575,46 @@ class AsyncStreamingCoreLogic:
             if len(script_content) > 5000:  # حد Eleven Labs
                 raise ValueError("Script content too long")
 
-            async with aiohttp.ClientSession() as session:
-                url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
-                headers = {
-                    "xi-api-key": api_key,
-                    "Content-Type": "application/json",
-                }
-                payload = {
-                    "text": script_content,
-                    "model_id": "eleven_multilingual_v2",
-                    "voice_settings": {
-                        "stability": 0.5,
-                        "similarity_boost": 0.5,
-                        "style": 1.0,
-                        "use_speaker_boost": True
-                    }
+            url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
+            headers = {
+                "xi-api-key": api_key,
+                "Content-Type": "application/json",
+            }
+            payload = {
+                "text": script_content,
+                "model_id": "eleven_multilingual_v2",
+                "voice_settings": {
+                    "stability": 0.5,
+                    "similarity_boost": 0.5,
+                    "style": 1.0,
+                    "use_speaker_boost": True
                 }
+            }
+
+            async with self.circuit_breakers.get(PROVIDER_ELEVENLABS, 'text_to_speech').guard():
+                await self.quota_limiter.acquire(PROVIDER_ELEVENLABS, api_key, timeout=self._call_timeout(120))
+
+                async with aiohttp.ClientSession() as session:
+                    async with session.post(
+                            url,
+                            headers=headers,
+                            json=payload,
+                            timeout=ClientTimeout(total=self._call_timeout(120))
+                    ) as response:
+                        if response.status != 200:
+                            error_text = await response.text()
+                            raise ProviderHTTPError(
+                                response.status,
+                                f"Audio generation failed: {error_text}",
+                                retry_after=response.headers.get('Retry-After')
+                            )
 
-                async with session.post(url, headers=headers, json=payload, timeout=120) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        raise ValueError(f"Audio generation failed: {error_text}")
+                        audio_data = await response.read()
 
-                    audio_data = await response.read()
-                    if len(audio_data) > MAX_AUDIO_SIZE:
-                        raise ValueError(f"Generated audio too large: {len(audio_data)} bytes")
+            if len(audio_data) > MAX_AUDIO_SIZE:
+                raise ValueError(f"Generated audio too large: {len(audio_data)} bytes")
 
-                    return audio_data
+            return audio_data
 
         except asyncio.TimeoutError:
             raise TimeoutError("Audio generation timed out")
@@ -1640,11 +2643,10 @@ class AsyncStreamingCoreLogic:
             audio_duration = len(audio) / 1000.0
 
             # تحديد الأبعاد
-            dimensions = (
-                "width=1080&height=1920"
-                if audio_duration <= 60
-                else "width=1920&height=1080"
-            )
+            dimensions = self._dimensions_for_duration(audio_duration)
+
+            # معايرة تقدير مدة الكلام لهذا الصوت
+            await self._calibrate_speech_rate(task4_result, audio_duration)
 
             # إنشاء البيانات الوصفية
             metadata = {
@@ -1683,26 +2685,43 @@ class AsyncStreamingCoreLogic:
         """إنشاء لوحة القصة"""
         try:
             task4_result = await self._get_safe_task_result(4)
-            task8_metadata = await self._get_audio_metadata()
-
             if not task4_result:
                 raise ValueError("Task 4 result not found")
 
+            # مدة الصوت الفعلية إن توفرت، وإلا تقديرها دون انتظار المهمة 8
+            task8_metadata = await self._get_audio_metadata()
+            if not task8_metadata:
+                task8_metadata = await self._estimate_audio_metadata(task4_result)
+
             logging.info("Starting storyboard creation")
             start_time = datetime.now()
 
             # حساب عدد المشاهد المثالي
             scene_count = await self._calculate_optimal_scene_count(task8_metadata)
 
-            formatted_prompt = task_9_prompt.format(
+            formatted_prompt = self._format_prompt(
+                9,
                 Script=task4_result,
                 secend=scene_count
             )
 
-            response = await self.google_model.generate_content(formatted_prompt)
+            # إخراج JSON مقيد بمخطط المشاهد عندما تدعمه المكتبة
+            response = await self._generate_content(
+                formatted_prompt,
+                generation_config=json_generation_config(STORYBOARD_SCHEMA),
+                validate=has_scenes
+            )
 
-            # تحليل وتنظيف الاستجابة
+            # تحليل الاستجابة مع استخلاص المشاهد المكتملة من JSON غير السليم
             scene_data = await self._parse_scene_response(response.text)
+            if len(scene_data['sentiments']) < scene_count:
+                logging.warning(
+                    f"Storyboard has {len(scene_data['sentiments'])} of {scene_count} requested scenes"
+                )
+
+            # حفظ المدة المستخدمة لمطابقتها لاحقاً مع الصوت الفعلي
+            scene_data['audio_duration'] = task8_metadata.get('duration', DEFAULT_AUDIO_DURATION)
+            scene_data['duration_source'] = 'estimated' if task8_metadata.get('estimated') else 'audio'
 
             # إضافة البيانات الوصفية
             for scene in scene_data['sentiments']:
@@ -1723,6 +2742,7 @@ class AsyncStreamingCoreLogic:
                 'metadata': {
                     'scene_count': scene_count,
                     'audio_duration': task8_metadata.get('duration') if task8_metadata else DEFAULT_AUDIO_DURATION,
+                    'duration_source': 'estimated' if task8_metadata.get('estimated') else 'audio',
                     'dimensions': task8_metadata.get('dimensions', DEFAULT_VIDEO_DIMENSIONS)
                 },
                 'timestamp': datetime.now(timezone.utc).isoformat()
@@ -1753,7 +2773,7 @@ class AsyncStreamingCoreLogic:
             async with asyncio.TaskGroup() as tg:
                 tasks = [
                     tg.create_task(
-                        self._process_single_scene(scene, self._task_semaphores['image'])
+                        self._process_single_scene(scene)
                     )
                     for scene in scenes
                 ]
@@ -1782,51 +2802,68 @@ class AsyncStreamingCoreLogic:
                 'timestamp': datetime.now(timezone.utc).isoformat()
             }
 
-    async def _process_single_scene(self, scene: Dict, semaphore: asyncio.Semaphore) -> Optional[Dict]:
-        """معالجة مشهد واحد مع التحكم في التزامن"""
-        async with semaphore:
-            for attempt in range(MAX_RETRIES_PER_SCENE):
-                try:
-                    if not isinstance(scene, dict) or 'scene_description' not in scene:
-                        raise ValueError("Invalid scene data")
+    async def _process_single_scene(self, scene: Dict) -> Optional[Dict]:
+        """معالجة مشهد واحد (التزامن يحدده محدد Gemini المتكيف)"""
+        try:
+            if not isinstance(scene, dict) or 'scene_description' not in scene:
+                raise ValueError("Invalid scene data")
 
-                    prompt = task_10_prompt.format(
-                        storyline_content=scene['scene_description']
-                    )
+            prompt = self._format_prompt(
+                10,
+                storyline_content=scene['scene_description']
+            )
 
-                    response = await self.google_model.generate_content(prompt)
-                    text_response = response.text.strip()
+            text_response = await self.retry_policies['scene'].call(
+                lambda: self._describe_scene(prompt),
+                operation='scene_description',
+                retry_result=lambda text: not text
+            )
 
-                    if not text_response:
-                        raise ValueError("Empty scene description")
+            if not text_response:
+                raise ValueError("Empty scene description")
 
-                    return {
-                        'scene_number': scene.get('scene_number', 0),
-                        'original_description': scene['scene_description'],
-                        'detailed_description': text_response,
-                        'timestamp': datetime.now(timezone.utc).isoformat()
-                    }
+            return {
+                'scene_number': scene.get('scene_number', 0),
+                'original_description': scene['scene_description'],
+                'detailed_description': text_response,
+                'timestamp': datetime.now(timezone.utc).isoformat()
+            }
 
-                except Exception as e:
-                    if attempt == MAX_RETRIES_PER_SCENE - 1:
-                        logging.error(f"Failed to process scene: {str(e)}")
-                        return None
-                    await asyncio.sleep(2 ** attempt)
+        except CircuitOpenError as e:
+            logging.error(f"Skipping scene, provider unavailable: {str(e)}")
+            return None
+
+        except Exception as e:
+            logging.error(f"Failed to process scene: {str(e)}")
+            return None
+
+    async def _describe_scene(self, prompt: str) -> str:
+        """طلب وصف مفصل لمشهد واحد"""
+        response = await self._generate_content(prompt)
+        return response.text.strip()
 
     async def task_11_generate_images(self) -> Dict:
         """توليد الصور"""
         try:
             task10_result = await self._get_safe_task_result(10)
-            task8_metadata = await self._get_audio_metadata()
+            task8_metadata = await self._get_audio_metadata() or {}
 
-            if not task10_result or 'scenes' not in task10_result['content']:
-                raise ValueError("Invalid task 10 result")
+            if task10_result and task10_result.get('scenes'):
+                scenes = task10_result['scenes']
+            else:
+                # المهمة 10 اختيارية: استخدام أوصاف المشاهد من المهمة 9 مباشرة
+                scenes = await self._fallback_scenes_from_storyboard()
+                if not scenes:
+                    raise ValueError("Invalid task 10 result")
 
             logging.info("Starting image generation")
             start_time = datetime.now()
 
-            scenes = task10_result['content']['scenes']
-            total_duration = task8_metadata.get('duration', DEFAULT_AUDIO_DURATION)
+            # المدة الفعلية من المهمة 8، أو المقدرة في المهمة 9 إذا فشل توليد الصوت
+            estimated_duration = await self._get_safe_task_result(9, 'audio_duration')
+            total_duration = float(
+                task8_metadata.get('duration') or estimated_duration or DEFAULT_AUDIO_DURATION
+            )
             scene_duration = total_duration / len(scenes) if scenes else DEFAULT_AUDIO_DURATION
 
             async with asyncio.TaskGroup() as tg:
@@ -1836,6 +2873,9 @@ class AsyncStreamingCoreLogic:
                 ]
                 processed_scenes = [task.result() for task in tasks if task.result() is not None]
 
+            # مطابقة توقيت المشاهد مع مدة الصوت الفعلية بدلاً من المقدرة
+            self._reconcile_scene_timings(processed_scenes, total_duration)
+
             duration = (datetime.now() - start_time).total_seconds()
             logging.info(f"Image generation completed in {duration:.2f} seconds")
 
@@ -1846,6 +2886,7 @@ class AsyncStreamingCoreLogic:
                     'metadata': {
                         'total_duration': total_duration,
                         'scene_duration': scene_duration,
+                        'estimated_duration': estimated_duration,
                         'dimensions': task8_metadata.get('dimensions', DEFAULT_VIDEO_DIMENSIONS)
                     }
                 },
@@ -1862,6 +2903,22 @@ class AsyncStreamingCoreLogic:
                 'timestamp': datetime.now(timezone.utc).isoformat()
             }
 
+    async def _fallback_scenes_from_storyboard(self) -> List[Dict]:
+        """تحويل مشاهد المهمة 9 إلى صيغة المهمة 10 عند تخطيها"""
+        task9_result = await self._get_safe_task_result(9)
+        if not task9_result or 'sentiments' not in task9_result:
+            return []
+
+        return [
+            {
+                'scene_number': scene.get('scene_number', index),
+                'original_description': scene['scene_description'],
+                'detailed_description': scene['scene_description']
+            }
+            for index, scene in enumerate(task9_result['sentiments'], start=1)
+            if isinstance(scene, dict) and scene.get('scene_description')
+        ]
+
     async def _generate_scene_images(self, scene: Dict, total_duration: float) -> Optional[Dict]:
         """توليد صور لمشهد واحد"""
         try:
@@ -1897,6 +2954,53 @@ class AsyncStreamingCoreLogic:
 
         # Helper Functions for Tasks
 
+    @staticmethod
+    def _dimensions_for_duration(duration: float) -> str:
+        """أبعاد الفيديو حسب مدة الصوت"""
+        return "width=1080&height=1920" if duration <= 60 else "width=1920&height=1080"
+
+    async def _estimate_audio_metadata(self, script_content: str) -> Dict:
+        """تقدير البيانات الوصفية للصوت من النص قبل توليده"""
+        voice_id = (self.eleven_labs_config or {}).get('voice_id', 'default')
+        if not self.speech_estimator.is_calibrated(voice_id):
+            try:
+                self.speech_estimator.load(
+                    voice_id,
+                    await self.redis.hgetall(SpeechDurationEstimator.key_for(voice_id))
+                )
+            except Exception as e:
+                logging.error(f"Error loading speech rate for voice {voice_id}: {str(e)}")
+
+        duration = self.speech_estimator.estimate(voice_id, script_content) or DEFAULT_AUDIO_DURATION
+        logging.info(f"Estimated audio duration {duration:.2f}s for voice {voice_id}")
+        return {
+            'duration': duration,
+            'dimensions': self._dimensions_for_duration(duration),
+            'estimated': True
+        }
+
+    async def _calibrate_speech_rate(self, script_content: str, audio_duration: float) -> None:
+        """معايرة معدل الكلام للصوت الحالي بالمدة الفعلية"""
+        voice_id = (self.eleven_labs_config or {}).get('voice_id', 'default')
+        try:
+            rates = self.speech_estimator.observe(voice_id, script_content, audio_duration)
+            await self.redis.hset(SpeechDurationEstimator.key_for(voice_id), mapping=rates)
+        except Exception as e:
+            logging.error(f"Error calibrating speech rate for voice {voice_id}: {str(e)}")
+
+    @staticmethod
+    def _reconcile_scene_timings(scenes: List[Dict], total_duration: float) -> None:
+        """توزيع مدة الصوت الفعلية على المشاهد بالترتيب"""
+        if not scenes:
+            return
+        scene_duration = total_duration / len(scenes)
+        ordered = sorted(scenes, key=lambda scene: scene.get('scene_number', 0))
+        for index, scene in enumerate(ordered):
+            scene['timing'] = {
+                'start': round(index * scene_duration, 3),
+                'duration': round(scene_duration, 3)
+            }
+
     async def _calculate_optimal_scene_count(self, audio_metadata: Optional[Dict] = None) -> int:
         """حساب العدد الأمثل للمشاهد"""
         if not audio_metadata:
@@ -1910,37 +3014,27 @@ class AsyncStreamingCoreLogic:
         return scene_count
 
     async def _parse_scene_response(self, response_text: str) -> Dict:
-        """تحليل استجابة المشاهد"""
+        """تحليل استجابة المشاهد (تُستخلص المشاهد المكتملة إذا كان JSON غير سليم)"""
         try:
-            # تنظيف النص
-            clean_text = re.sub(r'^```(json)?|```$', '', response_text)
-            clean_text = re.sub(r'\s+', ' ', clean_text.strip())
-
-            # محاولة تحليل JSON
-            scene_data = json.loads(clean_text)
-
-            if 'sentiments' not in scene_data:
-                raise ValueError("Missing 'sentiments' key")
+            scenes, strict = parse_scenes(response_text)
+            if not scenes:
+                raise ValueError("No valid scenes found in storyboard response")
 
+            scene_data = {'sentiments': scenes}
+            if not strict:
+                scene_data['salvaged'] = True
             return scene_data
 
-        except json.JSONDecodeError as e:
-            logging.error(f"JSON parsing error: {str(e)}")
-            raise ValueError("Invalid JSON format in scene data")
         except Exception as e:
             logging.error(f"Scene response parsing error: {str(e)}")
             raise
 
     async def _generate_audio_with_retries(self, script_content: str) -> bytes:
-        """توليد الصوت مع إعادة المحاولة"""
-        for attempt in range(MAX_RETRIES):
-            try:
-                return await self._generate_audio_external(script_content)
-            except Exception as e:
-                if attempt == MAX_RETRIES - 1:
-                    raise
-                logging.warning(f"Audio generation attempt {attempt + 1} failed: {str(e)}")
-                await asyncio.sleep(2 ** attempt)
+        """توليد الصوت مع إعادة المحاولة (الدائرة المفتوحة تفشل فوراً دون انتظار)"""
+        return await self.retry_policies[PROVIDER_ELEVENLABS].call(
+            lambda: self._generate_audio_external(script_content),
+            operation='elevenlabs_tts'
+        )
 
     async def _promptify(self, prompt: str) -> str:
         """تحسين النص لتوليد الصور"""
@@ -1958,17 +3052,19 @@ class AsyncStreamingCoreLogic:
         """تخزين البيانات الوصفية للصوت"""
         try:
             await self.redis.hset(
-                'task_8_metadata',
+                self._run.key('task_8_metadata'),
                 mapping=metadata
             )
-            await self.redis.expire('task_8_metadata', 3600)  # تنتهي الصلاحية بعد ساعة
+            await self.redis.expire(self._run.key('task_8_metadata'), 3600)  # تنتهي الصلاحية بعد ساعة
         except Exception as e:
             logging.error(f"Error storing audio metadata: {str(e)}")
 
     async def _get_audio_metadata(self) -> Optional[Dict]:
         """استرجاع البيانات الوصفية للصوت"""
         try:
-            metadata = await self.redis.hgetall('task_8_metadata')
+            metadata = await self.redis.hgetall(self._run.key('task_8_metadata'))
+            if metadata and 'duration' in metadata:
+                metadata['duration'] = float(metadata['duration'])
             return metadata if metadata else None
         except Exception as e:
             logging.error(f"Error retrieving audio metadata: {str(e)}")
@@ -0,0 +1,130 @@
+import time
+from typing import Dict, List, Optional, Callable, Iterable
+
+
+DEFAULT_TASK_LATENCY = 10.0  # ثوانٍ لمهمة بلا قياسات سابقة
+MIN_TASK_BUDGET = 1.0
+
+
+class LatencyTracker:
+    """متوسط متحرك أسي (EWMA) لزمن تنفيذ كل مهمة"""
+
+    def __init__(
+            self,
+            alpha: float = 0.3,
+            defaults: Optional[Dict[int, float]] = None,
+            default_latency: float = DEFAULT_TASK_LATENCY
+    ):
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be in (0, 1]")
+
+        self.alpha = alpha
+        self.default_latency = default_latency
+        self._estimates: Dict[int, float] = dict(defaults or {})
+
+    def observe(self, task_number: int, seconds: float) -> float:
+        """تحديث التقدير بزمن تنفيذ جديد"""
+        previous = self._estimates.get(task_number)
+        if previous is None:
+            estimate = seconds
+        else:
+            estimate = self.alpha * seconds + (1 - self.alpha) * previous
+        self._estimates[task_number] = estimate
+        return estimate
+
+    def estimate(self, task_number: int) -> float:
+        return self._estimates.get(task_number, self.default_latency)
+
+    def load(self, data: Dict) -> None:
+        """تحميل التقديرات المحفوظة (مثلاً من Redis)"""
+        for task_number, seconds in (data or {}).items():
+            try:
+                self._estimates[int(task_number)] = float(seconds)
+            except (TypeError, ValueError):
+                continue
+
+    def snapshot(self) -> Dict[str, float]:
+        return {str(k): round(v, 3) for k, v in sorted(self._estimates.items())}
+
+
+class RunDeadline:
+    """موعد نهائي لتشغيل كامل مشتق من مهلة الطلب"""
+
+    def __init__(self, timeout: float, started_at: Optional[float] = None):
+        if timeout <= 0:
+            raise ValueError("timeout must be positive")
+
+        self.timeout = float(timeout)
+        self.started_at = time.monotonic() if started_at is None else started_at
+        self.expires_at = self.started_at + self.timeout
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def to_dict(self) -> Dict:
+        return {
+            'timeout': self.timeout,
+            'remaining': round(self.remaining(), 3)
+        }
+
+
+def estimate_tail(
+        task_number: int,
+        prerequisites: Dict[int, List[int]],
+        pending: Iterable[int],
+        estimate: Callable[[int], float],
+        skippable: Iterable[int] = ()
+) -> float:
+    """تقدير أطول مسار متبقٍ يبدأ بالمهمة (المهام القابلة للتخطي لا تُحتسب)"""
+    pending = set(pending) | {task_number}
+    skippable = set(skippable) - {task_number}
+    successors: Dict[int, List[int]] = {}
+    for task, prereqs in prerequisites.items():
+        if task in pending:
+            for prereq in prereqs:
+                successors.setdefault(prereq, []).append(task)
+
+    memo: Dict[int, float] = {}
+
+    def tail(task: int) -> float:
+        if task not in memo:
+            own = 0.0 if task in skippable else estimate(task)
+            memo[task] = own + max((tail(s) for s in successors.get(task, [])), default=0.0)
+        return memo[task]
+
+    return tail(task_number)
+
+
+def task_budget(
+        task_number: int,
+        remaining: float,
+        prerequisites: Dict[int, List[int]],
+        pending: Iterable[int],
+        estimate: Callable[[int], float],
+        skippable: Iterable[int] = ()
+) -> float:
+    """حصة المهمة من الوقت المتبقي بنسبة زمنها المتوقع إلى أطول مسار متبقٍ بعدها"""
+    tail = estimate_tail(task_number, prerequisites, pending, estimate, skippable)
+    if tail <= 0:
+        return remaining
+    share = remaining * estimate(task_number) / tail
+    return min(remaining, max(MIN_TASK_BUDGET, share))
+
+
+def should_skip_optional(
+        task_number: int,
+        remaining: float,
+        prerequisites: Dict[int, List[int]],
+        pending: Iterable[int],
+        estimate: Callable[[int], float],
+        optional_tasks: Iterable[int]
+) -> bool:
+    """تخطي المهمة الاختيارية إذا لم يتسع الوقت لها وللمهام الإلزامية بعدها"""
+    if task_number not in set(optional_tasks):
+        return False
+    needed = estimate_tail(task_number, prerequisites, pending, estimate, skippable=optional_tasks)
+    return remaining < needed
@@ -0,0 +1,211 @@
+import asyncio
+import functools
+import hashlib
+import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+from prometheus_client import Counter, Gauge
+
+
+# أنماط الاستدعاء: واجهة المكتبة غير المتزامنة أو مجمع خيوط محدود
+MODE_ASYNC = 'async'
+MODE_THREAD = 'thread'
+
+DEFAULT_GEMINI_MODEL = 'gemini-1.5-flash'
+
+GEMINI_CALLS = Counter(
+    'gemini_client_calls_total',
+    'Gemini calls by execution mode',
+    ['mode']
+)
+GEMINI_POOL_LOOKUPS = Counter(
+    'gemini_model_pool_lookups_total',
+    'Gemini model pool lookups',
+    ['result']
+)
+GEMINI_POOL_SIZE = Gauge(
+    'gemini_model_pool_size',
+    'Number of per-key Gemini model clients kept in the pool'
+)
+
+
+def api_key_fingerprint(api_key: str) -> str:
+    """بصمة مفتاح API (لا يُحتفظ بالمفتاح نفسه كمفتاح في المجمع)"""
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+
+def build_isolated_model(api_key: str, model_name: str = DEFAULT_GEMINI_MODEL) -> Any:
+    """نموذج بعملاء خاصين بمفتاحه بدلاً من genai.configure العام للعملية"""
+    options = {'api_key': api_key}
+    model = genai.GenerativeModel(model_name)
+    # يستخدم النموذج هذين العميلين بدلاً من العملاء الافتراضيين المشتركين
+    model._client = glm.GenerativeServiceClient(client_options=options)
+    model._async_client = glm.GenerativeServiceAsyncClient(client_options=options)
+    return model
+
+
+def supports_generation_option(name: str) -> bool:
+    """هل يدعم إصدار المكتبة المثبت خيار التوليد (مثل response_schema)"""
+    fields = getattr(getattr(glm.GenerationConfig, 'meta', None), 'fields', None) or {}
+    return name in fields
+
+
+def json_generation_config(schema: Optional[Dict] = None) -> Optional[Dict]:
+    """إعدادات إخراج JSON المقيد بالمخطط بقدر ما تدعمه المكتبة (None = غير مدعوم)"""
+    if not supports_generation_option('response_mime_type'):
+        return None
+    config: Dict[str, Any] = {'response_mime_type': 'application/json'}
+    if schema and supports_generation_option('response_schema'):
+        config['response_schema'] = schema
+    return config
+
+
+def _chunk_text(chunk: Any) -> Optional[str]:
+    # chunk.text يرفع استثناء للأجزاء المحجوبة أو الخالية من النص
+    try:
+        return chunk.text
+    except Exception:
+        return None
+
+
+class GeminiModelPool:
+    """مجمع نماذج Gemini معزولة لكل مفتاح API مع إخلاء الأقدم استخداماً (LRU)"""
+
+    def __init__(
+            self,
+            max_size: Optional[int] = None,
+            model_name: str = DEFAULT_GEMINI_MODEL,
+            factory: Callable[[str, str], Any] = build_isolated_model
+    ):
+        self.max_size = max_size or int(os.getenv('GEMINI_MODEL_POOL_SIZE', 64))
+        if self.max_size < 1:
+            raise ValueError("max_size must be at least 1")
+
+        self.model_name = model_name
+        self._factory = factory
+        self._models: 'OrderedDict[str, Any]' = OrderedDict()
+
+    def get(self, api_key: str) -> Any:
+        """إعادة النموذج الخاص بالمفتاح أو إنشاؤه"""
+        if not api_key:
+            raise ValueError("Google API key is required")
+
+        fingerprint = api_key_fingerprint(api_key)
+        model = self._models.get(fingerprint)
+        if model is not None:
+            self._models.move_to_end(fingerprint)
+            GEMINI_POOL_LOOKUPS.labels(result='hit').inc()
+            return model
+
+        GEMINI_POOL_LOOKUPS.labels(result='miss').inc()
+        model = self._factory(api_key, self.model_name)
+        self._models[fingerprint] = model
+        while len(self._models) > self.max_size:
+            self._models.popitem(last=False)
+            GEMINI_POOL_LOOKUPS.labels(result='evicted').inc()
+        GEMINI_POOL_SIZE.set(len(self._models))
+        return model
+
+    def discard(self, api_key: str) -> None:
+        """إزالة نموذج مفتاح غير صالح"""
+        self._models.pop(api_key_fingerprint(api_key), None)
+        GEMINI_POOL_SIZE.set(len(self._models))
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+
+class GeminiClient:
+    """عميل Gemini لا يحجب حلقة الأحداث (generate_content في المكتبة متزامن)"""
+
+    def __init__(self, mode: Optional[str] = None, max_workers: Optional[int] = None):
+        mode = mode or os.getenv('GEMINI_CLIENT_MODE', MODE_ASYNC)
+        if mode not in (MODE_ASYNC, MODE_THREAD):
+            raise ValueError(f"Unknown Gemini client mode: {mode}")
+
+        self.mode = mode
+        self.max_workers = max_workers or int(os.getenv('GEMINI_THREAD_POOL_SIZE', 16))
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        # مجمع خيوط مخصص حتى لا تزاحم استدعاءات Gemini المجمع الافتراضي للحلقة
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix='gemini'
+            )
+        return self._executor
+
+    async def generate(
+            self,
+            model: Any,
+            prompt: str,
+            request_options: Optional[Dict] = None,
+            generation_config: Optional[Dict] = None
+    ) -> Any:
+        """توليد المحتوى دون حجب حلقة الأحداث"""
+        kwargs = {'request_options': request_options} if request_options else {}
+        if generation_config:
+            kwargs['generation_config'] = generation_config
+
+        generate_async = getattr(model, 'generate_content_async', None)
+        if self.mode == MODE_ASYNC and generate_async is not None:
+            GEMINI_CALLS.labels(mode=MODE_ASYNC).inc()
+            return await generate_async(prompt, **kwargs)
+
+        GEMINI_CALLS.labels(mode=MODE_THREAD).inc()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor,
+            functools.partial(model.generate_content, prompt, **kwargs)
+        )
+
+    async def generate_stream(
+            self,
+            model: Any,
+            prompt: str,
+            on_text: Callable[[str], Awaitable[None]],
+            request_options: Optional[Dict] = None,
+            generation_config: Optional[Dict] = None
+    ) -> Any:
+        """توليد متدفق: تمرير كل جزء نصي إلى on_text ثم إعادة الاستجابة المكتملة"""
+        kwargs = {'stream': True}
+        if request_options:
+            kwargs['request_options'] = request_options
+        if generation_config:
+            kwargs['generation_config'] = generation_config
+
+        generate_async = getattr(model, 'generate_content_async', None)
+        if self.mode == MODE_ASYNC and generate_async is not None:
+            GEMINI_CALLS.labels(mode=f'{MODE_ASYNC}_stream').inc()
+            response = await generate_async(prompt, **kwargs)
+            async for chunk in response:
+                await on_text(_chunk_text(chunk))
+            return response
+
+        # المكرر المتزامن يحجب حتى وصول الجزء التالي، فيُستهلك جزءاً جزءاً في مجمع الخيوط
+        GEMINI_CALLS.labels(mode=f'{MODE_THREAD}_stream').inc()
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(
+            self.executor,
+            functools.partial(model.generate_content, prompt, **kwargs)
+        )
+        chunks = iter(response)
+        while True:
+            chunk = await loop.run_in_executor(self.executor, next, chunks, None)
+            if chunk is None:
+                return response
+            await on_text(_chunk_text(chunk))
+
+    def close(self) -> None:
+        """إيقاف مجمع الخيوط"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logging.info("Gemini client thread pool stopped")
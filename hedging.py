@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Hashable, Optional
+
+from prometheus_client import Counter
+
+
+# مقاييس الطلبات المتحوطة
+HEDGE_CALLS = Counter(
+    'hedge_calls_total',
+    'Calls eligible for hedging',
+    ['task']
+)
+HEDGE_FIRED = Counter(
+    'hedge_fired_total',
+    'Duplicate requests fired after the hedge delay',
+    ['task']
+)
+HEDGE_WINS = Counter(
+    'hedge_wins_total',
+    'Hedged duplicates that returned before the primary request',
+    ['task']
+)
+HEDGE_BUDGET_EXHAUSTED = Counter(
+    'hedge_budget_exhausted_total',
+    'Hedges skipped because the hedge budget was exhausted',
+    ['task']
+)
+
+
+class LatencyWindow:
+    """نافذة منزلقة لأزمنة الاستدعاءات لحساب المئين"""
+
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[index]
+
+
+class HedgeBudget:
+    """ميزانية التحوط: كل طلب أساسي يضيف نسبة من طلب إضافي"""
+
+    def __init__(self, ratio: float = 0.1, max_tokens: float = 10.0):
+        if not 0 <= ratio <= 1:
+            raise ValueError("ratio must be in [0, 1]")
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens if ratio else 0.0
+
+    def on_request(self) -> None:
+        self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+
+class RequestHedger:
+    """إرسال طلب مكرر عند تجاوز الطلب الأصلي لمئين زمن مهمته، وأخذ أول نتيجة"""
+
+    def __init__(
+            self,
+            percentile: float = 0.9,
+            min_samples: int = 20,
+            min_delay: float = 0.05,
+            budget: Optional[HedgeBudget] = None,
+            window_size: int = 200
+    ):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.budget = budget or HedgeBudget()
+        self.window_size = window_size
+
+        self._windows: Dict[Hashable, LatencyWindow] = {}
+        self._stats: Dict[Hashable, Dict[str, int]] = {}
+
+    def hedge_delay(self, key: Hashable) -> Optional[float]:
+        """زمن الانتظار قبل التحوط (None قبل توفر قياسات كافية)"""
+        window = self._windows.get(key)
+        if not window or len(window) < self.min_samples:
+            return None
+        return max(self.min_delay, window.percentile(self.percentile))
+
+    def observe(self, key: Hashable, seconds: float) -> None:
+        self._windows.setdefault(key, LatencyWindow(self.window_size)).observe(seconds)
+
+    async def run(
+            self,
+            key: Hashable,
+            call_factory: Callable[[], Awaitable[Any]],
+            enabled: bool = True
+    ) -> Any:
+        """تنفيذ الاستدعاء مع تحوط اختياري حسب سياسة المهمة"""
+        started = time.monotonic()
+        if not enabled:
+            return await call_factory()
+
+        stats = self._stats.setdefault(key, {'calls': 0, 'hedged': 0, 'wins': 0})
+        stats['calls'] += 1
+        HEDGE_CALLS.labels(task=str(key)).inc()
+        self.budget.on_request()
+
+        delay = self.hedge_delay(key)
+        primary = asyncio.ensure_future(call_factory())
+        pending = {primary}
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done:
+                    if self.budget.try_spend():
+                        hedge = asyncio.ensure_future(call_factory())
+                        pending.add(hedge)
+                        stats['hedged'] += 1
+                        HEDGE_FIRED.labels(task=str(key)).inc()
+                        logging.debug(f"Hedging call for task {key} after {delay:.2f}s")
+                    else:
+                        HEDGE_BUDGET_EXHAUSTED.labels(task=str(key)).inc()
+
+            first_error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        # الزمن من بدء الطلب الأصلي أياً كان الفائز حتى لا يُقتطع الذيل البطيء من المئين
+                        self.observe(key, time.monotonic() - started)
+                        if task is not primary:
+                            stats['wins'] += 1
+                            HEDGE_WINS.labels(task=str(key)).inc()
+                        return task.result()
+                    first_error = first_error or task.exception()
+            raise first_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def snapshot(self) -> Dict:
+        """معدل التحوط ونسبة الفوز لكل مهمة"""
+        return {
+            'budget_tokens': round(self.budget.tokens, 2),
+            'tasks': {
+                str(key): {
+                    **stats,
+                    'hedge_rate': round(stats['hedged'] / stats['calls'], 3) if stats['calls'] else 0.0,
+                    'hedge_delay': self.hedge_delay(key)
+                }
+                for key, stats in self._stats.items()
+            }
+        }
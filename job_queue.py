@@ -0,0 +1,209 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import socket
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+from cryptography.fernet import Fernet
+from redis.exceptions import ResponseError
+
+from core_logic import PipelineRun
+
+
+# Constants
+JOB_STREAM_KEY = 'pipeline_jobs'
+JOB_GROUP_NAME = 'pipeline_workers'
+DEAD_LETTER_STREAM_KEY = 'pipeline_jobs_dead'
+JOB_STREAM_MAXLEN = 10000
+DEFAULT_CLAIM_IDLE_MS = int(os.getenv('PIPELINE_JOB_CLAIM_IDLE_MS', 60000))
+DEFAULT_MAX_DELIVERIES = int(os.getenv('PIPELINE_JOB_MAX_DELIVERIES', 3))
+
+
+class JobState:
+    """حالات مهمة الطابور"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    DEAD = 'dead'
+
+
+# حالات تشغيل لم ينتهِ بعد (الفاشل يبقى معلقاً ليستعيده عامل أو يُنقل للرسائل الميتة)
+ACTIVE_JOB_STATES = (JobState.QUEUED, JobState.RUNNING, JobState.FAILED)
+
+
+def _job_fernet() -> Fernet:
+    """مفتاح تشفير مشترك بين API والعمال (لا قيمة افتراضية: مفاتيح المستخدمين تُخزن في الطابور)"""
+    secret = os.getenv('JOB_ENCRYPTION_KEY')
+    if not secret:
+        raise ValueError("JOB_ENCRYPTION_KEY is required to encrypt queued API keys")
+    return Fernet(base64.urlsafe_b64encode(hashlib.sha256(secret.encode()).digest()))
+
+
+def encrypt_job_secrets(secrets: Dict[str, str]) -> str:
+    """تشفير مفاتيح API قبل وضعها في الطابور"""
+    return _job_fernet().encrypt(json.dumps(secrets).encode()).decode()
+
+
+def decrypt_job_secrets(token: str) -> Dict[str, str]:
+    """فك تشفير مفاتيح API داخل العامل"""
+    return json.loads(_job_fernet().decrypt(token.encode()).decode())
+
+
+class PipelineJobQueue:
+    """طابور تشغيلات دائم مبني على Redis Streams ومجموعات المستهلكين"""
+
+    def __init__(
+            self,
+            redis_client: redis.Redis,
+            consumer_name: Optional[str] = None,
+            claim_idle_ms: int = DEFAULT_CLAIM_IDLE_MS,
+            max_deliveries: int = DEFAULT_MAX_DELIVERIES
+    ):
+        if not redis_client:
+            raise ValueError("Redis client is required")
+        # الفشل عند بدء الخدمة أو العامل بدلاً من أول طلب
+        _job_fernet()
+
+        self.redis = redis_client
+        self.consumer_name = consumer_name or f'{socket.gethostname()}-{os.getpid()}'
+        self.claim_idle_ms = claim_idle_ms
+        self.max_deliveries = max_deliveries
+
+    async def ensure_group(self) -> None:
+        """إنشاء مجموعة المستهلكين إذا لم تكن موجودة"""
+        try:
+            await self.redis.xgroup_create(JOB_STREAM_KEY, JOB_GROUP_NAME, id='0', mkstream=True)
+            logging.info(f"Consumer group {JOB_GROUP_NAME} created")
+        except ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    async def enqueue(self, job: Dict) -> str:
+        """إضافة تشغيل جديد إلى الطابور"""
+        if not job.get('process_id'):
+            raise ValueError("Job requires a process_id")
+
+        message_id = await self.redis.xadd(
+            JOB_STREAM_KEY,
+            {'payload': json.dumps(job)},
+            maxlen=JOB_STREAM_MAXLEN,
+            approximate=True
+        )
+        await self.set_job_state(job['process_id'], JobState.QUEUED, message_id=message_id)
+        logging.info(f"Run {job['process_id']} enqueued as {message_id}")
+        return message_id
+
+    async def claim(self, count: int = 1, block_ms: int = 5000) -> List[Tuple[str, Dict]]:
+        """استلام تشغيلات جديدة لهذا العامل"""
+        entries = await self.redis.xreadgroup(
+            JOB_GROUP_NAME,
+            self.consumer_name,
+            {JOB_STREAM_KEY: '>'},
+            count=count,
+            block=block_ms
+        )
+        return [
+            (message_id, self._decode(fields))
+            for _, messages in entries or []
+            for message_id, fields in messages
+        ]
+
+    async def reclaim_stale(self, count: int = 10) -> List[Tuple[str, Dict]]:
+        """استعادة التشغيلات المعلقة لدى عمال توقفوا عن العمل"""
+        result = await self.redis.xautoclaim(
+            JOB_STREAM_KEY,
+            JOB_GROUP_NAME,
+            self.consumer_name,
+            min_idle_time=self.claim_idle_ms,
+            start_id='0-0',
+            count=count
+        )
+        messages = result[1] if result and len(result) > 1 else []
+        reclaimed = [
+            (message_id, self._decode(fields))
+            for message_id, fields in messages
+            if fields
+        ]
+        if reclaimed:
+            logging.warning(f"Reclaimed {len(reclaimed)} stale pipeline jobs")
+        return reclaimed
+
+    async def heartbeat(self, message_ids: List[str]) -> None:
+        """تجديد ملكية التشغيلات الجارية لمنع استعادتها أثناء التنفيذ"""
+        if not message_ids:
+            return
+        await self.redis.xclaim(
+            JOB_STREAM_KEY,
+            JOB_GROUP_NAME,
+            self.consumer_name,
+            min_idle_time=0,
+            message_ids=message_ids,
+            justid=True
+        )
+
+    async def delivery_count(self, message_id: str) -> int:
+        """عدد مرات تسليم التشغيل"""
+        pending = await self.redis.xpending_range(
+            JOB_STREAM_KEY,
+            JOB_GROUP_NAME,
+            min=message_id,
+            max=message_id,
+            count=1
+        )
+        return pending[0]['times_delivered'] if pending else 0
+
+    async def ack(self, message_id: str) -> None:
+        """تأكيد انتهاء معالجة التشغيل"""
+        await self.redis.xack(JOB_STREAM_KEY, JOB_GROUP_NAME, message_id)
+
+    async def dead_letter(self, message_id: str, job: Dict, reason: str) -> None:
+        """نقل تشغيل فشل بشكل متكرر إلى طابور الرسائل الميتة"""
+        await self.redis.xadd(
+            DEAD_LETTER_STREAM_KEY,
+            {
+                'payload': json.dumps(job),
+                'original_id': message_id,
+                'reason': reason,
+                'timestamp': datetime.now(timezone.utc).isoformat()
+            },
+            maxlen=JOB_STREAM_MAXLEN,
+            approximate=True
+        )
+        await self.ack(message_id)
+        if job.get('process_id'):
+            await self.set_job_state(job['process_id'], JobState.DEAD, error=reason)
+        logging.error(f"Job {message_id} moved to dead letter stream: {reason}")
+
+    async def set_job_state(self, process_id: str, state: str, **details) -> None:
+        """تحديث حالة التشغيل في الطابور"""
+        try:
+            await self.redis.hset(
+                PipelineRun.key_for(process_id, 'job'),
+                mapping={
+                    'state': state,
+                    'consumer': self.consumer_name,
+                    'updated_at': datetime.now(timezone.utc).isoformat(),
+                    **{k: str(v) for k, v in details.items() if v is not None}
+                }
+            )
+        except Exception as e:
+            logging.error(f"Error updating job state for run {process_id}: {str(e)}")
+
+    async def get_job_state(self, process_id: str) -> Dict:
+        """قراءة حالة التشغيل في الطابور"""
+        return await self.redis.hgetall(PipelineRun.key_for(process_id, 'job')) or {}
+
+    @staticmethod
+    def _decode(fields: Dict) -> Dict:
+        """فك ترميز حمولة التشغيل"""
+        try:
+            return json.loads(fields.get('payload', '{}'))
+        except (TypeError, json.JSONDecodeError) as e:
+            logging.error(f"Invalid job payload: {str(e)}")
+            return {}
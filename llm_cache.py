@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from prometheus_client import Counter
+
+
+LLM_CACHE_PREFIX = 'llm_cache'
+MAX_CACHED_TEXT = 256 * 1024  # لا تُخزن الاستجابات الأكبر من 256KB
+
+LLM_CACHE_LOOKUPS = Counter(
+    'llm_cache_lookups_total',
+    'LLM response cache lookups',
+    ['tier', 'result']
+)
+LLM_CACHE_SHARED = Counter(
+    'llm_cache_singleflight_shared_total',
+    'Callers that awaited an identical in-flight generation instead of calling the model'
+)
+
+
+class CachedResponse:
+    """استجابة مخزنة بنفس واجهة النص في استجابة Gemini"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _LeaderAbandoned(Exception):
+    """أُلغي الاستدعاء الأصلي دون نتيجة: يولد المنتظرون بأنفسهم"""
+    pass
+
+
+def cache_key(model_name: str, prompt: str, generation_config: Optional[Dict] = None) -> str:
+    """مفتاح التخزين من النموذج وإعدادات التوليد وبصمة النص المنسق بالكامل"""
+    config = json.dumps(generation_config or {}, sort_keys=True, default=str)
+    digest = hashlib.sha256(f'{config}\n{prompt}'.encode()).hexdigest()
+    return f'{LLM_CACHE_PREFIX}:{model_name}:{digest}'
+
+
+class LLMResponseCache:
+    """ذاكرة تخزين من مستويين: LRU داخل العملية وRedis مشترك، مع منع التدافع"""
+
+    def __init__(
+            self,
+            redis_getter: Callable[[], Any],
+            l1_size: Optional[int] = None,
+            l1_ttl: Optional[float] = None,
+            l2_ttl: Optional[int] = None
+    ):
+        self._redis_getter = redis_getter
+        self.l1_size = l1_size or int(os.getenv('LLM_CACHE_L1_SIZE', 512))
+        self.l1_ttl = l1_ttl or float(os.getenv('LLM_CACHE_L1_TTL', 600))
+        self.l2_ttl = l2_ttl or int(os.getenv('LLM_CACHE_TTL', 24 * 3600))
+
+        self._l1: 'OrderedDict[str, Tuple[float, str]]' = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def get_or_generate(
+            self,
+            key: str,
+            generate: Callable[[], Awaitable[Any]],
+            read: bool = True,
+            accept: Optional[Callable[[str], bool]] = None
+    ) -> Any:
+        """إعادة الاستجابة المخزنة أو توليدها مرة واحدة (accept يتحقق من النص قبل تخزينه)"""
+        if read:
+            text = await self.get(key)
+            if text is not None:
+                return CachedResponse(text)
+
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                LLM_CACHE_SHARED.inc()
+                try:
+                    return CachedResponse(await asyncio.shield(inflight))
+                except _LeaderAbandoned:
+                    pass
+
+        future = asyncio.get_running_loop().create_future()
+        # استهلاك الاستثناء حتى لا يُسجل كخطأ غير مسترجع إذا لم يكن هناك منتظرون
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight.setdefault(key, future)
+
+        try:
+            response = await generate()
+            text = self._response_text(response)
+            if text and (accept is None or accept(text)):
+                await self.set(key, text)
+                future.set_result(text)
+            else:
+                future.set_exception(_LeaderAbandoned())
+            return response
+        except asyncio.CancelledError:
+            if not future.done():
+                future.set_exception(_LeaderAbandoned())
+            raise
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    async def get(self, key: str) -> Optional[str]:
+        """البحث في المستوى الأول ثم في Redis"""
+        entry = self._l1.get(key)
+        if entry is not None:
+            expires_at, text = entry
+            if expires_at > time.monotonic():
+                self._l1.move_to_end(key)
+                LLM_CACHE_LOOKUPS.labels(tier='l1', result='hit').inc()
+                return text
+            del self._l1[key]
+        LLM_CACHE_LOOKUPS.labels(tier='l1', result='miss').inc()
+
+        client = self._redis_getter()
+        if client is None:
+            return None
+        try:
+            text = await client.get(key)
+        except Exception as e:
+            logging.warning(f"LLM cache read failed: {str(e)}")
+            return None
+
+        if text is None:
+            LLM_CACHE_LOOKUPS.labels(tier='l2', result='miss').inc()
+            return None
+        if isinstance(text, bytes):
+            text = text.decode()
+        LLM_CACHE_LOOKUPS.labels(tier='l2', result='hit').inc()
+        self._store_l1(key, text)
+        return text
+
+    async def set(self, key: str, text: str) -> None:
+        if len(text) > MAX_CACHED_TEXT:
+            return
+        self._store_l1(key, text)
+
+        client = self._redis_getter()
+        if client is None:
+            return
+        try:
+            await client.set(key, text, ex=self.l2_ttl)
+        except Exception as e:
+            logging.warning(f"LLM cache write failed: {str(e)}")
+
+    def _store_l1(self, key: str, text: str) -> None:
+        self._l1[key] = (time.monotonic() + self.l1_ttl, text)
+        self._l1.move_to_end(key)
+        while len(self._l1) > self.l1_size:
+            self._l1.popitem(last=False)
+
+    @staticmethod
+    def _response_text(response: Any) -> Optional[str]:
+        # response.text يرفع استثناء عند حجب الاستجابة، ولا تُخزن هذه الحالة
+        try:
+            return response.text
+        except Exception:
+            return None
+
+    def snapshot(self) -> Dict:
+        return {
+            'l1_entries': len(self._l1),
+            'l1_size': self.l1_size,
+            'in_flight': len(self._inflight),
+            'l2_ttl': self.l2_ttl
+        }
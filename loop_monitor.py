@@ -0,0 +1,69 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from prometheus_client import Gauge, Histogram
+
+
+EVENT_LOOP_LAG = Histogram(
+    'event_loop_lag_seconds',
+    'Delay between a scheduled wake-up and the event loop running it',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+EVENT_LOOP_LAG_MAX = Gauge(
+    'event_loop_lag_max_seconds',
+    'Largest event loop lag observed in the last reporting window'
+)
+
+
+class EventLoopLagMonitor:
+    """قياس تأخر حلقة الأحداث (أي استدعاء يحجبها يظهر كتأخر في الاستيقاظ)"""
+
+    def __init__(self, interval: float = 0.5, window: int = 120, warn_threshold: float = 1.0):
+        self.interval = interval
+        self.window = window
+        self.warn_threshold = warn_threshold
+
+        self._task: Optional[asyncio.Task] = None
+        self._samples = 0
+        self._window_max = 0.0
+        self._last_lag = 0.0
+
+    def start(self) -> asyncio.Task:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return self._task
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.observe(time.monotonic() - started - self.interval)
+
+    def observe(self, lag: float) -> None:
+        lag = max(0.0, lag)
+        self._last_lag = lag
+        EVENT_LOOP_LAG.observe(lag)
+
+        if self._samples >= self.window:
+            self._samples = 0
+            self._window_max = 0.0
+        self._samples += 1
+        self._window_max = max(self._window_max, lag)
+        EVENT_LOOP_LAG_MAX.set(self._window_max)
+
+        if lag >= self.warn_threshold:
+            logging.warning(f"Event loop blocked for {lag:.2f}s")
+
+    def snapshot(self) -> Dict:
+        return {
+            'last_lag': round(self._last_lag, 4),
+            'window_max_lag': round(self._window_max, 4),
+            'running': bool(self._task and not self._task.done())
+        }
@@ -0,0 +1,223 @@
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Tuple, Iterable
+
+from task_scheduler import TaskGraphScheduler
+
+
+# مزودو الخدمات
+PROVIDER_GEMINI = 'gemini'
+PROVIDER_ELEVENLABS = 'elevenlabs'
+PROVIDER_LOCAL = 'local'
+
+# إعادة المرحلة كاملة حسب مزودها: استدعاءات Gemini وEleven Labs تعيدها سياسة المزود
+# والتحوط داخل كل تنفيذ فتتضاعف المحاولات، أما المراحل المحلية فلا إعادة لها غير هذه
+STAGE_RETRIES_BY_PROVIDER = {
+    PROVIDER_GEMINI: 0,
+    PROVIDER_ELEVENLABS: 0,
+    PROVIDER_LOCAL: 1,
+}
+
+
+@dataclass(frozen=True)
+class StageSpec:
+    """تعريف مرحلة في سلسلة المعالجة"""
+    number: int
+    name: str
+    handler: str  # اسم دالة التنفيذ في المنطق الأساسي
+    inputs: Tuple[int, ...] = ()
+    provider: str = PROVIDER_GEMINI
+    resource_pool: Optional[str] = None  # سيمافور مشترك ('audio' أو 'image')
+    timeout: Optional[float] = None  # حد أعلى لمهلة المرحلة (None = المهلة العامة)
+    max_retries: Optional[int] = None  # إعادة تنفيذ المرحلة كاملة عند الفشل (None = حسب المزود)
+    retry_backoff: float = 1.0
+    critical: bool = False  # فشلها يوقف السلسلة
+    optional: bool = False  # يمكن تخطيها عند ضيق الوقت
+    soft_inputs: Tuple[int, ...] = ()  # مدخلات يكفي انتهاؤها ولو بالفشل
+    passes_topic: bool = False  # تستقبل موضوع التشغيل كمعامل
+    hedge: bool = False  # تكرار استدعاء المزود البطيء وأخذ أول نتيجة
+    cache: bool = False  # إعادة استخدام استجابات النموذج للنصوص المتطابقة (للمراحل غير الإبداعية)
+    stream: bool = False  # بث النص الجزئي للمشتركين أثناء التوليد
+    prompt_budget: Optional[int] = None  # حد رموز النص المنسق (None = الحد العام)
+    fuses: Tuple[int, ...] = ()  # مراحل تابعة تُولد نتائجها في نفس الاستدعاء
+    expected_latency: float = 10.0  # تقدير أولي لزمن التنفيذ بالثواني
+
+    def __post_init__(self):
+        if self.number < 1:
+            raise ValueError("Stage number must be positive")
+        if self.max_retries is not None and self.max_retries < 0:
+            raise ValueError("max_retries must not be negative")
+        if self.provider not in STAGE_RETRIES_BY_PROVIDER:
+            raise ValueError(f"Stage {self.number} has unknown provider '{self.provider}'")
+        if self.prompt_budget is not None and self.prompt_budget < 1:
+            raise ValueError("prompt_budget must be positive")
+        if not set(self.soft_inputs) <= set(self.inputs):
+            raise ValueError(f"Stage {self.number} soft inputs must be declared inputs")
+
+    @property
+    def retries(self) -> int:
+        """عدد مرات إعادة المرحلة المحدد لها أو الافتراضي لمزودها"""
+        if self.max_retries is not None:
+            return self.max_retries
+        return STAGE_RETRIES_BY_PROVIDER[self.provider]
+
+
+class PipelineRegistry:
+    """سجل مراحل السلسلة الذي يُبنى منه رسم التبعيات"""
+
+    def __init__(self, stages: Iterable[StageSpec] = ()):
+        self._stages: Dict[int, StageSpec] = {}
+        for stage in stages:
+            self.register(stage)
+
+    def register(self, stage: StageSpec) -> None:
+        """إضافة مرحلة أو استبدالها"""
+        self._stages[stage.number] = stage
+
+    def remove(self, number: int) -> None:
+        """حذف مرحلة (يجب ألا تعتمد عليها مراحل أخرى)"""
+        dependents = [s.number for s in self._stages.values() if number in s.inputs]
+        if dependents:
+            raise ValueError(f"Stage {number} is required by stages {dependents}")
+        self._stages.pop(number, None)
+
+    def update(self, number: int, **changes) -> StageSpec:
+        """تعديل خصائص مرحلة (للتجارب على الأداء)"""
+        stage = replace(self.get(number), **changes)
+        self._stages[number] = stage
+        return stage
+
+    def copy(self) -> 'PipelineRegistry':
+        return PipelineRegistry(self._stages.values())
+
+    def get(self, number: int) -> StageSpec:
+        if number not in self._stages:
+            raise KeyError(f"Unknown stage {number}")
+        return self._stages[number]
+
+    def find(self, number: int) -> Optional[StageSpec]:
+        return self._stages.get(number)
+
+    @property
+    def task_numbers(self) -> List[int]:
+        return sorted(self._stages)
+
+    def stages(self) -> List[StageSpec]:
+        return [self._stages[n] for n in self.task_numbers]
+
+    def prerequisites(self) -> Dict[int, List[int]]:
+        """رسم التبعيات المشتق من مدخلات المراحل"""
+        return {s.number: list(s.inputs) for s in self.stages() if s.inputs}
+
+    def dependents(self, number: int) -> List[int]:
+        """المرحلة وجميع المراحل التابعة لها مباشرة أو بشكل غير مباشر"""
+        targets = {number}
+        changed = True
+        while changed:
+            changed = False
+            for stage in self._stages.values():
+                if stage.number not in targets and targets.intersection(stage.inputs):
+                    targets.add(stage.number)
+                    changed = True
+        return sorted(targets)
+
+    def critical_tasks(self) -> Tuple[int, ...]:
+        return tuple(s.number for s in self.stages() if s.critical)
+
+    def optional_tasks(self) -> Tuple[int, ...]:
+        return tuple(s.number for s in self.stages() if s.optional)
+
+    def is_soft_input(self, number: int, for_stage: Optional[int] = None) -> bool:
+        """هل يكفي انتهاء المرحلة (ولو بالفشل) لمرحلة تابعة محددة أو لأي مرحلة"""
+        if for_stage is not None:
+            stage = self.find(for_stage)
+            return bool(stage and number in stage.soft_inputs)
+        return any(number in s.soft_inputs for s in self._stages.values())
+
+    def expected_latencies(self) -> Dict[int, float]:
+        return {s.number: s.expected_latency for s in self.stages()}
+
+    def validate(self) -> None:
+        """التحقق من المدخلات والمراحل المدمجة وعدم وجود دورات"""
+        for stage in self.stages():
+            unknown = [n for n in stage.inputs if n not in self._stages]
+            if unknown:
+                raise ValueError(f"Stage {stage.number} depends on unknown stages {unknown}")
+            fused = [self.find(n) for n in stage.fuses]
+            if any(f is None or stage.number not in f.inputs for f in fused):
+                raise ValueError(f"Stage {stage.number} can only fuse stages that depend on it")
+
+        TaskGraphScheduler(self.prerequisites(), self.task_numbers)
+
+    def describe(self) -> List[Dict]:
+        """وصف المراحل للعرض والتقارير"""
+        return [
+            {
+                'number': s.number,
+                'name': s.name,
+                'inputs': list(s.inputs),
+                'provider': s.provider,
+                'retries': s.retries,
+                'resource_pool': s.resource_pool,
+                'critical': s.critical,
+                'optional': s.optional,
+                'hedge': s.hedge,
+                'cache': s.cache,
+                'stream': s.stream,
+                'prompt_budget': s.prompt_budget,
+                'fuses': list(s.fuses)
+            }
+            for s in self.stages()
+        ]
+
+
+def default_pipeline() -> PipelineRegistry:
+    """سلسلة YouTube Shorts الافتراضية"""
+    registry = PipelineRegistry([
+        StageSpec(1, 'topics', 'task_1_generate_youtube_shorts_topics',
+                  critical=True, passes_topic=True, hedge=True,
+                  stream=True, expected_latency=8.0),
+        StageSpec(2, 'trends', 'task_2_YouTube_Shorts_Analyse_Trends',
+                  inputs=(1,), hedge=True, cache=True, stream=True,
+                  expected_latency=8.0),
+        StageSpec(3, 'engagement', 'task_3_YouTube_Shorts_Improve_Audience_Engagement',
+                  inputs=(2,), optional=True, hedge=True, cache=True,
+                  stream=True, expected_latency=8.0),
+        StageSpec(4, 'script', 'task_4_YouTube_Shorts_Write_Scripts',
+                  inputs=(3,), critical=True, hedge=True, stream=True,
+                  expected_latency=10.0),
+        # المراحل 5–7 تعيد تضمين مخرجات عدة مراحل سابقة فتُحد مدخلاتها بميزانية أصغر
+        StageSpec(5, 'keywords', 'task_5_SEO_keyword_research',
+                  inputs=(1, 2, 4), optional=True, hedge=True, cache=True,
+                  stream=True, prompt_budget=5000, expected_latency=8.0),
+        StageSpec(6, 'description', 'task_6_YouTube_Shorts_Write_Description',
+                  inputs=(2, 4, 5), hedge=True, stream=True,
+                  prompt_budget=5000, expected_latency=8.0),
+        StageSpec(7, 'title', 'task_7_YouTube_Shorts_Suggest_SEO_Title',
+                  inputs=(2, 4, 5), hedge=True, stream=True,
+                  prompt_budget=5000, expected_latency=8.0),
+        StageSpec(8, 'audio', 'task_8_generate_audio',
+                  inputs=(4,), provider=PROVIDER_ELEVENLABS,
+                  resource_pool='audio', expected_latency=20.0),
+        # مدة الصوت تُقدَّر مسبقاً وتُطابق في المرحلة 11
+        # تزامن استدعاءات Gemini في المرحلتين 9 و10 يحدده المحدد المتكيف لا مجمع الصور
+        StageSpec(9, 'storyboard', 'task_9_Storyboard_Scenes',
+                  inputs=(4,), cache=True, stream=True,
+                  expected_latency=10.0),
+        StageSpec(10, 'scene_descriptions', 'task_10_image_Scenes',
+                  inputs=(9,), optional=True, cache=True,
+                  expected_latency=15.0),
+        StageSpec(11, 'images', 'task_11_generate_images',
+                  inputs=(8, 10), provider=PROVIDER_LOCAL,
+                  resource_pool='image', soft_inputs=(8,), expected_latency=2.0),
+    ])
+    registry.validate()
+    return registry
+
+
+def fuse_seo_stages(registry: PipelineRegistry) -> PipelineRegistry:
+    """الوضع المدمج: المرحلة 5 تولد الكلمات المفتاحية والوصف والعنوان في استدعاء واحد"""
+    fused = registry.copy()
+    # تخطي المرحلة 5 يعيد استدعاءين منفصلين للمرحلتين 6 و7، فلا تبقى اختيارية
+    fused.update(5, fuses=(6, 7), optional=False)
+    fused.validate()
+    return fused
@@ -0,0 +1,244 @@
+import asyncio
+import logging
+import os
+import signal
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from core_logic import AsyncStreamingCoreLogic, RunConflictError
+from job_queue import PipelineJobQueue, JobState, decrypt_job_secrets
+from redis_manager import EnhancedRedisManager
+
+
+class PipelineRunFailed(Exception):
+    """انتهى التشغيل بفشل السلسلة أو إحدى مهامها الحرجة"""
+    pass
+
+
+class PipelineWorker:
+    """عامل مستقل يستهلك تشغيلات السلاسل من طابور Redis"""
+
+    def __init__(
+            self,
+            core_logic: AsyncStreamingCoreLogic,
+            job_queue: PipelineJobQueue,
+            concurrency: int = 4,
+            heartbeat_interval: float = 15,
+            shutdown_timeout: float = 60
+    ):
+        if not isinstance(concurrency, int) or concurrency < 1:
+            raise ValueError("concurrency must be a positive integer")
+
+        self.core_logic = core_logic
+        self.queue = job_queue
+        self.concurrency = concurrency
+        self.heartbeat_interval = heartbeat_interval
+        self.shutdown_timeout = shutdown_timeout
+
+        self._slots = asyncio.Semaphore(concurrency)
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._stopping = asyncio.Event()
+
+    def stop(self) -> None:
+        """إيقاف استلام تشغيلات جديدة"""
+        logging.info("Pipeline worker stopping...")
+        self._stopping.set()
+
+    async def run(self) -> None:
+        """الحلقة الرئيسية للعامل"""
+        await self.queue.ensure_group()
+        heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+        cancellation_task = asyncio.create_task(self.core_logic.listen_for_cancellations())
+        self.core_logic.loop_lag_monitor.start()
+        logging.info(
+            f"Pipeline worker {self.queue.consumer_name} started "
+            f"(concurrency={self.concurrency})"
+        )
+
+        try:
+            while not self._stopping.is_set():
+                await self._slots.acquire()
+                try:
+                    # الأولوية للتشغيلات المعلقة لدى عمال متوقفين
+                    jobs = await self.queue.reclaim_stale(count=1)
+                    if not jobs:
+                        jobs = await self.queue.claim(count=1, block_ms=5000)
+                except Exception as e:
+                    logging.error(f"Error claiming pipeline jobs: {str(e)}")
+                    jobs = []
+                    await asyncio.sleep(1)
+
+                if not jobs or self._stopping.is_set():
+                    self._slots.release()
+                    continue
+
+                message_id, job = jobs[0]
+                task = asyncio.create_task(self._process_job(message_id, job))
+                self._in_flight[message_id] = task
+                task.add_done_callback(lambda _, mid=message_id: self._on_job_done(mid))
+
+        finally:
+            heartbeat_task.cancel()
+            cancellation_task.cancel()
+            await self._drain()
+            self.core_logic.loop_lag_monitor.stop()
+            self.core_logic.gemini_client.close()
+
+    def _on_job_done(self, message_id: str) -> None:
+        """تحرير مكان التشغيل المنتهي"""
+        self._in_flight.pop(message_id, None)
+        self._slots.release()
+
+    async def _process_job(self, message_id: str, job: Dict) -> None:
+        """تنفيذ تشغيل واحد وتأكيده"""
+        process_id = job.get('process_id')
+        deliveries = 0
+        try:
+            if not process_id or not job.get('topic') or not job.get('secrets'):
+                await self.queue.dead_letter(message_id, job, "Invalid job payload")
+                return
+
+            deliveries = await self.queue.delivery_count(message_id)
+            if deliveries > self.queue.max_deliveries:
+                await self.queue.dead_letter(message_id, job, f"Exceeded {self.queue.max_deliveries} deliveries")
+                return
+
+            # تشغيل أُلغي أثناء انتظاره في الطابور
+            if await self.core_logic.is_cancel_requested(process_id):
+                await self.queue.ack(message_id)
+                await self.queue.set_job_state(process_id, JobState.CANCELLED)
+                logging.info(f"Run {process_id} cancelled before start")
+                return
+
+            self.core_logic.ensure_run_not_active(process_id)
+            await self.queue.set_job_state(process_id, JobState.RUNNING, message_id=message_id, attempt=deliveries)
+            logging.info(f"Processing run {process_id} (attempt {deliveries})")
+
+            keys = decrypt_job_secrets(job['secrets'])
+            self.core_logic.create_run(
+                process_id,
+                user_id=job.get('user_id'),
+                topic=job['topic'],
+                priority=job.get('priority', 'normal'),
+                timeout=self._remaining_timeout(job)
+            )
+            await self.core_logic.configure_apis(
+                keys['google_api_key'],
+                keys['eleven_labs_api_key'],
+                keys['eleven_labs_voice_id'],
+                process_id=process_id,
+                validate=False
+            )
+            chain_status = await self.core_logic.chain_tasks(
+                job['topic'],
+                process_id=process_id,
+                tasks=job.get('tasks')
+            )
+
+            run = self.core_logic.get_run(process_id)
+            cancelled = bool(run and run.cancel_requested)
+            failure = None if cancelled else self.core_logic.chain_failure(chain_status or {})
+            if failure:
+                # بدون تأكيد: يستعيده عامل بعد مهلة الخمول ويستأنفه من نقاط الاستئناف، أو يُنقل للرسائل الميتة
+                raise PipelineRunFailed(failure)
+
+            await self.queue.ack(message_id)
+            await self.queue.set_job_state(process_id, JobState.CANCELLED if cancelled else JobState.COMPLETED)
+
+        except asyncio.CancelledError:
+            # بدون تأكيد: سيستعيد عامل آخر التشغيل بعد انتهاء مهلة الخمول
+            logging.warning(f"Run {process_id} interrupted, leaving it pending for reclaim")
+            raise
+        except RunConflictError as e:
+            # نسخة مكررة من تشغيل جارٍ على هذا العامل: تبقى معلقة دون المساس بحالة التشغيل الجاري
+            logging.warning(f"Skipping duplicate delivery of run {process_id}: {str(e)}")
+        except Exception as e:
+            logging.error(f"Error processing run {process_id}: {str(e)}")
+            if deliveries >= self.queue.max_deliveries:
+                await self.queue.dead_letter(message_id, job, str(e))
+            elif process_id:
+                await self.queue.set_job_state(process_id, JobState.FAILED, error=str(e))
+
+    @staticmethod
+    def _remaining_timeout(job: Dict) -> Optional[float]:
+        """مهلة الطلب بعد خصم وقت الانتظار في الطابور"""
+        timeout = job.get('timeout')
+        if not timeout:
+            return None
+        try:
+            submitted_at = datetime.fromisoformat(job['submitted_at'])
+            waited = (datetime.now(timezone.utc) - submitted_at).total_seconds()
+        except (KeyError, TypeError, ValueError):
+            waited = 0
+        # حد أدنى يسمح بتنفيذ المهام الإلزامية بدلاً من الفشل الفوري
+        return max(float(timeout) - max(waited, 0), 30.0)
+
+    async def _heartbeat_loop(self) -> None:
+        """تجديد ملكية التشغيلات الجارية دورياً"""
+        while True:
+            try:
+                await asyncio.sleep(self.heartbeat_interval)
+                await self.queue.heartbeat(list(self._in_flight))
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logging.error(f"Pipeline worker heartbeat error: {str(e)}")
+
+    async def _drain(self) -> None:
+        """انتظار التشغيلات الجارية قبل الإيقاف"""
+        if not self._in_flight:
+            return
+
+        logging.info(f"Waiting for {len(self._in_flight)} in-flight runs...")
+        done, pending = await asyncio.wait(
+            list(self._in_flight.values()),
+            timeout=self.shutdown_timeout
+        )
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logging.warning(f"{len(pending)} runs left pending for another worker")
+
+
+async def main() -> None:
+    """نقطة دخول عامل التشغيلات"""
+    logging.basicConfig(
+        level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+
+    redis_manager = EnhancedRedisManager(
+        max_retries=int(os.getenv('REDIS_MAX_RETRIES', 3)),
+        timeout=int(os.getenv('REDIS_TIMEOUT', 30)),
+        max_connections=int(os.getenv('REDIS_MAX_CONNECTIONS', 20))
+    )
+    await redis_manager.init_connections()
+
+    try:
+        core_logic = AsyncStreamingCoreLogic(
+            redis_manager=redis_manager,
+            max_retries=int(os.getenv('MAX_RETRIES', 3)),
+            timeout=int(os.getenv('TIMEOUT', 30))
+        )
+        if not await core_logic.init_redis():
+            raise RuntimeError("Failed to initialize Redis for pipeline worker")
+
+        worker = PipelineWorker(
+            core_logic,
+            PipelineJobQueue(core_logic.redis),
+            concurrency=int(os.getenv('PIPELINE_WORKER_CONCURRENCY', 4))
+        )
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, worker.stop)
+
+        await worker.run()
+
+    finally:
+        await redis_manager.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,150 @@
+import logging
+import math
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from prometheus_client import Counter, Histogram
+
+
+# متوسط الأحرف لكل رمز: النص اللاتيني أطول رموزاً من العربي وبقية النصوص غير اللاتينية
+ASCII_CHARS_PER_TOKEN = 4.0
+NON_ASCII_CHARS_PER_TOKEN = 2.0
+
+# أقل حصة لأي حقل حتى لا يختفي مدخل كامل عند ضيق الميزانية
+MIN_FIELD_TOKENS = 128
+ELISION_MARKER = '\n[...]\n'
+
+MARKDOWN_NOISE = re.compile(r'(\*\*|__|`{3}\w*|^#{1,6}\s*)', re.MULTILINE)
+EXTRA_BLANK_LINES = re.compile(r'\n\s*\n+')
+INLINE_SPACES = re.compile(r'[ \t]+')
+
+PROMPT_TOKENS = Histogram(
+    'prompt_tokens_estimated',
+    'Estimated input tokens of formatted prompts',
+    ['task'],
+    buckets=(250, 500, 1000, 2000, 3000, 4000, 6000, 8000, 12000, 16000, 32000)
+)
+PROMPT_TOKENS_TRIMMED = Counter(
+    'prompt_tokens_trimmed_total',
+    'Estimated tokens removed from upstream outputs to fit prompt budgets',
+    ['task']
+)
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """تقدير عدد الرموز دون محلل النموذج (تقريب كافٍ للميزانيات والمقاييس)"""
+    if not text:
+        return 0
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    other_chars = len(text) - ascii_chars
+    return math.ceil(ascii_chars / ASCII_CHARS_PER_TOKEN + other_chars / NON_ASCII_CHARS_PER_TOKEN)
+
+
+def normalize_output(text: str) -> str:
+    """إزالة تنسيق Markdown والأسطر الفارغة والمكررة من مخرجات المراحل السابقة"""
+    text = MARKDOWN_NOISE.sub('', text)
+    lines, seen = [], set()
+    for line in text.splitlines():
+        line = INLINE_SPACES.sub(' ', line).strip()
+        if line and line in seen:
+            continue
+        seen.add(line)
+        lines.append(line)
+    return EXTRA_BLANK_LINES.sub('\n\n', '\n'.join(lines)).strip()
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """اقتطاع النص عند حدود الفقرات مع الإبقاء على بدايته ونهايته"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    paragraphs = [p for p in text.split('\n\n') if p.strip()]
+    head_budget = max_tokens * 2 // 3
+    head: List[str] = []
+    used = 0
+    for paragraph in paragraphs:
+        cost = estimate_tokens(paragraph)
+        if used + cost > head_budget:
+            break
+        head.append(paragraph)
+        used += cost
+
+    tail: List[str] = []
+    for paragraph in reversed(paragraphs[len(head):]):
+        cost = estimate_tokens(paragraph)
+        if used + cost > max_tokens:
+            break
+        tail.insert(0, paragraph)
+        used += cost
+
+    if not head and not tail:
+        # فقرة واحدة طويلة: اقتطاع بالأحرف
+        chars = int(max_tokens * NON_ASCII_CHARS_PER_TOKEN)
+        return text[:chars].rstrip() + ELISION_MARKER.rstrip()
+    return '\n\n'.join(head) + ELISION_MARKER + '\n\n'.join(tail)
+
+
+class PromptBudgeter:
+    """قياس النصوص المنسقة وفرض ميزانية الرموز بضغط مخرجات المراحل السابقة"""
+
+    def __init__(self, default_budget: Optional[int] = None):
+        self.default_budget = default_budget or int(os.getenv('PROMPT_TOKEN_BUDGET', 6000))
+
+    def allocate(self, sizes: Dict[str, int], available: int) -> Dict[str, int]:
+        """توزيع الرموز المتاحة على الحقول: الصغيرة تبقى كاملة والباقي يُقسم بالتساوي"""
+        allocation: Dict[str, int] = {}
+        remaining = dict(sizes)
+        available = max(available, MIN_FIELD_TOKENS * len(sizes))
+        while remaining:
+            share = available // len(remaining)
+            small = {name: size for name, size in remaining.items() if size <= share}
+            if not small:
+                for name in remaining:
+                    allocation[name] = max(share, MIN_FIELD_TOKENS)
+                break
+            for name, size in small.items():
+                allocation[name] = size
+                available -= size
+                del remaining[name]
+        return allocation
+
+    def format(
+            self,
+            template: str,
+            budget: Optional[int] = None,
+            task: str = '',
+            prefix: str = '',
+            **fields: str
+    ) -> Tuple[str, Dict]:
+        """تنسيق القالب (بعد بادئة ثابتة اختيارية) ضمن الميزانية وإعادة النص مع إحصاءات الحجم"""
+        budget = budget or self.default_budget
+        fields = {name: normalize_output(str(value or '')) for name, value in fields.items()}
+
+        # القالب نفسه لا يُقتطع: الميزانية تحد ما يُضاف إليه فقط
+        template_tokens = estimate_tokens(prefix + template.format(**{name: '' for name in fields}))
+        sizes = {name: estimate_tokens(value) for name, value in fields.items()}
+        available = budget - template_tokens
+
+        trimmed = 0
+        if sum(sizes.values()) > available:
+            allocation = self.allocate(sizes, available)
+            for name, value in fields.items():
+                if sizes[name] > allocation[name]:
+                    fields[name] = truncate_to_tokens(value, allocation[name])
+                    trimmed += sizes[name] - estimate_tokens(fields[name])
+
+        prompt = prefix + template.format(**fields)
+        tokens = estimate_tokens(prompt)
+        PROMPT_TOKENS.labels(task=task).observe(tokens)
+        if trimmed:
+            PROMPT_TOKENS_TRIMMED.labels(task=task).inc(trimmed)
+            logging.info(f"Prompt for task {task} trimmed by ~{trimmed} tokens to ~{tokens}")
+
+        return prompt, {
+            'tokens': tokens,
+            'template_tokens': template_tokens,
+            'field_tokens': sizes,
+            'trimmed_tokens': trimmed,
+            'budget': budget
+        }
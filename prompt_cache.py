@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import string
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+from prometheus_client import Counter
+
+from gemini_client import api_key_fingerprint, build_isolated_model
+from prompt_budget import estimate_tokens
+
+
+PLACEHOLDER_NAME = re.compile(r'^[A-Za-z_]\w*$')
+INPUTS_HEADER = '\n\nThe inputs referenced above as <name> are provided below.\n\n'
+
+PROMPT_CACHE_LOOKUPS = Counter(
+    'prompt_prefix_cache_lookups_total',
+    'Provider-side cached prefix lookups',
+    ['result']
+)
+
+
+class PromptLayout:
+    """قالب مقسوم إلى بادئة تعليمات ثابتة ولاحقة بالمدخلات المتغيرة"""
+
+    def __init__(self, name: str, prefix: str, suffix: str, fields: List[str]):
+        self.name = name
+        self.prefix = prefix
+        self.suffix = suffix
+        self.fields = fields
+        # إصدار البادئة: يتغير مع أي تعديل على نص التعليمات فيُنشأ مقبض جديد
+        self.version = hashlib.sha256(prefix.encode()).hexdigest()[:12]
+
+    def render(self, **fields: Any) -> str:
+        return self.prefix + self.suffix.format(**fields)
+
+
+def split_template(name: str, template: str) -> PromptLayout:
+    """نقل المتغيرات من داخل التعليمات إلى لاحقة ثابتة الموضع بعد البادئة"""
+    parts: List[str] = []
+    fields: List[str] = []
+    for literal, field, spec, conversion in string.Formatter().parse(template):
+        parts.append(literal)
+        if field is None:
+            continue
+        if PLACEHOLDER_NAME.match(field) and not spec and not conversion:
+            if field not in fields:
+                fields.append(field)
+            parts.append(f'<{field}>')
+        else:
+            # أقواس حرفية غير مهربة في القالب (أمثلة JSON) تبقى كما هي في البادئة
+            parts.append(
+                '{' + field + (f'!{conversion}' if conversion else '') + (f':{spec}' if spec else '') + '}'
+            )
+
+    prefix = ''.join(parts).rstrip() + INPUTS_HEADER
+    suffix = '\n\n'.join(f'<{field}>\n{{{field}}}\n</{field}>' for field in fields)
+    return PromptLayout(name, prefix, suffix, fields)
+
+
+class _CachedContentRef:
+    """مرجع محتوى مخزن بالاسم (يكفي النموذج لإرسال cached_content مع الطلب)"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class GeminiContextCacheProvider:
+    """إنشاء محتوى مخزن لدى Gemini بعميل خاص بالمفتاح (يتطلب مكتبة تدعم التخزين)"""
+
+    def __init__(self, model_factory: Callable[[str, str], Any] = build_isolated_model):
+        self._model_factory = model_factory
+
+    @property
+    def supported(self) -> bool:
+        return (hasattr(glm, 'CacheServiceClient')
+                and hasattr(genai.GenerativeModel, 'from_cached_content'))
+
+    async def create(self, api_key: str, model_name: str, prefix: str, ttl: int) -> str:
+        def create_sync():
+            client = glm.CacheServiceClient(client_options={'api_key': api_key})
+            cached = client.create_cached_content(
+                cached_content=glm.CachedContent(
+                    model=model_name if model_name.startswith('models/') else f'models/{model_name}',
+                    contents=[glm.Content(role='user', parts=[glm.Part(text=prefix)])],
+                    ttl={'seconds': ttl}
+                )
+            )
+            return cached.name
+
+        return await asyncio.to_thread(create_sync)
+
+    def bind(self, api_key: str, model_name: str, handle: str) -> Any:
+        model = self._model_factory(api_key, model_name.replace('models/', '', 1))
+        model._cached_content = _CachedContentRef(handle)
+        return model
+
+
+class PromptPrefixCache:
+    """مقابض البادئات المخزنة لدى المزود: مقبض واحد لكل مفتاح ونموذج وإصدار بادئة في العملية"""
+
+    def __init__(
+            self,
+            provider: Any,
+            ttl: Optional[int] = None,
+            min_tokens: Optional[int] = None,
+            failure_cooldown: float = 600.0
+    ):
+        self.provider = provider
+        self.ttl = ttl or int(os.getenv('PROMPT_CACHE_TTL', 3600))
+        # البادئات الأقصر من الحد الأدنى للمزود لا تُخزن
+        self.min_tokens = min_tokens or int(os.getenv('PROMPT_CACHE_MIN_TOKENS', 1024))
+        self.failure_cooldown = failure_cooldown
+
+        self._handles: Dict[Tuple[str, str, str], Tuple[str, float]] = {}
+        self._failures: Dict[Tuple[str, str, str], float] = {}
+        self._locks: Dict[Tuple[str, str, str], asyncio.Lock] = {}
+        self._models: Dict[str, Any] = {}
+
+    @property
+    def supported(self) -> bool:
+        return bool(getattr(self.provider, 'supported', False))
+
+    async def get(self, api_key: str, model_name: str, layout: PromptLayout) -> Optional[str]:
+        """مقبض البادئة المخزنة أو None (يُرسل النص كاملاً عندها)"""
+        if not self.supported or estimate_tokens(layout.prefix) < self.min_tokens:
+            return None
+
+        key = (api_key_fingerprint(api_key), model_name, layout.version)
+        handle = self._valid_handle(key)
+        if handle:
+            PROMPT_CACHE_LOOKUPS.labels(result='hit').inc()
+            return handle
+        if self._failures.get(key, 0) > time.monotonic():
+            PROMPT_CACHE_LOOKUPS.labels(result='disabled').inc()
+            return None
+
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            handle = self._valid_handle(key)
+            if handle:
+                PROMPT_CACHE_LOOKUPS.labels(result='hit').inc()
+                return handle
+
+            try:
+                handle = await self.provider.create(api_key, model_name, layout.prefix, self.ttl)
+            except Exception as e:
+                logging.warning(f"Creating cached prefix for {layout.name} failed: {str(e)}")
+                self._failures[key] = time.monotonic() + self.failure_cooldown
+                PROMPT_CACHE_LOOKUPS.labels(result='error').inc()
+                return None
+
+            # التجديد قبل انتهاء الصلاحية لدى المزود
+            self._handles[key] = (handle, time.monotonic() + self.ttl * 0.9)
+            PROMPT_CACHE_LOOKUPS.labels(result='created').inc()
+            logging.info(f"Cached prefix of {layout.name} (version {layout.version}) as {handle}")
+            return handle
+
+    def _valid_handle(self, key: Tuple[str, str, str]) -> Optional[str]:
+        entry = self._handles.get(key)
+        if entry is None:
+            return None
+        handle, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._handles[key]
+            self._models.pop(handle, None)
+            return None
+        return handle
+
+    def model_for(self, api_key: str, model_name: str, handle: str) -> Any:
+        """نموذج مرتبط بالبادئة المخزنة"""
+        model = self._models.get(handle)
+        if model is None:
+            model = self.provider.bind(api_key, model_name, handle)
+            self._models[handle] = model
+        return model
+
+    def snapshot(self) -> Dict:
+        return {
+            'supported': self.supported,
+            'handles': len(self._handles),
+            'disabled_prefixes': sum(1 for until in self._failures.values() if until > time.monotonic()),
+            'ttl': self.ttl,
+            'min_tokens': self.min_tokens
+        }
@@ -0,0 +1,195 @@
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+from prometheus_client import Counter, Histogram
+
+from pipeline_registry import PROVIDER_GEMINI, PROVIDER_ELEVENLABS
+
+
+QUOTA_KEY_PREFIX = 'quota'
+
+# مقاييس حصص المزودين
+QUOTA_PERMITS_GRANTED = Counter(
+    'quota_permits_granted_total',
+    'Provider quota permits granted',
+    ['provider']
+)
+QUOTA_PERMITS_WAITED = Counter(
+    'quota_permits_waited_total',
+    'Provider quota permits granted after waiting',
+    ['provider']
+)
+QUOTA_PERMITS_DENIED = Counter(
+    'quota_permits_denied_total',
+    'Provider quota permits denied after the wait timeout',
+    ['provider']
+)
+QUOTA_WAIT_TIME = Histogram(
+    'quota_wait_seconds',
+    'Time spent waiting for a provider quota permit',
+    ['provider'],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+
+# خوارزمية GCRA ذرية: الوقت من ساعة Redis نفسها ليتفق عليه جميع العمال والعقد
+# KEYS[1] = مفتاح الحصة، ARGV = [الفاصل بين الطلبات (ms)، سماحية الدفعة (ms)، التكلفة]
+# يعيد {1, 0} عند المنح أو {0, الانتظار بالمللي ثانية} عند الرفض
+GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+local new_tat = tat + interval * cost
+local allow_at = new_tat - tolerance
+if allow_at > now then
+    return {0, allow_at - now}
+end
+redis.call('SET', KEYS[1], new_tat, 'PX', math.ceil(new_tat - now) + 1000)
+return {1, 0}
+"""
+
+
+class QuotaWaitTimeout(Exception):
+    """انتهت مهلة انتظار إذن الحصة"""
+    pass
+
+
+@dataclass(frozen=True)
+class QuotaSpec:
+    """حصة مزود لكل مفتاح API"""
+    requests_per_minute: float
+    burst: int = 1
+
+    def __post_init__(self):
+        if self.requests_per_minute <= 0:
+            raise ValueError("requests_per_minute must be positive")
+        if self.burst < 1:
+            raise ValueError("burst must be at least 1")
+
+    @property
+    def interval_ms(self) -> float:
+        return 60000.0 / self.requests_per_minute
+
+    @property
+    def tolerance_ms(self) -> float:
+        return self.interval_ms * self.burst
+
+
+def default_quotas() -> Dict[str, QuotaSpec]:
+    """حصص المزودين من المتغيرات البيئية"""
+    return {
+        PROVIDER_GEMINI: QuotaSpec(
+            requests_per_minute=float(os.getenv('GEMINI_QUOTA_PER_MINUTE', 60)),
+            burst=int(os.getenv('GEMINI_QUOTA_BURST', 10))
+        ),
+        PROVIDER_ELEVENLABS: QuotaSpec(
+            requests_per_minute=float(os.getenv('ELEVENLABS_QUOTA_PER_MINUTE', 20)),
+            burst=int(os.getenv('ELEVENLABS_QUOTA_BURST', 2))
+        )
+    }
+
+
+def quota_key(provider: str, api_key: str) -> str:
+    """مفتاح Redis للحصة (المفتاح مجزأ ولا يُخزن نصاً صريحاً)"""
+    digest = hashlib.sha256(api_key.encode()).hexdigest()[:16]
+    return f'{QUOTA_KEY_PREFIX}:{provider}:{digest}'
+
+
+class QuotaLimiter:
+    """محدد حصص موزع (GCRA) لكل مزود ومفتاح API مشترك بين جميع العمال"""
+
+    def __init__(
+            self,
+            redis_getter: Callable[[], object],
+            quotas: Optional[Dict[str, QuotaSpec]] = None,
+            max_sleep: float = 1.0
+    ):
+        self._redis_getter = redis_getter
+        self.quotas = dict(quotas if quotas is not None else default_quotas())
+        self.max_sleep = max_sleep
+
+        self._scripts: Dict[int, object] = {}
+        # حالة محلية تُستخدم فقط عند تعذر الوصول إلى Redis
+        self._local_tat: Dict[str, float] = {}
+
+    async def acquire(
+            self,
+            provider: str,
+            api_key: Optional[str],
+            cost: int = 1,
+            timeout: Optional[float] = None
+    ) -> float:
+        """انتظار إذن ضمن الحصة بدلاً من الرفض، ويعيد زمن الانتظار"""
+        spec = self.quotas.get(provider)
+        if not spec or not api_key:
+            return 0.0
+
+        key = quota_key(provider, api_key)
+        started = time.monotonic()
+        waited = False
+
+        while True:
+            allowed, retry_after = await self._try_acquire(key, spec, cost)
+            elapsed = time.monotonic() - started
+            if allowed:
+                QUOTA_PERMITS_GRANTED.labels(provider=provider).inc()
+                QUOTA_WAIT_TIME.labels(provider=provider).observe(elapsed)
+                if waited:
+                    QUOTA_PERMITS_WAITED.labels(provider=provider).inc()
+                return elapsed
+
+            if timeout is not None and elapsed + retry_after > timeout:
+                QUOTA_PERMITS_DENIED.labels(provider=provider).inc()
+                raise QuotaWaitTimeout(
+                    f"{provider} quota permit not available within {timeout:.1f}s"
+                )
+
+            waited = True
+            await asyncio.sleep(min(max(retry_after, 0.001), self.max_sleep))
+
+    async def _try_acquire(self, key: str, spec: QuotaSpec, cost: int) -> Tuple[bool, float]:
+        """محاولة واحدة عبر سكربت Redis، أو محلياً عند انقطاعه"""
+        client = self._redis_getter()
+        if client is not None:
+            try:
+                script = self._scripts.get(id(client))
+                if script is None:
+                    script = client.register_script(GCRA_SCRIPT)
+                    self._scripts = {id(client): script}
+                allowed, retry_after_ms = await script(
+                    keys=[key],
+                    args=[spec.interval_ms, spec.tolerance_ms, cost]
+                )
+                return bool(int(allowed)), int(retry_after_ms) / 1000
+            except Exception as e:
+                logging.warning(f"Redis quota check failed, using local limit: {str(e)}")
+
+        return self._local_try_acquire(key, spec, cost)
+
+    def _local_try_acquire(self, key: str, spec: QuotaSpec, cost: int) -> Tuple[bool, float]:
+        """نفس خوارزمية GCRA داخل العملية الحالية فقط"""
+        now = time.monotonic() * 1000
+        tat = max(self._local_tat.get(key, now), now)
+        new_tat = tat + spec.interval_ms * cost
+        allow_at = new_tat - spec.tolerance_ms
+        if allow_at > now:
+            return False, math.ceil(allow_at - now) / 1000
+        self._local_tat[key] = new_tat
+        return True, 0.0
+
+    def snapshot(self) -> Dict:
+        return {
+            provider: {'requests_per_minute': spec.requests_per_minute, 'burst': spec.burst}
+            for provider, spec in self.quotas.items()
+        }
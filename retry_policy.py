@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from prometheus_client import Counter
+
+from adaptive_limiter import is_overload_error, is_timeout_error
+from circuit_breaker import CircuitOpenError
+from quota_limiter import QuotaWaitTimeout
+
+
+# رموز HTTP التي تستحق إعادة المحاولة
+RETRYABLE_STATUS_CODES = (408, 425, 429, 500, 502, 503, 504)
+
+RETRY_ATTEMPTS = Counter(
+    'retry_attempts_total',
+    'Retries performed by the retry engine',
+    ['operation']
+)
+RETRY_GIVE_UPS = Counter(
+    'retry_give_ups_total',
+    'Operations abandoned by the retry engine',
+    ['operation', 'reason']
+)
+
+
+class ProviderHTTPError(Exception):
+    """استجابة HTTP فاشلة من مزود خارجي"""
+
+    def __init__(self, status: int, message: str, retry_after: Optional[str] = None):
+        super().__init__(message)
+        self.code = status
+        self.retry_after = parse_retry_after(retry_after)
+
+
+def parse_retry_after(value: Any) -> Optional[float]:
+    """تحويل ترويسة Retry-After (ثوانٍ أو تاريخ HTTP) إلى ثوانٍ"""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        retry_at = parsedate_to_datetime(str(value))
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_after_from(error: BaseException) -> Optional[float]:
+    """استخراج مهلة الانتظار التي يطلبها المزود من الخطأ"""
+    if isinstance(getattr(error, 'retry_after', None), (int, float)):
+        return float(error.retry_after)
+    for source in (error, getattr(error, 'response', None)):
+        headers = getattr(source, 'headers', None)
+        if headers:
+            try:
+                delay = parse_retry_after(headers.get('Retry-After'))
+            except AttributeError:
+                continue
+            if delay is not None:
+                return delay
+    return None
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """تصنيف الأخطاء: العابرة تُعاد، والرفض النهائي أو الدائرة المفتوحة لا"""
+    if isinstance(error, (CircuitOpenError, QuotaWaitTimeout)):
+        return False
+    # أخطاء التحقق من المدخلات لا تتغير بإعادة المحاولة
+    if isinstance(error, (ValueError, TypeError, KeyError)):
+        return False
+    if is_overload_error(error) or is_timeout_error(error):
+        return True
+    code = getattr(error, 'code', None)
+    try:
+        code = int(code)
+    except (TypeError, ValueError):
+        code = None
+    if code is not None and 400 <= code < 600:
+        return code in RETRYABLE_STATUS_CODES
+    return True
+
+
+class RetryBudget:
+    """ميزانية إعادة المحاولة: كل استدعاء أول يضيف نسبة من محاولة إضافية"""
+
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 10.0):
+        if not 0 <= ratio <= 1:
+            raise ValueError("ratio must be in [0, 1]")
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = max_tokens
+
+    def on_call(self) -> None:
+        self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+
+class RetryPolicy:
+    """محرك إعادة المحاولة الموحد: تأخير أسي بتشويش كامل واحترام Retry-After والميزانية والموعد النهائي"""
+
+    def __init__(
+            self,
+            max_attempts: int = 3,
+            base_delay: float = 1.0,
+            max_delay: float = 30.0,
+            budget: Optional[RetryBudget] = None,
+            retryable: Callable[[BaseException], bool] = is_retryable_error,
+            deadline: Optional[Callable[[], Optional[float]]] = None
+    ):
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1")
+
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.retryable = retryable
+        # دالة تعيد الوقت المتبقي بالثواني (None = بلا موعد نهائي)
+        self.deadline = deadline
+
+    def backoff(self, attempt: int, error: Optional[BaseException] = None) -> float:
+        """مدة الانتظار قبل المحاولة التالية (تشويش كامل لتفادي موجات الإعادة المتزامنة)"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        retry_after = retry_after_from(error) if error is not None else None
+        if retry_after is not None:
+            delay = min(self.max_delay, retry_after) + random.uniform(0, self.base_delay)
+        return delay
+
+    async def call(
+            self,
+            factory: Callable[[], Awaitable[Any]],
+            operation: str = 'call',
+            retry_result: Optional[Callable[[Any], bool]] = None
+    ) -> Any:
+        """تنفيذ الاستدعاء مع إعادة المحاولة (retry_result لإعادة المحاولة على نتيجة فاشلة)"""
+        if self.budget:
+            self.budget.on_call()
+
+        for attempt in range(self.max_attempts):
+            error: Optional[BaseException] = None
+            try:
+                result = await factory()
+                if not retry_result or not retry_result(result):
+                    return result
+            except Exception as e:
+                if not self.retryable(e):
+                    raise
+                error = e
+
+            reason, delay = self._next_delay(attempt, error)
+            if reason:
+                RETRY_GIVE_UPS.labels(operation=operation, reason=reason).inc()
+                if error is not None:
+                    raise error
+                return result
+
+            RETRY_ATTEMPTS.labels(operation=operation).inc()
+            logging.warning(
+                f"Retrying {operation} in {delay:.2f}s (attempt {attempt + 2}/{self.max_attempts})"
+                + (f": {str(error)}" if error is not None else "")
+            )
+            await asyncio.sleep(delay)
+
+    def _next_delay(self, attempt: int, error: Optional[BaseException]) -> Tuple[Optional[str], float]:
+        """مدة الانتظار، أو سبب التوقف عن المحاولة"""
+        if attempt == self.max_attempts - 1:
+            return 'exhausted', 0.0
+        delay = self.backoff(attempt, error)
+        if self.deadline:
+            remaining = self.deadline()
+            if remaining is not None and delay >= remaining:
+                return 'deadline', 0.0
+        if self.budget and not self.budget.try_spend():
+            return 'budget', 0.0
+        return None, delay
@@ -0,0 +1,124 @@
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from prometheus_client import Counter
+
+
+SCENES_KEY = 'sentiments'
+SCENE_FIELDS = ('scene_number', 'prompt', 'emotion', 'scene_description')
+
+# مخطط المشاهد لإخراج JSON المقيد (صيغة Schema في Gemini)
+STORYBOARD_SCHEMA: Dict[str, Any] = {
+    'type': 'OBJECT',
+    'properties': {
+        SCENES_KEY: {
+            'type': 'ARRAY',
+            'items': {
+                'type': 'OBJECT',
+                'properties': {
+                    'scene_number': {'type': 'INTEGER'},
+                    'prompt': {'type': 'STRING'},
+                    'emotion': {'type': 'STRING'},
+                    'scene_description': {'type': 'STRING'}
+                },
+                'required': list(SCENE_FIELDS)
+            }
+        }
+    },
+    'required': [SCENES_KEY]
+}
+
+CODE_FENCE = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$', re.IGNORECASE)
+
+SCENE_PARSE_RESULTS = Counter(
+    'storyboard_parse_results_total',
+    'Storyboard responses by parsing outcome',
+    ['result']
+)
+
+
+def _normalize_scene(item: Any) -> Optional[Dict]:
+    """مشهد صالح أو None (الوصف مطلوب، ويُستكمل من النص المرئي عند غيابه)"""
+    if not isinstance(item, dict):
+        return None
+    description = item.get('scene_description') or item.get('prompt')
+    if not isinstance(description, str) or not description.strip():
+        return None
+
+    scene = dict(item)
+    scene['scene_description'] = description.strip()
+    scene.setdefault('prompt', scene['scene_description'])
+    scene.setdefault('emotion', '')
+    return scene
+
+
+def _strict_scenes(text: str) -> Optional[List[Any]]:
+    try:
+        # strict=False يقبل الأسطر الجديدة ومسافات الجدولة الحرفية داخل النصوص
+        data = json.loads(text, strict=False)
+    except json.JSONDecodeError:
+        return None
+    if isinstance(data, dict) and isinstance(data.get(SCENES_KEY), list):
+        return data[SCENES_KEY]
+    if isinstance(data, list):
+        return data
+    return None
+
+
+def _salvage_scenes(text: str) -> List[Dict]:
+    """استخراج كائنات المشاهد المكتملة من نص JSON مقطوع أو به تعليقات أو فواصل زائدة"""
+    decoder = json.JSONDecoder(strict=False)
+    start = text.find(f'"{SCENES_KEY}"')
+    position = text.find('[', start) + 1 if start >= 0 else 0
+
+    scenes = []
+    while True:
+        position = text.find('{', position)
+        if position < 0:
+            break
+        try:
+            item, end = decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            position += 1
+            continue
+        scene = _normalize_scene(item)
+        if scene:
+            scenes.append(scene)
+            position = end
+        else:
+            # كائن خارجي (مثل الجذر الكامل) أو غير مشهد: البحث داخله
+            position += 1
+    return scenes
+
+
+def _extract_scenes(text: str) -> Tuple[List[Dict], bool]:
+    clean_text = CODE_FENCE.sub('', (text or '').strip())
+
+    items = _strict_scenes(clean_text)
+    strict = items is not None
+    if strict:
+        scenes = [scene for scene in map(_normalize_scene, items) if scene]
+    else:
+        scenes = _salvage_scenes(clean_text)
+
+    # ترقيم متسلسل حتى مع المشاهد المحذوفة أو الأرقام المكررة
+    for number, scene in enumerate(scenes, start=1):
+        scene['scene_number'] = number
+    return scenes, strict
+
+
+def has_scenes(text: str) -> bool:
+    """هل تحتوي الاستجابة على مشهد صالح واحد على الأقل (دون تسجيل في المقاييس)"""
+    return bool(_extract_scenes(text)[0])
+
+
+def parse_scenes(text: str) -> Tuple[List[Dict], bool]:
+    """تحليل مشاهد لوحة القصة: (المشاهد، هل كانت الاستجابة JSON سليماً)"""
+    scenes, strict = _extract_scenes(text)
+    result = 'failed' if not scenes else ('strict' if strict else 'salvaged')
+    SCENE_PARSE_RESULTS.labels(result=result).inc()
+    if result == 'salvaged':
+        logging.warning(f"Salvaged {len(scenes)} scenes from malformed storyboard JSON")
+    return scenes, strict
@@ -0,0 +1,71 @@
+import json
+import logging
+import re
+from typing import Any, Dict
+
+from prometheus_client import Counter
+
+
+# أقسام الاستجابة المدمجة والمهام التي تملأ نتائجها
+FUSED_SEO_SECTIONS = {'keywords': 5, 'description': 6, 'title': 7}
+
+FUSED_SEO_SCHEMA: Dict[str, Any] = {
+    'type': 'OBJECT',
+    'properties': {name: {'type': 'STRING'} for name in FUSED_SEO_SECTIONS},
+    'required': list(FUSED_SEO_SECTIONS)
+}
+
+CODE_FENCE = re.compile(r'^\s*```(?:json)?\s*|\s*```\s*$', re.IGNORECASE)
+SECTION_LABEL = re.compile(
+    r'^[\s#*"]*(keywords|description|title)[\s*"]*[:：][\s*]*',
+    re.IGNORECASE | re.MULTILINE
+)
+
+FUSED_SEO_RESULTS = Counter(
+    'seo_fused_results_total',
+    'Fused SEO responses by number of usable sections',
+    ['result']
+)
+
+
+def _json_sections(text: str) -> Dict[str, Any]:
+    start = text.find('{')
+    if start < 0:
+        return {}
+    try:
+        data, _ = json.JSONDecoder().raw_decode(text, start)
+    except json.JSONDecodeError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _labelled_sections(text: str) -> Dict[str, str]:
+    """أقسام بعناوين نصية (keywords: ... description: ...) عند عدم الالتزام بـ JSON"""
+    matches = list(SECTION_LABEL.finditer(text))
+    sections = {}
+    for index, match in enumerate(matches):
+        end = matches[index + 1].start() if index + 1 < len(matches) else len(text)
+        sections[match.group(1).lower()] = text[match.end():end].strip().strip('",')
+    return sections
+
+
+def parse_fused_seo(text: str) -> Dict[str, str]:
+    """أقسام الكلمات المفتاحية والوصف والعنوان الصالحة من الاستجابة المدمجة"""
+    clean_text = CODE_FENCE.sub('', (text or '').strip())
+    raw = _json_sections(clean_text) or _labelled_sections(clean_text)
+
+    sections = {}
+    for name in FUSED_SEO_SECTIONS:
+        value = raw.get(name)
+        if isinstance(value, list):
+            value = ', '.join(str(item) for item in value)
+        if isinstance(value, str) and value.strip():
+            sections[name] = value.strip()
+
+    if len(sections) == len(FUSED_SEO_SECTIONS):
+        result = 'complete'
+    else:
+        result = 'partial' if sections else 'failed'
+        logging.warning(f"Fused SEO response missing sections: {sorted(set(FUSED_SEO_SECTIONS) - set(sections))}")
+    FUSED_SEO_RESULTS.labels(result=result).inc()
+    return sections
@@ -0,0 +1,86 @@
+import re
+from typing import Dict, Optional
+
+
+# معدلات افتراضية تقريبية للكلام العربي والإنجليزي
+DEFAULT_SECONDS_PER_WORD = 0.42
+DEFAULT_SECONDS_PER_CHAR = 0.075
+SPEECH_RATE_KEY_PREFIX = 'speech_rate'
+
+_WORD_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def text_units(text: str) -> Dict[str, int]:
+    """عدد الكلمات والحروف المنطوقة في النص"""
+    words = _WORD_PATTERN.findall(text or '')
+    return {
+        'words': len(words),
+        'chars': sum(len(word) for word in words)
+    }
+
+
+class SpeechDurationEstimator:
+    """تقدير مدة الصوت من النص، معايَر لكل صوت من قياسات المهمة 8 السابقة"""
+
+    def __init__(self, alpha: float = 0.3):
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be in (0, 1]")
+
+        self.alpha = alpha
+        self._rates: Dict[str, Dict[str, float]] = {}
+
+    @staticmethod
+    def key_for(voice_id: str) -> str:
+        """مفتاح Redis لمعدلات الصوت"""
+        return f'{SPEECH_RATE_KEY_PREFIX}:{voice_id}'
+
+    def rates(self, voice_id: str) -> Dict[str, float]:
+        return self._rates.get(voice_id, {
+            'seconds_per_word': DEFAULT_SECONDS_PER_WORD,
+            'seconds_per_char': DEFAULT_SECONDS_PER_CHAR,
+            'samples': 0
+        })
+
+    def is_calibrated(self, voice_id: str) -> bool:
+        return self.rates(voice_id)['samples'] > 0
+
+    def load(self, voice_id: str, data: Optional[Dict]) -> None:
+        """تحميل معدلات محفوظة"""
+        if not data:
+            return
+        try:
+            self._rates[voice_id] = {
+                'seconds_per_word': float(data['seconds_per_word']),
+                'seconds_per_char': float(data['seconds_per_char']),
+                'samples': int(data.get('samples', 1))
+            }
+        except (KeyError, TypeError, ValueError):
+            return
+
+    def estimate(self, voice_id: str, text: str) -> float:
+        """المدة المتوقعة بالثواني (متوسط تقديري الكلمات والحروف)"""
+        units = text_units(text)
+        rates = self.rates(voice_id)
+        by_words = units['words'] * rates['seconds_per_word']
+        by_chars = units['chars'] * rates['seconds_per_char']
+        return round((by_words + by_chars) / 2, 2)
+
+    def observe(self, voice_id: str, text: str, seconds: float) -> Dict[str, float]:
+        """معايرة معدلات الصوت بمدة فعلية"""
+        units = text_units(text)
+        if not units['words'] or seconds <= 0:
+            return self.rates(voice_id)
+
+        current = self.rates(voice_id)
+        word_rate = seconds / units['words']
+        char_rate = seconds / units['chars']
+        if current['samples']:
+            word_rate = self.alpha * word_rate + (1 - self.alpha) * current['seconds_per_word']
+            char_rate = self.alpha * char_rate + (1 - self.alpha) * current['seconds_per_char']
+
+        self._rates[voice_id] = {
+            'seconds_per_word': word_rate,
+            'seconds_per_char': char_rate,
+            'samples': current['samples'] + 1
+        }
+        return self._rates[voice_id]
@@ -81,6 +81,24 @@ const Results = {
         this.displayTaskResult(taskNumber);
     },
 
+    // نص المهمة الجزئي أثناء توليده (يُستبدل بالنتيجة المنسقة عند اكتمالها)
+    streamedText: {},
+
+    appendDelta(taskNumber, delta, reset) {
+        const key = `task${taskNumber}`;
+        if (reset || !(key in this.streamedText)) {
+            this.streamedText[key] = '';
+        }
+        this.streamedText[key] += delta;
+
+        const resultDiv = document.getElementById(`${key}Result`);
+        if (!resultDiv) return;
+
+        resultDiv.style.whiteSpace = 'pre-wrap';
+        resultDiv.textContent = this.streamedText[key];
+        UI.showResults();
+    },
+
     displayTaskResult(taskNumber) {
         const result = this.taskResults[`task${taskNumber}`];
         if (!result) return;
@@ -88,6 +106,9 @@ const Results = {
         const resultDiv = document.getElementById(`task${taskNumber}Result`);
         if (!resultDiv) return;
 
+        delete this.streamedText[`task${taskNumber}`];
+        resultDiv.style.whiteSpace = '';
+
         let content = '';
 
         switch(taskNumber) {
@@ -219,6 +240,10 @@ function setupEventSource() {
                 Results.updateTask(data.task, data.result);
                 UI.updateTaskStatus(data.task, 'completed');
                 break;
+            case 'task_delta':
+                Results.appendDelta(data.task_number, data.content.delta, data.content.reset);
+                UI.updateTaskStatus(data.task_number, 'streaming');
+                break;
             case 'progress':
                 UI.updateProgress(data.task, data.progress);
                 break;
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+from typing import Dict, List, Optional, Callable, Awaitable, Iterable, Any
+
+
+class TaskGraphScheduler:
+    """مجدول المهام وفق رسم التبعيات (DAG)"""
+
+    def __init__(
+            self,
+            prerequisites: Dict[int, List[int]],
+            task_numbers: Iterable[int],
+            max_concurrency: int = 5
+    ):
+        if not isinstance(max_concurrency, int) or max_concurrency < 1:
+            raise ValueError("max_concurrency must be a positive integer")
+
+        self.task_numbers = sorted(set(task_numbers))
+        self.prerequisites = {
+            task_number: list(prerequisites.get(task_number, []))
+            for task_number in self.task_numbers
+        }
+        self._validate_graph()
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._events: Dict[int, asyncio.Event] = {}
+        self._stopped = False
+        self._loop_start: Optional[float] = None
+
+        # نتائج التشغيل
+        self.completed: List[int] = []
+        self.failed: List[int] = []
+        self.skipped: List[int] = []
+        self.timings: Dict[int, Dict[str, float]] = {}
+
+    def _validate_graph(self) -> None:
+        """التحقق من عدم وجود دورات في رسم التبعيات"""
+        visiting, visited = set(), set()
+
+        def visit(task_number: int) -> None:
+            if task_number in visited:
+                return
+            if task_number in visiting:
+                raise ValueError(f"Dependency cycle detected at task {task_number}")
+            visiting.add(task_number)
+            for prereq in self.prerequisites.get(task_number, []):
+                visit(prereq)
+            visiting.discard(task_number)
+            visited.add(task_number)
+
+        for task_number in self.task_numbers:
+            visit(task_number)
+
+    def stop(self) -> None:
+        """إيقاف بدء مهام جديدة (المهام الجارية تكتمل)"""
+        self._stopped = True
+
+    async def run(
+            self,
+            runner: Callable[[int], Awaitable[Optional[bool]]],
+            can_start: Optional[Callable[[int], Awaitable[bool]]] = None,
+            can_continue: Optional[Callable[[int], bool]] = None
+    ) -> Dict[str, Any]:
+        """تشغيل المهام فور اكتمال متطلباتها المسبقة (إرجاع None من المنفذ يعني تخطي المهمة)"""
+        loop = asyncio.get_running_loop()
+        self._loop_start = loop.time()
+        self._events = {task_number: asyncio.Event() for task_number in self.task_numbers}
+
+        async with asyncio.TaskGroup() as tg:
+            for task_number in self.task_numbers:
+                tg.create_task(
+                    self._run_node(task_number, runner, can_start, can_continue),
+                    name=f'task_{task_number}'
+                )
+
+        return self.report()
+
+    async def _run_node(
+            self,
+            task_number: int,
+            runner: Callable[[int], Awaitable[Optional[bool]]],
+            can_start: Optional[Callable[[int], Awaitable[bool]]],
+            can_continue: Optional[Callable[[int], bool]]
+    ) -> None:
+        """تنفيذ عقدة واحدة بعد انتظار متطلباتها"""
+        loop = asyncio.get_running_loop()
+        try:
+            # انتظار انتهاء المتطلبات المسبقة (نجاحاً أو فشلاً)
+            for prereq in self.prerequisites[task_number]:
+                event = self._events.get(prereq)
+                if event:
+                    await event.wait()
+
+            if self._stopped or (can_start and not await can_start(task_number)):
+                self.skipped.append(task_number)
+                logging.warning(f"Skipping task {task_number} due to unmet prerequisites")
+                return
+
+            async with self._semaphore:
+                if self._stopped:
+                    self.skipped.append(task_number)
+                    return
+
+                start = loop.time() - self._loop_start
+                try:
+                    success = await runner(task_number)
+                except Exception as e:
+                    logging.error(f"Unhandled error in task {task_number}: {str(e)}")
+                    success = False
+                end = loop.time() - self._loop_start
+                self.timings[task_number] = {
+                    'start': round(start, 3),
+                    'end': round(end, 3),
+                    'duration': round(end - start, 3)
+                }
+
+            if success is None:
+                self.skipped.append(task_number)
+            elif success:
+                self.completed.append(task_number)
+            else:
+                self.failed.append(task_number)
+                if can_continue and not can_continue(task_number):
+                    logging.error(f"Task chain stopped after task {task_number} failure")
+                    self.stop()
+
+        finally:
+            self._events[task_number].set()
+
+    def critical_path(self) -> Dict[str, Any]:
+        """استخراج المسار الحرج من التوقيتات الفعلية"""
+        return compute_critical_path(self.prerequisites, self.timings)
+
+    def report(self) -> Dict[str, Any]:
+        """تقرير التشغيل"""
+        return {
+            'completed_tasks': list(self.completed),
+            'failed_tasks': list(self.failed),
+            'skipped_tasks': list(self.skipped),
+            'task_timings': {str(k): v for k, v in sorted(self.timings.items())},
+            'critical_path': self.critical_path()
+        }
+
+
+def compute_critical_path(
+        prerequisites: Dict[int, List[int]],
+        timings: Dict[int, Dict[str, float]]
+) -> Dict[str, Any]:
+    """حساب المسار الحرج: سلسلة المهام التي حددت زمن الانتهاء"""
+    if not timings:
+        return {'tasks': [], 'duration': 0.0, 'wall_time': 0.0}
+
+    # البدء من آخر مهمة انتهت ثم الرجوع عبر المتطلب الذي انتهى أخيراً
+    current = max(timings, key=lambda n: timings[n]['end'])
+    path = [current]
+    while True:
+        prereqs = [p for p in prerequisites.get(current, []) if p in timings]
+        if not prereqs:
+            break
+        current = max(prereqs, key=lambda n: timings[n]['end'])
+        path.append(current)
+
+    path.reverse()
+    return {
+        'tasks': path,
+        'duration': round(sum(timings[n]['duration'] for n in path), 3),
+        'wall_time': round(timings[path[-1]]['end'], 3)
+    }
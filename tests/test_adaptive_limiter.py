@@ -0,0 +1,106 @@
+import asyncio
+import random
+import pytest
+from adaptive_limiter import AdaptiveConcurrencyLimiter, is_overload_error
+
+
+class ResourceExhausted(Exception):
+    """محاكاة خطأ 429 من Google"""
+    code = 429
+
+
+def test_limit_grows_while_latency_is_flat():
+    """اختبار الزيادة الجمعية عند استقرار زمن الاستجابة"""
+    limiter = AdaptiveConcurrencyLimiter(name='test_grow', initial_limit=2, max_limit=4)
+
+    for _ in range(20):
+        limiter.on_success(0.1, saturated=True)
+
+    assert limiter.limit == 4
+
+    # لا يرتفع الحد عندما لا يكون مستغلاً بالكامل
+    idle = AdaptiveConcurrencyLimiter(name='test_idle', initial_limit=2)
+    for _ in range(20):
+        idle.on_success(0.1, saturated=False)
+    assert idle.limit == 2
+
+
+def test_overload_and_latency_spike_cut_limit():
+    """اختبار الخفض الضربي عند 429 أو قفزة الزمن"""
+    limiter = AdaptiveConcurrencyLimiter(name='test_cut', initial_limit=8, decrease_cooldown=0)
+
+    async def rejected_call():
+        async with limiter.slot():
+            raise ResourceExhausted("quota exceeded")
+
+    with pytest.raises(ResourceExhausted):
+        asyncio.run(rejected_call())
+    assert limiter.limit == 4
+    assert limiter.in_flight == 0
+
+    for _ in range(5):
+        limiter.on_success(0.1, saturated=False)
+    limiter.on_success(1.0)
+    limiter.on_success(1.0)
+    assert limiter.limit == 4
+    # تكرار القفزة عدداً متتالياً من المرات يخفض الحد
+    limiter.on_success(1.0)
+    assert limiter.limit == 2
+    assert is_overload_error(ResourceExhausted())
+    assert not is_overload_error(ValueError("bad prompt"))
+
+
+def test_waiters_bounded_by_limit():
+    """اختبار أن عدد الاستدعاءات المتزامنة لا يتجاوز الحد"""
+    limiter = AdaptiveConcurrencyLimiter(name='test_bound', initial_limit=2, max_limit=2)
+    peak = {'running': 0, 'max': 0}
+
+    async def call():
+        async with limiter.slot():
+            peak['running'] += 1
+            peak['max'] = max(peak['max'], peak['running'])
+            await asyncio.sleep(0.01)
+            peak['running'] -= 1
+
+    async def run_all():
+        await asyncio.gather(*(call() for _ in range(6)))
+
+    asyncio.run(run_all())
+
+    assert peak['max'] == 2
+    assert limiter.in_flight == 0
+
+
+def test_baselines_kept_per_task_and_recover():
+    """اختبار عدم احتساب المراحل الطويلة قفزات بسبب الاستدعاءات القصيرة لمهمة أخرى"""
+    limiter = AdaptiveConcurrencyLimiter(name='test_keys', initial_limit=8, decrease_cooldown=0)
+
+    for _ in range(5):
+        limiter.on_success(0.5, saturated=False, key='task_10')
+        limiter.on_success(9.0, saturated=False, key='task_2')
+    assert limiter.limit == 8
+
+    # تحول أزمنة المهمة إلى مستوى أعلى ثابت: يلحق المرجع بها ثم يعود الحد للارتفاع
+    for _ in range(40):
+        limiter.on_success(9.0, saturated=False, key='task_10')
+    assert limiter.snapshot()['baseline_latencies']['task_10'] > 4.5
+
+    cut = limiter.limit
+    limiter.on_success(9.0, saturated=True, key='task_10')
+    assert limiter._limit > cut
+
+
+def test_normal_latency_spread_keeps_limit():
+    """اختبار عدم انهيار الحد إلى الأدنى مع تفاوت أزمنة التوليد الطبيعي حسب طول المخرجات"""
+    limiter = AdaptiveConcurrencyLimiter(
+        name='test_spread', initial_limit=4, max_limit=16, decrease_cooldown=0
+    )
+    rng = random.Random(7)
+
+    for _ in range(500):
+        # توزيع لوغاريتمي طبيعي: ربع الاستدعاءات تقريباً أبطأ من الوسيط بـ 1.4 مرة وبعضها بأكثر من 3 مرات
+        limiter.on_success(2.0 * rng.lognormvariate(0, 0.5), saturated=True, key='task_2')
+
+    assert limiter.limit > limiter.min_limit
+    assert limiter.limit >= 4
+    assert 1.5 < limiter.snapshot()['baseline_latencies']['task_2'] < 2.5
@@ -0,0 +1,85 @@
+import asyncio
+from admission_scheduler import AdmissionScheduler
+
+
+async def _admission_order(scheduler, requests):
+    """تسجيل ترتيب قبول الطلبات بعد امتلاء السعة"""
+    order = []
+    blocker = await scheduler.acquire('blocker')
+
+    async def submit(user_id, priority):
+        ticket = await scheduler.acquire(user_id, priority)
+        order.append((user_id, priority))
+        scheduler.release(ticket)
+
+    tasks = [asyncio.create_task(submit(u, p)) for u, p in requests]
+    await asyncio.sleep(0)
+    scheduler.release(blocker)
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_strict_priority_classes():
+    """اختبار تقديم الفئة الأعلى أولاً"""
+    scheduler = AdmissionScheduler(max_active_runs=1)
+    order = asyncio.run(_admission_order(
+        scheduler,
+        [('a', 'low'), ('b', 'normal'), ('c', 'high')]
+    ))
+
+    assert [p for _, p in order] == ['high', 'normal', 'low']
+
+
+def test_fair_queueing_between_users():
+    """اختبار تناوب المستخدمين داخل الفئة نفسها"""
+    scheduler = AdmissionScheduler(max_active_runs=1)
+    order = asyncio.run(_admission_order(
+        scheduler,
+        [('heavy', 'normal')] * 3 + [('light', 'normal')]
+    ))
+
+    assert [u for u, _ in order][:2] == ['heavy', 'light']
+
+
+def test_pressure_holds_admission():
+    """اختبار انتظار التشغيل عند ضغط الموارد بدلاً من رفضه"""
+    pressure = {'high': True}
+
+    async def scenario():
+        scheduler = AdmissionScheduler(
+            max_active_runs=3,
+            pressure_check=lambda: pressure['high'],
+            pressure_poll_interval=0.01
+        )
+        first = await scheduler.acquire('a')
+        waiting = asyncio.create_task(scheduler.acquire('b'))
+        await asyncio.sleep(0.03)
+        held = not waiting.done()
+
+        pressure['high'] = False
+        second = await asyncio.wait_for(waiting, timeout=1)
+        scheduler.release(first)
+        scheduler.release(second)
+        return held, scheduler.snapshot()
+
+    held, snapshot = asyncio.run(scenario())
+
+    assert held
+    assert snapshot['active_runs'] == 0
+
+
+def test_finish_tags_pruned_and_weights_from_env(monkeypatch):
+    """اختبار حذف أوسمة المستخدمين المنتهين وقراءة الأوزان من البيئة"""
+    monkeypatch.setenv('ADMISSION_USER_WEIGHTS', 'vip:2, guest:0.5')
+
+    async def scenario():
+        scheduler = AdmissionScheduler(max_active_runs=1)
+        for user_id in ('a', 'b', 'c'):
+            async with scheduler.slot(user_id):
+                pass
+        return scheduler
+
+    scheduler = asyncio.run(scenario())
+
+    assert scheduler.user_weights == {'vip': 2.0, 'guest': 0.5}
+    assert scheduler._last_finish['normal'] == {}
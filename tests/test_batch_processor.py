@@ -0,0 +1,74 @@
+import asyncio
+from batch_processor import BatchProcessor
+from pipeline_registry import default_pipeline
+
+
+API_KEYS = {
+    'google_api_key': 'google-key-123',
+    'eleven_labs_api_key': 'eleven-key-123',
+    'eleven_labs_voice_id': 'voice-123'
+}
+
+
+class FakeCoreLogic:
+    """منطق أساسي مبسط لتسجيل استدعاءات الدفعة"""
+
+    def __init__(self):
+        self.pipeline = default_pipeline()
+        self.configured = []
+        self.owners = {}
+        self.shared = []
+        self.running = 0
+        self.max_running = 0
+
+    async def register_run_owner(self, process_id, user_id):
+        self.owners[process_id] = user_id
+
+    def create_run(self, process_id, **kwargs):
+        return process_id
+
+    async def configure_apis(self, *keys, process_id=None, validate=True):
+        self.configured.append(process_id)
+
+    def share_api_config(self, source_process_id, process_id):
+        self.shared.append(process_id)
+
+    async def chain_tasks(self, topic, process_id=None, timeout=None):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+
+    async def get_chain_status(self, process_id):
+        if process_id.endswith('-2'):
+            return {'status': 'error', 'error': 'chain resources exhausted'}
+        if process_id.endswith('-1'):
+            return {'completed_tasks': [1, 2, 3], 'failed_tasks': [4]}
+        return {'completed_tasks': list(range(1, 12)), 'failed_tasks': []}
+
+
+def test_batch_shares_setup_and_bounds_concurrency():
+    """اختبار مشاركة التكوين وتحديد التزامن وبث التقدم"""
+    core = FakeCoreLogic()
+    processor = BatchProcessor(core, max_concurrency=2)
+
+    async def collect():
+        return [
+            event async for event in processor.stream(
+                ['أ', 'ب', 'ج', 'د', 'هـ'], API_KEYS, user_id='owner', batch_id='batch'
+            )
+        ]
+
+    events = asyncio.run(collect())
+    types = [event['type'] for event in events]
+
+    assert len(core.configured) == 1
+    assert core.owners == {f'batch-{index}': 'owner' for index in range(5)}
+    assert len(core.shared) == 4
+    assert core.max_running == 2
+    assert types[0] == 'batch_accepted'
+    assert types.count('run_completed') == 3
+    assert types.count('run_failed') == 2
+    assert events[-1] == {**events[-1], 'type': 'batch_completed', 'completed': 3, 'failed': 2}
+    chain_error = next(e for e in events if e.get('process_id') == 'batch-2' and e['type'] == 'run_failed')
+    assert chain_error['error'] == 'chain resources exhausted'
@@ -0,0 +1,69 @@
+import asyncio
+import pytest
+from circuit_breaker import CircuitBreaker, CircuitOpenError, CircuitState
+
+
+async def _failing_call(breaker: CircuitBreaker):
+    async with breaker.guard():
+        raise ConnectionError("upstream unavailable")
+
+
+async def _successful_call(breaker: CircuitBreaker):
+    async with breaker.guard():
+        return 'ok'
+
+
+def test_opens_after_failures_and_fails_fast():
+    """اختبار فتح الدائرة بعد الفشل المتتالي ورفض الاستدعاءات فوراً"""
+    breaker = CircuitBreaker('test:open', failure_threshold=2, recovery_timeout=60)
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            asyncio.run(_failing_call(breaker))
+
+    assert breaker.state == CircuitState.OPEN
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(_successful_call(breaker))
+
+
+def test_half_open_probe_closes_or_reopens():
+    """اختبار الاختبار في الحالة نصف المفتوحة"""
+    breaker = CircuitBreaker('test:probe', failure_threshold=1, recovery_timeout=0)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(_failing_call(breaker))
+    assert breaker.state == CircuitState.HALF_OPEN
+
+    # فشل الاختبار يعيد فتح الدائرة
+    with pytest.raises(ConnectionError):
+        asyncio.run(_failing_call(breaker))
+    assert breaker.snapshot()['last_error'] == 'upstream unavailable'
+
+    assert asyncio.run(_successful_call(breaker)) == 'ok'
+    assert breaker.state == CircuitState.CLOSED
+
+
+class ProviderError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+async def _provider_error_call(breaker: CircuitBreaker, code: int):
+    async with breaker.guard():
+        raise ProviderError(code)
+
+
+def test_caller_errors_do_not_open_circuit():
+    """اختبار تجاهل أخطاء المستدعي (مفتاح غير صالح) واحتساب أخطاء المزود 5xx فقط"""
+    breaker = CircuitBreaker('test:caller', failure_threshold=2, recovery_timeout=60)
+
+    for code in (400, 401, 403, 429, 401):
+        with pytest.raises(ProviderError):
+            asyncio.run(_provider_error_call(breaker, code))
+    assert breaker.state == CircuitState.CLOSED
+
+    for _ in range(2):
+        with pytest.raises(ProviderError):
+            asyncio.run(_provider_error_call(breaker, 503))
+    assert breaker.state == CircuitState.OPEN
@@ -1,6 +1,10 @@
 import pytest
 import asyncio
-from core_logic import AsyncStreamingCoreLogic
+import fnmatch
+from core_logic import (
+    CANCEL_CHANNEL, AsyncStreamingCoreLogic, PipelineRun, RunConflictError, RunOwnershipError, TaskResult,
+    TaskStatus
+)
 import os
 from dotenv import load_dotenv
 
@@ -8,6 +12,87 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+class FakeRedis:
+    """تخزين Redis مبسط في الذاكرة"""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+        self.published = []
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        if ex:
+            self.ttls[key] = ex
+        return True
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    async def expire(self, key, seconds):
+        self.ttls[key] = seconds
+
+    async def hset(self, key, field=None, value=None, mapping=None):
+        values = self.data.setdefault(key, {})
+        if mapping:
+            values.update(mapping)
+        if field is not None:
+            values[field] = value
+
+    async def hget(self, key, field):
+        return self.data.get(key, {}).get(field)
+
+    async def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    async def hkeys(self, key):
+        return list(self.data.get(key, {}))
+
+    async def hdel(self, key, *fields):
+        for field in fields:
+            self.data.get(key, {}).pop(field, None)
+
+    async def xadd(self, key, fields, **kwargs):
+        self.data.setdefault(key, []).append(fields)
+
+    async def publish(self, channel, message):
+        self.published.append((channel, message))
+        return 0
+
+    async def scan_iter(self, match='*'):
+        for key in list(self.data):
+            if fnmatch.fnmatchcase(key, match):
+                yield key
+
+    async def keys(self, pattern):
+        raise AssertionError("KEYS blocks Redis; use scan_iter")
+
+
+class FakeRedisManager:
+    current_service = 'fake'
+
+
+_core = None
+
+
+@pytest.fixture
+def core(tmp_path, monkeypatch):
+    """منطق أساسي واحد بـ Redis وهمي (المقاييس مسجلة على مستوى العملية)"""
+    global _core
+    monkeypatch.chdir(tmp_path)
+    if _core is None:
+        _core = AsyncStreamingCoreLogic(redis_manager=FakeRedisManager())
+    _core.redis = FakeRedis()
+    _core._runs.clear()
+    return _core
+
+
 @pytest.mark.asyncio
 async def test_init_redis():
     """اختبار تهيئة Redis"""
@@ -50,6 +135,251 @@ async def test_task_generation():
     assert len(result['content']) > 0
 
 
+def test_pipeline_runs_are_isolated():
+    """اختبار عزل حالة التشغيلات المتزامنة"""
+    first = PipelineRun(process_id='run-a')
+    second = PipelineRun(process_id='run-b')
+
+    first.results['task1'].set_success('first topic')
+    first.statuses['task1'] = TaskStatus.COMPLETED
+
+    assert second.results['task1'].content is None
+    assert second.statuses['task1'] == TaskStatus.PENDING
+    assert first.key('task_status') == 'run:run-a:task_status'
+    assert PipelineRun.key_for('run-b', 'stream') == second.stream_key
+
+
+def test_concurrent_chains_keep_their_own_run(core, monkeypatch):
+    """اختبار عزل سياق التشغيل بين سلسلتين متزامنتين وانتهاء صلاحية مفاتيح كل منهما"""
+    seen = {}
+
+    async def fake_chain(topic, resume=True, tasks=None):
+        before = core._run.process_id
+        await asyncio.sleep(0.01)
+        await core.redis.set(core._run.key('task_status'), topic)
+        seen[topic] = (before, core._run.process_id)
+
+    monkeypatch.setattr(core, '_run_chain', fake_chain)
+    core.redis.data['run:other:task_status'] = 'x'
+
+    async def run():
+        await asyncio.gather(
+            core.chain_tasks('first', process_id='run-a'),
+            core.chain_tasks('second', process_id='run-b')
+        )
+
+    asyncio.run(run())
+
+    assert seen == {'first': ('run-a', 'run-a'), 'second': ('run-b', 'run-b')}
+    assert core.redis.data['run:run-a:task_status'] == 'first'
+    assert core.redis.data['run:run-b:task_status'] == 'second'
+    assert 'run:run-a:task_status' in core.redis.ttls
+    assert 'run:other:task_status' not in core.redis.ttls
+    assert core._run.process_id == 'default'
+
+
+def test_resume_skips_checkpointed_tasks(core, monkeypatch):
+    """اختبار استئناف تشغيل من نقاط استئناف جزئية دون إعادة المهام المكتملة"""
+    seed = core.create_run('run-resume', topic='topic')
+    with core.use_run(seed):
+        for task_number in (1, 2, 3):
+            result = TaskResult()
+            result.set_success(f'result {task_number}')
+            asyncio.run(core._save_checkpoint(task_number, result))
+        failed = TaskResult()
+        failed.set_error('timeout')
+        asyncio.run(core._save_checkpoint(4, failed))
+    # عامل جديد بلا حالة في الذاكرة يستأنف التشغيل
+    core._runs.clear()
+
+    executed = []
+
+    async def fake_stage(task_number, topic):
+        executed.append(task_number)
+        core._task_statuses[f'task{task_number}'] = TaskStatus.COMPLETED
+        return True
+
+    monkeypatch.setattr(core, '_run_stage', fake_stage)
+    asyncio.run(core.chain_tasks('topic', process_id='run-resume'))
+
+    run = core.get_run('run-resume')
+    status = asyncio.run(core.get_chain_status('run-resume'))
+    assert sorted(executed) == [n for n in core.pipeline.task_numbers if n not in (1, 2, 3)]
+    assert status['resumed_tasks'] == [1, 2, 3]
+    assert run.results['task2'].content == 'result 2'
+    assert 'run:run-resume:checkpoints' in core.redis.ttls
+
+
+def _seed_finished_run(core, process_id, checkpointed, user_id='owner'):
+    """تشغيل منتهٍ بحالة سلسلة ونقاط استئناف للمهام المحددة (كما يراه عامل جديد)"""
+    run = core.create_run(process_id, user_id=user_id, topic='topic')
+    with core.use_run(run):
+        asyncio.run(core._store_chain_status({'topic': 'topic', 'user_id': user_id}))
+        for task_number in checkpointed:
+            result = TaskResult()
+            result.set_success(f'result {task_number}')
+            asyncio.run(core._save_checkpoint(task_number, result))
+    core._runs.clear()
+
+
+def test_dependent_tasks_and_regeneration_plan(core):
+    """اختبار تحديد المهام التابعة والتحقق من توفر نتائج المهام السابقة"""
+    assert core.get_dependent_tasks(5) == [5, 6, 7]
+    assert core.get_dependent_tasks(9) == [9, 10, 11]
+    with pytest.raises(ValueError):
+        core.get_dependent_tasks(42)
+
+    # المهمة 5 اختيارية وتُخطت في التشغيل الأصلي فلا تمنع إعادة توليد المهمة 7
+    _seed_finished_run(core, 'run-plan', checkpointed=(1, 2, 3, 6))
+    with pytest.raises(ValueError, match=r'\[4\]'):
+        asyncio.run(core.prepare_regeneration('run-plan', 7))
+
+    _seed_finished_run(core, 'run-plan', checkpointed=(4,))
+    plan = asyncio.run(core.prepare_regeneration('run-plan', 7))
+    assert plan == {'process_id': 'run-plan', 'topic': 'topic', 'user_id': 'owner', 'tasks': [7]}
+
+    with pytest.raises(ValueError, match='not found'):
+        asyncio.run(core.prepare_regeneration('run-missing', 7))
+
+
+def test_regeneration_runs_after_skipped_optional_upstream(core, monkeypatch):
+    """اختبار تنفيذ المهمة المعاد توليدها رغم تخطي متطلبها الاختياري في التشغيل الأصلي"""
+    _seed_finished_run(core, 'run-regen', checkpointed=(1, 2, 3, 4, 6, 7))
+    executed = []
+
+    async def fake_stage(task_number, topic):
+        executed.append(task_number)
+        core._task_statuses[f'task{task_number}'] = TaskStatus.COMPLETED
+        return True
+
+    monkeypatch.setattr(core, '_run_stage', fake_stage)
+    asyncio.run(core.chain_tasks('topic', process_id='run-regen', tasks=[7]))
+
+    run = core.get_run('run-regen')
+    assert executed == [7]
+    assert run.statuses['task5'] == TaskStatus.SKIPPED
+    assert run.statuses['task6'] == TaskStatus.COMPLETED
+
+
+def test_run_owner_and_cancellation(core, monkeypatch):
+    """اختبار حفظ مالك التشغيل وإلغاء التشغيل الجاري وتنظيف علامة الإلغاء المتبقية"""
+    asyncio.run(core.register_run_owner('run-c', 'owner'))
+    with pytest.raises(RunOwnershipError):
+        asyncio.run(core.register_run_owner('run-c', 'intruder'))
+    assert asyncio.run(core.get_run_owner('run-c')) == 'owner'
+    assert asyncio.run(core.get_run_owner('run-unknown')) is None
+
+    started = []
+
+    async def slow_chain(topic, resume=True, tasks=None):
+        started.append(topic)
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(core, '_run_chain', slow_chain)
+
+    async def cancel_while_running():
+        chain = asyncio.create_task(core.chain_tasks('topic', process_id='run-c'))
+        while not started:
+            await asyncio.sleep(0)
+        delivered = await core.cancel_run('run-c')
+        await chain
+        return delivered
+
+    assert asyncio.run(cancel_while_running())
+    assert core.get_run('run-c').cancel_requested
+    assert asyncio.run(core.get_chain_status('run-c'))['status'] == 'cancelled'
+
+    # تشغيل غير جارٍ هنا: تُنشر العلامة للعمال ثم يزيلها الطلب أو التشغيل التالي
+    assert not asyncio.run(core.cancel_run('run-d'))
+    assert asyncio.run(core.is_cancel_requested('run-d'))
+    assert core.redis.published == [(CANCEL_CHANNEL, 'run-d')]
+    asyncio.run(core.register_run_owner('run-d', 'owner'))
+    assert not asyncio.run(core.is_cancel_requested('run-d'))
+
+    asyncio.run(core.cancel_run('run-d'))
+    monkeypatch.setattr(core, '_run_chain', lambda topic, resume=True, tasks=None: asyncio.sleep(0))
+    asyncio.run(core.chain_tasks('topic', process_id='run-d'))
+    assert not asyncio.run(core.is_cancel_requested('run-d'))
+
+
+def test_chain_error_cleans_only_failing_run(core, monkeypatch):
+    """اختبار أن فشل تشغيل ينظف بياناته ومجلده فقط دون إغلاق اتصالات Redis المشتركة"""
+    closed = []
+
+    class TrackingRedisManager(FakeRedisManager):
+        async def cleanup(self):
+            closed.append(True)
+
+    monkeypatch.setattr(core, 'redis_manager', TrackingRedisManager())
+    failing, other = core.create_run('run-e', topic='topic'), core.create_run('run-f', topic='topic')
+    for run in (failing, other):
+        os.makedirs(f'./temp/{run.process_id}/task_1')
+        core.redis.data[run.key('task_1_result')] = 'result'
+    result = TaskResult()
+    result.set_success('result 1')
+    with core.use_run(failing):
+        asyncio.run(core._save_checkpoint(1, result))
+        chain_status = asyncio.run(core._handle_chain_error(RuntimeError('boom')))
+
+    assert chain_status['status'] == 'error'
+    assert not closed
+    assert not os.path.exists('./temp/run-e')
+    assert os.path.exists('./temp/run-f/task_1')
+    assert failing.key('task_1_result') not in core.redis.data
+    assert core.redis.data[other.key('task_1_result')] == 'result'
+    # نقاط الاستئناف تبقى لإعادة تشغيل المهام الفاشلة فقط
+    assert 'task1' in core.redis.data[failing.key('checkpoints')]
+
+
+def test_stage_retries_only_execution_failures(core, monkeypatch):
+    """اختبار إعادة المرحلة عند فشل تنفيذها فقط وعدم إعادتها عند رفض التحقق من متطلباتها"""
+    pipeline = core.pipeline.copy()
+    pipeline.update(4, max_retries=2, retry_backoff=0)
+    monkeypatch.setattr(core, 'pipeline', pipeline)
+    executions = []
+
+    async def failing_execution(task_number, handler, *args):
+        executions.append(task_number)
+        return False
+
+    async def validate(task_number):
+        return validation_result
+
+    validation_result = True
+    monkeypatch.setattr(core, '_execute_task', failing_execution)
+    monkeypatch.setattr(core, '_validate_task_execution', validate)
+    run = core.create_run('run-g', topic='topic')
+    with core.use_run(run):
+        assert asyncio.run(core._run_stage(4, 'topic')) is False
+        assert executions == [4, 4, 4]
+
+        executions.clear()
+        validation_result = False
+        assert asyncio.run(core._run_stage(4, 'topic')) is False
+        assert executions == []
+
+
+def test_resubmitting_running_run_conflicts(core, monkeypatch):
+    """اختبار رفض سلسلة ثانية على تشغيل جارٍ دون المساس بمهمته"""
+    started = []
+
+    async def slow_chain(topic, resume=True, tasks=None):
+        started.append(topic)
+        await asyncio.sleep(10)
 
+    monkeypatch.setattr(core, '_run_chain', slow_chain)
 
+    async def resubmit_while_running():
+        chain = asyncio.create_task(core.chain_tasks('first', process_id='run-h'))
+        while not started:
+            await asyncio.sleep(0)
+        task = core.get_run('run-h').task
+        with pytest.raises(RunConflictError):
+            await core.chain_tasks('second', process_id='run-h')
+        assert core.get_run('run-h').task is task
+        await core.cancel_run('run-h')
+        return await chain
 
+    assert asyncio.run(resubmit_while_running())['status'] == 'cancelled'
+    assert started == ['first']
+    core.ensure_run_not_active('run-h')
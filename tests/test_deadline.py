@@ -0,0 +1,49 @@
+from deadline import LatencyTracker, RunDeadline, estimate_tail, task_budget, should_skip_optional
+
+
+PREREQUISITES = {
+    2: [1],
+    3: [2],
+    4: [3],
+    5: [1, 2, 4],
+    6: [2, 4, 5],
+    7: [2, 4, 5],
+    8: [4],
+    9: [4, 8],
+    10: [9],
+    11: [8, 10]
+}
+OPTIONAL_TASKS = (3, 5, 10)
+
+
+def _estimate(task_number):
+    return 10.0
+
+
+def test_latency_tracker_ewma():
+    """اختبار تحديث المتوسط المتحرك لأزمنة المهام"""
+    tracker = LatencyTracker(alpha=0.5, defaults={1: 10.0})
+    tracker.observe(1, 20.0)
+
+    assert tracker.estimate(1) == 15.0
+    assert tracker.estimate(2) == tracker.default_latency
+
+
+def test_budget_follows_remaining_path():
+    """اختبار توزيع الوقت المتبقي على أطول مسار"""
+    pending = range(1, 12)
+    tail = estimate_tail(1, PREREQUISITES, pending, _estimate)
+    budget = task_budget(1, 90.0, PREREQUISITES, pending, _estimate)
+
+    assert tail == 80.0  # 1 -> 2 -> 3 -> 4 -> 8 -> 9 -> 10 -> 11
+    assert budget == 11.25
+    assert RunDeadline(60).remaining() <= 60
+
+
+def test_optional_task_skipped_when_budget_short():
+    """اختبار تخطي المهام الاختيارية عند ضيق الوقت"""
+    pending = range(3, 12)
+
+    assert should_skip_optional(3, 40.0, PREREQUISITES, pending, _estimate, OPTIONAL_TASKS)
+    assert not should_skip_optional(3, 80.0, PREREQUISITES, pending, _estimate, OPTIONAL_TASKS)
+    assert not should_skip_optional(4, 1.0, PREREQUISITES, pending, _estimate, OPTIONAL_TASKS)
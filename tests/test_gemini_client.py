@@ -0,0 +1,70 @@
+import asyncio
+import threading
+import time
+from gemini_client import GeminiClient, GeminiModelPool, MODE_THREAD
+from loop_monitor import EventLoopLagMonitor
+
+
+class BlockingModel:
+    """نموذج بواجهة متزامنة فقط كما في google-generativeai"""
+
+    def __init__(self):
+        self.threads = []
+
+    def generate_content(self, prompt, request_options=None):
+        self.threads.append(threading.current_thread().name)
+        time.sleep(0.2)
+        return f'response to {prompt}'
+
+
+class AsyncModel:
+    async def generate_content_async(self, prompt, request_options=None):
+        return {'prompt': prompt, 'options': request_options}
+
+
+def test_sync_model_does_not_block_event_loop():
+    """اختبار أن الاستدعاء المتزامن لا يحجب حلقة الأحداث"""
+    client = GeminiClient(mode=MODE_THREAD, max_workers=2)
+    model = BlockingModel()
+    monitor = EventLoopLagMonitor(interval=0.02)
+
+    async def run():
+        monitor.start()
+        result = await client.generate(model, 'topic')
+        monitor.stop()
+        return result
+
+    assert asyncio.run(run()) == 'response to topic'
+    assert model.threads[0].startswith('gemini')
+    assert monitor.snapshot()['window_max_lag'] < 0.1
+    client.close()
+
+
+def test_native_async_api_preferred():
+    """اختبار تفضيل الواجهة غير المتزامنة عند توفرها"""
+    client = GeminiClient()
+    result = asyncio.run(client.generate(AsyncModel(), 'topic', {'timeout': 5}))
+
+    assert result == {'prompt': 'topic', 'options': {'timeout': 5}}
+    assert client._executor is None
+
+
+def test_model_pool_isolates_keys_with_lru_eviction():
+    """اختبار عزل النماذج لكل مفتاح وإخلاء الأقدم استخداماً"""
+    created = []
+
+    def factory(api_key, model_name):
+        created.append(api_key)
+        return {'api_key': api_key, 'model': model_name}
+
+    pool = GeminiModelPool(max_size=2, factory=factory)
+
+    assert pool.get('key-a')['api_key'] == 'key-a'
+    assert pool.get('key-b')['api_key'] == 'key-b'
+    assert pool.get('key-a') is pool.get('key-a')
+    pool.get('key-c')
+
+    assert len(pool) == 2
+    assert created == ['key-a', 'key-b', 'key-c']
+    pool.get('key-b')
+    assert created[-1] == 'key-b'
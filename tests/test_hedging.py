@@ -0,0 +1,55 @@
+import asyncio
+from hedging import HedgeBudget, RequestHedger
+
+
+def _warm_up(hedger: RequestHedger, key: int, seconds: float = 0.01) -> None:
+    for _ in range(hedger.min_samples):
+        hedger.observe(key, seconds)
+
+
+def test_slow_primary_is_hedged_and_duplicate_wins():
+    """اختبار إرسال طلب مكرر عند تجاوز المئين 90 وأخذ أول نتيجة"""
+    hedger = RequestHedger(min_samples=5, budget=HedgeBudget(ratio=1.0, max_tokens=1))
+    _warm_up(hedger, 1)
+    delays = iter([1.0, 0.0])
+    calls = {'started': 0, 'cancelled': 0}
+
+    async def call():
+        calls['started'] += 1
+        try:
+            await asyncio.sleep(next(delays))
+            return calls['started']
+        except asyncio.CancelledError:
+            calls['cancelled'] += 1
+            raise
+
+    result = asyncio.run(hedger.run(1, call))
+    stats = hedger.snapshot()['tasks']['1']
+
+    assert result == 2
+    assert calls == {'started': 2, 'cancelled': 1}
+    assert stats['hedged'] == 1 and stats['wins'] == 1
+    # زمن الفائز المكرر يُسجل من بدء الطلب الأصلي فلا يقل عن زمن التحوط
+    window = hedger._windows[1]
+    assert len(window) == hedger.min_samples + 1
+    assert window.percentile(1.0) >= hedger.min_delay
+
+
+def test_budget_caps_extra_requests():
+    """اختبار أن الميزانية تحد من الطلبات الإضافية"""
+    hedger = RequestHedger(min_samples=5, budget=HedgeBudget(ratio=0.0))
+    _warm_up(hedger, 2)
+    started = []
+
+    async def call():
+        started.append(1)
+        await asyncio.sleep(0.05)
+        return 'ok'
+
+    assert asyncio.run(hedger.run(2, call)) == 'ok'
+    assert len(started) == 1
+    assert hedger.snapshot()['tasks']['2']['hedge_rate'] == 0.0
+
+    # المهام غير المفعلة لا تُحتسب
+    assert asyncio.run(hedger.run(8, call, enabled=False)) == 'ok'
+    assert '8' not in hedger.snapshot()['tasks']
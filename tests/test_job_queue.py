@@ -0,0 +1,190 @@
+import asyncio
+import pytest
+from redis.exceptions import ResponseError
+from job_queue import (
+    DEAD_LETTER_STREAM_KEY, JobState, PipelineJobQueue, encrypt_job_secrets, decrypt_job_secrets
+)
+
+
+@pytest.fixture(autouse=True)
+def job_encryption_key(monkeypatch):
+    monkeypatch.setenv('JOB_ENCRYPTION_KEY', 'test-job-key')
+
+
+class FakeStreamRedis:
+    """Redis Streams مبسط: مجموعة مستهلكين وقائمة معلقات وساعة يتحكم بها الاختبار"""
+
+    def __init__(self):
+        self.now_ms = 0
+        self.streams = {}
+        self.hashes = {}
+        self.groups = {}
+        self.pending = {}
+        self._sequence = 0
+
+    async def xgroup_create(self, stream, group, id='0', mkstream=False):
+        if (stream, group) in self.groups:
+            raise ResponseError("BUSYGROUP Consumer Group name already exists")
+        self.streams.setdefault(stream, [])
+        self.groups[(stream, group)] = 0
+
+    async def xadd(self, stream, fields, maxlen=None, approximate=True):
+        self._sequence += 1
+        message_id = f'{self._sequence}-0'
+        self.streams.setdefault(stream, []).append((message_id, dict(fields)))
+        return message_id
+
+    async def xreadgroup(self, group, consumer, streams, count=1, block=None):
+        result = []
+        for stream in streams:
+            delivered = self.groups[(stream, group)]
+            messages = self.streams[stream][delivered:delivered + count]
+            self.groups[(stream, group)] = delivered + len(messages)
+            for message_id, _ in messages:
+                self.pending[message_id] = {'consumer': consumer, 'delivered_at': self.now_ms, 'times': 1}
+            if messages:
+                result.append((stream, messages))
+        return result
+
+    def _fields(self, stream, message_id):
+        return next(fields for mid, fields in self.streams[stream] if mid == message_id)
+
+    async def xautoclaim(self, stream, group, consumer, min_idle_time, start_id='0-0', count=10):
+        claimed = []
+        for message_id, entry in list(self.pending.items())[:count]:
+            if self.now_ms - entry['delivered_at'] >= min_idle_time:
+                entry.update(consumer=consumer, delivered_at=self.now_ms, times=entry['times'] + 1)
+                claimed.append((message_id, self._fields(stream, message_id)))
+        return ['0-0', claimed, []]
+
+    async def xclaim(self, stream, group, consumer, min_idle_time, message_ids, justid=False):
+        # JUSTID يجدد الملكية دون زيادة عدد مرات التسليم
+        for message_id in message_ids:
+            if message_id in self.pending:
+                self.pending[message_id].update(consumer=consumer, delivered_at=self.now_ms)
+        return message_ids
+
+    async def xpending_range(self, stream, group, min, max, count):
+        entry = self.pending.get(min)
+        if not entry:
+            return []
+        return [{'message_id': min, 'consumer': entry['consumer'], 'times_delivered': entry['times']}]
+
+    async def xack(self, stream, group, message_id):
+        return 1 if self.pending.pop(message_id, None) else 0
+
+    async def hset(self, key, mapping):
+        self.hashes.setdefault(key, {}).update(mapping)
+
+    async def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+
+def _queue(redis, consumer, idle_ms=1000):
+    return PipelineJobQueue(redis, consumer_name=consumer, claim_idle_ms=idle_ms, max_deliveries=3)
+
+
+def test_job_secrets_roundtrip():
+    """اختبار تشفير مفاتيح API في حمولة الطابور"""
+    secrets = {
+        'google_api_key': 'google-key',
+        'eleven_labs_api_key': 'eleven-key',
+        'eleven_labs_voice_id': 'voice-id'
+    }
+    token = encrypt_job_secrets(secrets)
+
+    assert 'google-key' not in token
+    assert decrypt_job_secrets(token) == secrets
+
+
+def test_encryption_key_required(monkeypatch):
+    """اختبار رفض التشغيل دون مفتاح تشفير الطابور بدلاً من مفتاح افتراضي معروف"""
+    monkeypatch.delenv('JOB_ENCRYPTION_KEY')
+    monkeypatch.setenv('SECRET_KEY', 'app-secret')
+
+    with pytest.raises(ValueError, match='JOB_ENCRYPTION_KEY'):
+        PipelineJobQueue(FakeStreamRedis())
+    with pytest.raises(ValueError):
+        encrypt_job_secrets({'google_api_key': 'google-key'})
+
+
+def test_decode_invalid_payload():
+    """اختبار التعامل مع حمولة غير صالحة"""
+    assert PipelineJobQueue._decode({'payload': 'not-json'}) == {}
+    assert PipelineJobQueue._decode({'payload': '{"process_id": "abc"}'}) == {'process_id': 'abc'}
+
+
+def test_claim_and_ack():
+    """اختبار إدراج التشغيل واستلامه وتأكيده"""
+    redis = FakeStreamRedis()
+    queue = _queue(redis, 'worker-a')
+
+    async def scenario():
+        await queue.ensure_group()
+        await queue.ensure_group()
+        message_id = await queue.enqueue({'process_id': 'run-a', 'topic': 'topic'})
+        state = await queue.get_job_state('run-a')
+        jobs = await queue.claim()
+        deliveries = await queue.delivery_count(message_id)
+        await queue.ack(message_id)
+        return message_id, state, jobs, deliveries
+
+    message_id, state, jobs, deliveries = asyncio.run(scenario())
+
+    assert state['state'] == JobState.QUEUED
+    assert state['message_id'] == message_id
+    assert jobs == [(message_id, {'process_id': 'run-a', 'topic': 'topic'})]
+    assert deliveries == 1
+    assert redis.pending == {}
+    with pytest.raises(ValueError):
+        asyncio.run(queue.enqueue({'topic': 'topic'}))
+
+
+def test_stale_job_reclaimed_unless_heartbeat():
+    """اختبار استعادة تشغيل عامل متوقف وعدم استعادة تشغيل يجدد عامله ملكيته"""
+    redis = FakeStreamRedis()
+    stopped, alive, other = _queue(redis, 'stopped'), _queue(redis, 'alive'), _queue(redis, 'other')
+
+    async def scenario():
+        await stopped.ensure_group()
+        first = await stopped.enqueue({'process_id': 'run-a', 'topic': 'topic'})
+        await stopped.claim()
+        second = await alive.enqueue({'process_id': 'run-b', 'topic': 'topic'})
+        await alive.claim()
+
+        redis.now_ms = 600
+        await alive.heartbeat([second])
+        await alive.heartbeat([])
+        redis.now_ms = 1200
+        reclaimed = await other.reclaim_stale()
+        return first, reclaimed, await other.delivery_count(first)
+
+    first, reclaimed, deliveries = asyncio.run(scenario())
+
+    assert reclaimed == [(first, {'process_id': 'run-a', 'topic': 'topic'})]
+    assert deliveries == 2
+    assert redis.pending[first]['consumer'] == 'other'
+    assert redis.pending['2-0']['consumer'] == 'alive'
+
+
+def test_dead_letter_moves_and_acks():
+    """اختبار نقل التشغيل الفاشل إلى طابور الرسائل الميتة وتأكيده"""
+    redis = FakeStreamRedis()
+    queue = _queue(redis, 'worker-a')
+    job = {'process_id': 'run-a', 'topic': 'topic'}
+
+    async def scenario():
+        await queue.ensure_group()
+        message_id = await queue.enqueue(job)
+        await queue.claim()
+        await queue.dead_letter(message_id, job, 'Exceeded 3 deliveries')
+        return message_id, await queue.get_job_state('run-a')
+
+    message_id, state = asyncio.run(scenario())
+
+    (_, fields), = redis.streams[DEAD_LETTER_STREAM_KEY]
+    assert fields['original_id'] == message_id
+    assert fields['reason'] == 'Exceeded 3 deliveries'
+    assert redis.pending == {}
+    assert state['state'] == JobState.DEAD
+    assert state['error'] == 'Exceeded 3 deliveries'
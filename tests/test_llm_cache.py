@@ -0,0 +1,83 @@
+import asyncio
+from llm_cache import CachedResponse, LLMResponseCache, cache_key
+
+
+class FakeRedis:
+    """تخزين Redis مبسط في الذاكرة"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+
+class Response:
+    def __init__(self, text):
+        self.text = text
+
+
+def test_identical_prompts_generate_once():
+    """اختبار توليد الطلبات المتطابقة المتزامنة مرة واحدة ثم إعادتها من الذاكرة"""
+    redis = FakeRedis()
+    cache = LLMResponseCache(lambda: redis)
+    key = cache_key('models/gemini-1.5-flash', 'prompt', {'temperature': 0.2})
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return Response('generated')
+
+    async def run():
+        first = await asyncio.gather(*(cache.get_or_generate(key, generate) for _ in range(5)))
+        again = await cache.get_or_generate(key, generate)
+        return first, again
+
+    first, again = asyncio.run(run())
+
+    assert len(calls) == 1
+    assert [r.text for r in first] == ['generated'] * 5
+    assert isinstance(again, CachedResponse)
+    assert redis.data[key] == 'generated'
+    assert key != cache_key('models/gemini-1.5-flash', 'prompt', {'temperature': 0.9})
+
+
+def test_l2_hit_and_fresh_generation_bypass():
+    """اختبار القراءة من Redis في عملية أخرى وتجاوز الذاكرة عند إعادة التوليد"""
+    redis = FakeRedis()
+    key = cache_key('gemini', 'prompt')
+    redis.data[key] = 'shared'
+    cache = LLMResponseCache(lambda: redis)
+
+    async def generate():
+        return Response('fresh')
+
+    assert asyncio.run(cache.get_or_generate(key, generate)).text == 'shared'
+    assert asyncio.run(cache.get_or_generate(key, generate, read=False)).text == 'fresh'
+    assert asyncio.run(cache.get(key)) == 'fresh'
+
+
+def test_rejected_response_not_cached():
+    """اختبار عدم تخزين الاستجابة التي ترفضها المهمة (مثل لوحة قصة بلا مشاهد)"""
+    redis = FakeRedis()
+    key = cache_key('gemini', 'storyboard prompt')
+    cache = LLMResponseCache(lambda: redis)
+    texts = iter(['not json', '{"sentiments": []}'])
+
+    async def generate():
+        return Response(next(texts))
+
+    async def run():
+        first = await cache.get_or_generate(key, generate, accept=lambda text: text.startswith('{'))
+        second = await cache.get_or_generate(key, generate, accept=lambda text: text.startswith('{'))
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first.text == 'not json'
+    assert second.text == '{"sentiments": []}'
+    assert redis.data == {key: '{"sentiments": []}'}
@@ -0,0 +1,57 @@
+import pytest
+from pipeline_registry import PipelineRegistry, StageSpec, default_pipeline, fuse_seo_stages
+
+
+def test_default_pipeline_graph():
+    """اختبار بناء رسم التبعيات من تعريفات المراحل"""
+    pipeline = default_pipeline()
+
+    assert pipeline.task_numbers == list(range(1, 12))
+    assert pipeline.prerequisites()[11] == [8, 10]
+    assert pipeline.critical_tasks() == (1, 4)
+    assert pipeline.optional_tasks() == (3, 5, 10)
+    assert pipeline.is_soft_input(8, for_stage=11)
+    assert pipeline.dependents(7) == [7]
+    assert pipeline.dependents(9) == [9, 10, 11]
+    # إعادة المرحلة حسب مزودها: المراحل المحلية وحدها بلا سياسة إعادة لدى المزود
+    assert [s.retries for s in pipeline.stages()] == [0] * 10 + [1]
+    assert pipeline.update(4, max_retries=2).retries == 2
+
+
+def test_reorder_stage_for_experiment():
+    """اختبار تعديل مرحلة دون المساس بالمنطق الأساسي"""
+    pipeline = default_pipeline().copy()
+    pipeline.update(6, inputs=(2, 4))
+
+    assert pipeline.prerequisites()[6] == [2, 4]
+    assert default_pipeline().prerequisites()[6] == [2, 4, 5]
+
+
+def test_invalid_pipeline_rejected():
+    """اختبار رفض الدورات والمدخلات غير المعروفة"""
+    cyclic = PipelineRegistry([
+        StageSpec(1, 'a', 'handler_a', inputs=(2,)),
+        StageSpec(2, 'b', 'handler_b', inputs=(1,))
+    ])
+    with pytest.raises(ValueError):
+        cyclic.validate()
+
+    with pytest.raises(ValueError):
+        PipelineRegistry([StageSpec(1, 'a', 'handler_a', inputs=(5,))]).validate()
+    with pytest.raises(ValueError):
+        StageSpec(1, 'a', 'handler_a', provider='unknown')
+
+
+def test_fused_seo_mode():
+    """اختبار الوضع المدمج للمراحل 5–7 ورفض دمج مرحلة لا تعتمد على المرحلة المدمجة"""
+    pipeline = default_pipeline()
+    fused = fuse_seo_stages(pipeline)
+
+    assert fused.get(5).fuses == (6, 7)
+    assert 5 not in fused.optional_tasks()
+    assert pipeline.get(5).fuses == ()
+    assert fused.prerequisites() == pipeline.prerequisites()
+
+    with pytest.raises(ValueError):
+        fused.update(5, fuses=(9,))
+        fused.validate()
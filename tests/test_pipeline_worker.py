@@ -0,0 +1,108 @@
+import asyncio
+from core_logic import AsyncStreamingCoreLogic
+from job_queue import JobState, encrypt_job_secrets
+from pipeline_registry import default_pipeline
+from pipeline_worker import PipelineWorker
+
+
+class FakeQueue:
+    """طابور مبسط يسجل التأكيد والحالات والرسائل الميتة"""
+
+    def __init__(self, deliveries=1):
+        self.max_deliveries = 3
+        self.deliveries = deliveries
+        self.acked = []
+        self.states = []
+        self.dead = []
+
+    async def delivery_count(self, message_id):
+        return self.deliveries
+
+    async def ack(self, message_id):
+        self.acked.append(message_id)
+
+    async def set_job_state(self, process_id, state, **details):
+        self.states.append(state)
+
+    async def dead_letter(self, message_id, job, reason):
+        self.dead.append((message_id, reason))
+
+
+class FakeRun:
+    cancel_requested = False
+
+    def __init__(self, running=False):
+        self.is_running = running
+
+
+class FakeCoreLogic:
+    """منطق أساسي مبسط يعيد حالة سلسلة محددة"""
+
+    chain_failure = AsyncStreamingCoreLogic.chain_failure
+    ensure_run_not_active = AsyncStreamingCoreLogic.ensure_run_not_active
+
+    def __init__(self, chain_status, running=False):
+        self.pipeline = default_pipeline()
+        self.chain_status = chain_status
+        self.running = running
+        self.chains = []
+
+    async def is_cancel_requested(self, process_id):
+        return False
+
+    def create_run(self, process_id, **kwargs):
+        return FakeRun()
+
+    def get_run(self, process_id):
+        return FakeRun(self.running)
+
+    async def configure_apis(self, *keys, process_id=None, validate=True):
+        pass
+
+    async def chain_tasks(self, topic, process_id=None, tasks=None):
+        self.chains.append(process_id)
+        return self.chain_status
+
+
+def _process(chain_status, deliveries=1, core_logic=None):
+    queue = FakeQueue(deliveries)
+    worker = PipelineWorker(core_logic or FakeCoreLogic(chain_status), queue)
+    job = {
+        'process_id': 'run-a',
+        'topic': 'topic',
+        'secrets': encrypt_job_secrets({
+            'google_api_key': 'google-key',
+            'eleven_labs_api_key': 'eleven-key',
+            'eleven_labs_voice_id': 'voice-id'
+        })
+    }
+    asyncio.run(worker._process_job('1-0', job))
+    return queue
+
+
+def test_failed_run_left_pending_then_dead_lettered(monkeypatch):
+    """اختبار ترك التشغيل الفاشل دون تأكيد لاستعادته ثم نقله للرسائل الميتة"""
+    monkeypatch.setenv('JOB_ENCRYPTION_KEY', 'test-job-key')
+
+    queue = _process({'completed_tasks': [1, 2, 3], 'failed_tasks': [4]})
+    assert queue.acked == []
+    assert queue.states == [JobState.RUNNING, JobState.FAILED]
+
+    queue = _process({'status': 'error', 'error': 'Failed to acquire chain resources'}, deliveries=3)
+    assert queue.dead == [('1-0', 'Failed to acquire chain resources')]
+
+    # فشل مهمة غير حرجة لا يفشل التشغيل
+    queue = _process({'completed_tasks': [1, 2, 3, 4], 'failed_tasks': [6]})
+    assert queue.acked == ['1-0']
+    assert queue.states == [JobState.RUNNING, JobState.COMPLETED]
+
+
+def test_duplicate_delivery_of_running_run_left_alone(monkeypatch):
+    """اختبار عدم بدء سلسلة ثانية لتشغيل جارٍ وعدم تغيير حالته أو تأكيد رسالته"""
+    monkeypatch.setenv('JOB_ENCRYPTION_KEY', 'test-job-key')
+    core_logic = FakeCoreLogic({}, running=True)
+
+    queue = _process({}, core_logic=core_logic)
+
+    assert core_logic.chains == []
+    assert queue.acked == [] and queue.states == [] and queue.dead == []
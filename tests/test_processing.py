@@ -1,6 +1,7 @@
 import pytest
 from fastapi.testclient import TestClient
 from app import app
+from core_logic import RunConflictError, RunOwnershipError
 import os
 from dotenv import load_dotenv
 
@@ -37,4 +38,154 @@ def test_process_request():
     )
 
     assert response.status_code == 202
-    assert "process_id" in response.json()
\ No newline at end of file
+    assert "process_id" in response.json()
+
+API_KEYS = {
+    'google_api_key': 'google-key-123',
+    'eleven_labs_api_key': 'eleven-key-123',
+    'eleven_labs_voice_id': 'voice-123'
+}
+
+
+class PingRedis:
+    async def ping(self):
+        return True
+
+
+class FakeRedisManager:
+    instances = {'local': {'text': PingRedis()}}
+
+
+class FakeCoreLogic:
+    """منطق أساسي مبسط لاختبار نقاط النهاية دون Redis أو مزودين"""
+
+    def __init__(self, owner='testuser'):
+        self.redis = PingRedis()
+        self.owner = owner
+        self.chains = []
+        self.cancelled = []
+        self.running = set()
+
+    async def get_run_owner(self, process_id):
+        return self.owner
+
+    async def register_run_owner(self, process_id, user_id):
+        if self.owner and self.owner != user_id:
+            raise RunOwnershipError(f"Run {process_id} belongs to another user")
+        self.owner = user_id
+
+    async def cancel_run(self, process_id):
+        self.cancelled.append(process_id)
+        return True
+
+    async def prepare_regeneration(self, process_id, task_number):
+        if task_number == 4:
+            raise ValueError("Upstream results missing for tasks [3]")
+        return {'process_id': process_id, 'topic': 'topic', 'user_id': self.owner, 'tasks': [task_number]}
+
+    def ensure_run_not_active(self, process_id):
+        if process_id in self.running:
+            raise RunConflictError(f"Run {process_id} is already in progress")
+
+    def create_run(self, process_id, **kwargs):
+        return process_id
+
+    async def configure_apis(self, *keys, process_id=None, validate=True):
+        pass
+
+    async def chain_tasks(self, topic, process_id=None, timeout=None, tasks=None):
+        self.chains.append((process_id, tasks))
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """عميل اختبار بمستخدم مصادق وخدمات وهمية"""
+    from app import get_current_user, UserInDB
+
+    core = FakeCoreLogic()
+    monkeypatch.setattr(app.state, 'redis_manager', FakeRedisManager(), raising=False)
+    monkeypatch.setattr(app.state, 'core_logic', core, raising=False)
+    monkeypatch.setitem(
+        app.dependency_overrides,
+        get_current_user,
+        lambda: UserInDB(username='testuser', hashed_password='', scopes=['process'])
+    )
+    return core
+
+
+def test_regenerate_endpoint(api):
+    """اختبار إعادة توليد مهمة: القبول والتعارض ورفض غير المالك"""
+    response = client.post('/api/process/run-a/regenerate', json={'task_number': 7, 'api_keys': API_KEYS})
+    assert response.status_code == 202
+    assert response.json()['tasks'] == [7]
+    assert api.chains == [('run-a', [7])]
+
+    response = client.post('/api/process/run-a/regenerate', json={'task_number': 4, 'api_keys': API_KEYS})
+    assert response.status_code == 409
+
+    api.owner = 'someone-else'
+    response = client.post('/api/process/run-a/regenerate', json={'task_number': 7, 'api_keys': API_KEYS})
+    assert response.status_code == 403
+    assert len(api.chains) == 1
+
+
+def test_cancel_endpoint_checks_owner(api):
+    """اختبار رفض إلغاء تشغيل مستخدم آخر أو تشغيل غير معروف"""
+    api.owner = None
+    assert client.post('/api/cancel', json={'process_id': 'run-a'}).status_code == 404
+
+    api.owner = 'someone-else'
+    assert client.post('/api/cancel', json={'process_id': 'run-a'}).status_code == 403
+    assert api.cancelled == []
+
+    api.owner = 'testuser'
+    response = client.post('/api/cancel', json={'task_id': 'run-a'})
+    assert response.status_code == 202
+    assert response.json()['status'] == 'cancelling'
+    assert api.cancelled == ['run-a']
+
+
+def test_process_rejects_process_id_of_another_user(api):
+    """اختبار رفض بدء تشغيل بمعرف يملكه مستخدم آخر"""
+    api.owner = 'someone-else'
+    response = client.post(
+        '/api/process',
+        headers={'request-id': 'run-a'},
+        json={'topic': 'قصة تاريخية', 'api_keys': API_KEYS, 'audio_options': None}
+    )
+    assert response.status_code == 403
+    assert api.owner == 'someone-else'
+
+
+def test_resubmitting_running_process_conflicts(api):
+    """اختبار رفض إعادة إرسال أو إعادة توليد تشغيل ما زال قيد التنفيذ"""
+    api.running.add('run-a')
+    response = client.post(
+        '/api/process',
+        headers={'request-id': 'run-a'},
+        json={'topic': 'قصة تاريخية', 'api_keys': API_KEYS, 'audio_options': None}
+    )
+    assert response.status_code == 409
+
+    response = client.post('/api/process/run-a/regenerate', json={'task_number': 7, 'api_keys': API_KEYS})
+    assert response.status_code == 409
+    assert api.chains == []
+
+
+def test_enqueue_rejects_queued_process_id(api, monkeypatch):
+    """اختبار رفض إدراج تشغيل ما زال في الطابور أو قيد التنفيذ لدى عامل"""
+    import app as app_module
+
+    class FakeJobQueue:
+        async def get_job_state(self, process_id):
+            return {'state': 'running'} if process_id == 'run-a' else {}
+
+    monkeypatch.setattr(app_module, 'PIPELINE_EXECUTION_MODE', 'queue')
+    monkeypatch.setattr(app.state, 'job_queue', FakeJobQueue(), raising=False)
+    response = client.post(
+        '/api/process',
+        headers={'request-id': 'run-a'},
+        json={'topic': 'قصة تاريخية', 'api_keys': API_KEYS, 'audio_options': None}
+    )
+    assert response.status_code == 409
+    assert 'running' in response.json()['detail']
@@ -0,0 +1,33 @@
+from prompt_budget import PromptBudgeter, estimate_tokens, normalize_output, truncate_to_tokens
+
+
+def test_estimate_tokens_counts_arabic_denser():
+    """اختبار أن النص العربي يُقدَّر برموز أكثر لكل حرف"""
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('a' * 400) == 100
+    assert estimate_tokens('ب' * 400) == 200
+
+
+def test_upstream_outputs_trimmed_to_budget():
+    """اختبار ضغط المدخلات الكبيرة وإبقاء الصغيرة كاملة ضمن الميزانية"""
+    template = 'Niche: {niche}\nScript: {Script}'
+    script = '\n\n'.join(f'Paragraph {i} ' + 'word ' * 40 for i in range(50))
+    budgeter = PromptBudgeter(default_budget=1000)
+
+    prompt, stats = budgeter.format(template, task='5', niche='**History**', Script=script)
+
+    assert 'Niche: History' in prompt
+    assert 'Paragraph 0 ' in prompt and 'Paragraph 49 ' in prompt
+    assert '[...]' in prompt
+    assert stats['tokens'] <= 1000
+    assert stats['trimmed_tokens'] > 0
+
+
+def test_small_prompt_unchanged():
+    """اختبار عدم تغيير النص الواقع ضمن الميزانية"""
+    prompt, stats = PromptBudgeter(default_budget=1000).format('Topic: {topic}', topic='تاريخ')
+
+    assert prompt == 'Topic: تاريخ'
+    assert stats['trimmed_tokens'] == 0
+    assert normalize_output('a\n\n\n\na\nb') == 'a\n\nb'
+    assert truncate_to_tokens('short', 10) == 'short'
@@ -0,0 +1,86 @@
+import asyncio
+from prompt_cache import PromptPrefixCache, split_template
+
+
+TEMPLATE = 'Write topics about {topic} for {audience}. Example: {"title": "..."}\nMore about {topic}.'
+
+
+class FakeCacheProvider:
+    """مزود محلي يحاكي التخزين لدى Gemini: يحتفظ بالبادئات ويكمل النص باللاحقة"""
+
+    supported = True
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.created = []
+        self.contents = {}
+
+    async def create(self, api_key, model_name, prefix, ttl):
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise RuntimeError('cached content too small')
+        handle = f'cachedContents/{len(self.created)}'
+        self.created.append((api_key, model_name, ttl))
+        self.contents[handle] = prefix
+        return handle
+
+    def bind(self, api_key, model_name, handle):
+        provider = self
+
+        class Model:
+            def complete(self, suffix):
+                return provider.contents[handle] + suffix
+
+        return Model()
+
+
+def test_template_split_into_static_prefix_and_suffix():
+    """اختبار نقل المتغيرات إلى اللاحقة وإبقاء الأقواس الحرفية في البادئة"""
+    layout = split_template('task_1', TEMPLATE)
+
+    assert layout.fields == ['topic', 'audience']
+    assert '{' not in layout.prefix.replace('{"title": "..."}', '')
+    assert '<topic>' in layout.prefix
+    rendered = layout.render(topic='الفضاء', audience='الطلاب')
+    assert rendered.startswith(layout.prefix)
+    assert '<topic>\nالفضاء\n</topic>' in rendered
+    assert split_template('task_1', TEMPLATE).version == layout.version
+
+
+def test_prefix_created_once_per_key_and_version():
+    """اختبار إنشاء مقبض واحد للطلبات المتزامنة وإعادة استخدامه مع النموذج المرتبط"""
+    provider = FakeCacheProvider()
+    cache = PromptPrefixCache(provider, ttl=60, min_tokens=1)
+    layout = split_template('task_1', TEMPLATE)
+
+    async def run():
+        handles = await asyncio.gather(*(cache.get('key', 'models/gemini', layout) for _ in range(5)))
+        other_key = await cache.get('other', 'models/gemini', layout)
+        return handles, other_key
+
+    handles, other_key = asyncio.run(run())
+
+    assert len(set(handles)) == 1
+    assert other_key != handles[0]
+    assert len(provider.created) == 2
+    suffix = layout.suffix.format(topic='x', audience='y')
+    model = cache.model_for('key', 'models/gemini', handles[0])
+    assert model.complete(suffix) == layout.render(topic='x', audience='y')
+
+
+def test_failed_or_small_prefix_falls_back_to_full_prompt():
+    """اختبار الرجوع للنص الكامل عند فشل المزود أو قصر البادئة"""
+    layout = split_template('task_1', TEMPLATE)
+    failing = PromptPrefixCache(FakeCacheProvider(fail=True), ttl=60, min_tokens=1)
+    small = PromptPrefixCache(FakeCacheProvider(), ttl=60, min_tokens=10000)
+
+    async def run():
+        return (
+            await failing.get('key', 'm', layout),
+            await failing.get('key', 'm', layout),
+            await small.get('key', 'm', layout)
+        )
+
+    assert asyncio.run(run()) == (None, None, None)
+    assert failing.provider.created == [] and failing.snapshot()['disabled_prefixes'] == 1
+    assert small.provider.created == []
@@ -0,0 +1,101 @@
+import asyncio
+import pytest
+from quota_limiter import QuotaLimiter, QuotaSpec, QuotaWaitTimeout, quota_key
+
+
+class UnavailableRedis:
+    """عميل Redis يفشل في تنفيذ السكربت"""
+
+    def register_script(self, script):
+        async def run(keys, args):
+            raise ConnectionError("redis down")
+        return run
+
+
+def test_callers_wait_for_permit_instead_of_rejection():
+    """اختبار انتظار الإذن عند نفاد الدفعة"""
+    limiter = QuotaLimiter(lambda: None, quotas={'gemini': QuotaSpec(requests_per_minute=600, burst=2)})
+
+    async def acquire_three():
+        return [await limiter.acquire('gemini', 'key-a') for _ in range(3)]
+
+    waits = asyncio.run(acquire_three())
+
+    assert waits[0] < 0.01 and waits[1] < 0.01
+    assert waits[2] >= 0.09
+    # مفتاح آخر له حصة مستقلة
+    assert asyncio.run(limiter.acquire('gemini', 'key-b')) < 0.01
+
+
+def test_wait_timeout_denies_permit():
+    """اختبار الرفض عند تجاوز مهلة الانتظار"""
+    limiter = QuotaLimiter(lambda: UnavailableRedis(), quotas={'elevenlabs': QuotaSpec(requests_per_minute=1)})
+
+    async def acquire_twice():
+        await limiter.acquire('elevenlabs', 'key-a')
+        await limiter.acquire('elevenlabs', 'key-a', timeout=0.1)
+
+    with pytest.raises(QuotaWaitTimeout):
+        asyncio.run(acquire_twice())
+
+    assert 'key-a' not in quota_key('elevenlabs', 'key-a')
+
+
+class ScriptingRedis:
+    """Redis وهمي ينفذ سكربت GCRA الفعلي بمفسر Lua مع ساعة يتحكم بها الاختبار"""
+
+    def __init__(self, lupa):
+        self.lua = lupa.LuaRuntime()
+        self.data = {}
+        self.ttls = {}
+        self.now_ms = 1_700_000_000_000
+
+    def call(self, command, *args):
+        if command == 'TIME':
+            return self.lua.table(str(self.now_ms // 1000), str(self.now_ms % 1000 * 1000))
+        if command == 'GET':
+            return self.data.get(args[0])
+        if command == 'SET':
+            key, value, _, ttl_ms = args
+            self.data[key] = value
+            self.ttls[key] = ttl_ms
+            return 'OK'
+        raise ValueError(f"Unsupported command {command}")
+
+    def register_script(self, script):
+        function = self.lua.eval('function(redis, KEYS, ARGV) ' + script + ' end')
+        redis_api = self.lua.table_from({'call': self.call})
+
+        async def run(keys, args):
+            reply = function(redis_api, self.lua.table_from(keys), self.lua.table_from([str(a) for a in args]))
+            # يحول Redis أرقام Lua في الرد إلى أعداد صحيحة
+            return [int(value) for value in reply.values()]
+        return run
+
+
+def test_gcra_script_shared_between_workers():
+    """اختبار سكربت GCRA: دفعة مسموحة ثم انتظار بالفاصل، والحصة مشتركة بين العمال"""
+    lupa = pytest.importorskip('lupa')
+    redis = ScriptingRedis(lupa)
+    quotas = {'gemini': QuotaSpec(requests_per_minute=60, burst=2)}
+    first_worker = QuotaLimiter(lambda: redis, quotas=quotas)
+    second_worker = QuotaLimiter(lambda: redis, quotas=quotas)
+
+    async def scenario():
+        await first_worker.acquire('gemini', 'key-a', timeout=0)
+        await second_worker.acquire('gemini', 'key-a', timeout=0)
+        with pytest.raises(QuotaWaitTimeout):
+            await second_worker.acquire('gemini', 'key-a', timeout=0.5)
+
+        # بعد فاصل طلب واحد (ثانية) يتوفر إذن واحد فقط
+        redis.now_ms += 1000
+        await first_worker.acquire('gemini', 'key-a', timeout=0)
+        with pytest.raises(QuotaWaitTimeout):
+            await first_worker.acquire('gemini', 'key-a', timeout=0.5)
+
+    asyncio.run(scenario())
+
+    key = quota_key('gemini', 'key-a')
+    assert float(redis.data[key]) == redis.now_ms + 2000
+    assert redis.ttls[key] == 3000
+    assert not first_worker._local_tat
@@ -0,0 +1,66 @@
+import asyncio
+import pytest
+from circuit_breaker import CircuitOpenError
+from retry_policy import ProviderHTTPError, RetryBudget, RetryPolicy, is_retryable_error, parse_retry_after
+
+
+def _flaky(errors):
+    calls = {'count': 0}
+
+    async def call():
+        calls['count'] += 1
+        if errors:
+            raise errors.pop(0)
+        return 'ok'
+
+    return call, calls
+
+
+def test_retries_transient_errors_and_honours_retry_after():
+    """اختبار إعادة الأخطاء العابرة واحترام Retry-After مع التشويش"""
+    policy = RetryPolicy(max_attempts=3, base_delay=0.01)
+    call, calls = _flaky([ProviderHTTPError(503, "unavailable"), ConnectionError("reset")])
+
+    assert asyncio.run(policy.call(call)) == 'ok'
+    assert calls['count'] == 3
+
+    throttled = ProviderHTTPError(429, "slow down", retry_after='2')
+    assert 2.0 <= policy.backoff(0, throttled) <= 2.01
+    assert all(0 <= policy.backoff(3) <= 0.08 for _ in range(20))
+    assert parse_retry_after('not a date') is None
+
+
+def test_non_retryable_errors_fail_immediately():
+    """اختبار عدم إعادة الأخطاء النهائية أو الدائرة المفتوحة"""
+    policy = RetryPolicy(max_attempts=5, base_delay=0.01)
+
+    for error in (ProviderHTTPError(401, "bad key"), CircuitOpenError('elevenlabs:tts', 10)):
+        call, calls = _flaky([error])
+        with pytest.raises(type(error)):
+            asyncio.run(policy.call(call))
+        assert calls['count'] == 1
+
+    assert is_retryable_error(ProviderHTTPError(429, "quota"))
+
+
+def test_budget_and_deadline_stop_retries():
+    """اختبار توقف المحاولات عند نفاد الميزانية أو اقتراب الموعد النهائي"""
+    policy = RetryPolicy(max_attempts=5, base_delay=0.01, budget=RetryBudget(ratio=0.0, max_tokens=1))
+    call, calls = _flaky([ConnectionError("a"), ConnectionError("b"), ConnectionError("c")])
+    with pytest.raises(ConnectionError):
+        asyncio.run(policy.call(call))
+    assert calls['count'] == 2
+
+    late = RetryPolicy(max_attempts=5, base_delay=10, deadline=lambda: 0.001)
+    call, calls = _flaky([ConnectionError("a")])
+    with pytest.raises(ConnectionError):
+        asyncio.run(late.call(call))
+    assert calls['count'] == 1
+
+    # إعادة المحاولة على نتيجة فاشلة
+    results = iter([False, True])
+
+    async def stage():
+        return next(results)
+
+    assert asyncio.run(RetryPolicy(base_delay=0.01).call(stage, retry_result=lambda ok: ok is False))
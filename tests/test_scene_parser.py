@@ -0,0 +1,61 @@
+import json
+from scene_parser import STORYBOARD_SCHEMA, parse_scenes
+
+
+def scene(number):
+    return {
+        'scene_number': number,
+        'prompt': f'مشهد {number}',
+        'emotion': 'ترقب',
+        'scene_description': f'وصف المشهد {number}'
+    }
+
+
+def test_valid_json_with_code_fence():
+    """اختبار تحليل JSON سليم داخل كتلة Markdown"""
+    text = '```json\n' + json.dumps({'sentiments': [scene(1), scene(2)]}, ensure_ascii=False) + '\n```'
+
+    scenes, strict = parse_scenes(text)
+
+    assert strict
+    assert [s['scene_number'] for s in scenes] == [1, 2]
+    assert scenes[1]['scene_description'] == 'وصف المشهد 2'
+
+
+def test_truncated_and_commented_output_salvaged():
+    """اختبار استخلاص المشاهد المكتملة من استجابة مقطوعة وبها تعليقات وفواصل زائدة"""
+    text = (
+        'Here is the storyboard:\n{\n  "sentiments": [\n'
+        + json.dumps(scene(1), ensure_ascii=False) + ',\n'
+        + '    // ... المشاهد الإضافية\n'
+        + json.dumps(scene(3), ensure_ascii=False) + ',,\n'
+        + '    {"scene_number": 4, "prompt": "مشهد مقطوع", "scene_des'
+    )
+
+    scenes, strict = parse_scenes(text)
+
+    assert not strict
+    assert [s['prompt'] for s in scenes] == ['مشهد 1', 'مشهد 3']
+    assert [s['scene_number'] for s in scenes] == [1, 2]
+
+
+def test_literal_newlines_inside_strings_kept():
+    """اختبار قبول الأسطر الجديدة ومسافات الجدولة الحرفية داخل حقول المشهد"""
+    # إدراج السطر الجديد بعد json.dumps يجعله حرفياً داخل النص كما يرسله النموذج أحياناً
+    first = json.dumps(scene(1), ensure_ascii=False).replace('مشهد 1', 'مشهد\n1\tليلي')
+    strict_text = '{"sentiments": [' + first + ', ' + json.dumps(scene(2), ensure_ascii=False) + ']}'
+    truncated_text = strict_text[:-2] + ', {"prompt": "مقطوع'
+
+    for text in (strict_text, truncated_text):
+        scenes, _ = parse_scenes(text)
+        assert len(scenes) == 2
+        assert scenes[0]['prompt'] == 'مشهد\n1\tليلي'
+
+
+def test_unusable_output_and_schema_shape():
+    """اختبار رفض الاستجابة بلا مشاهد صالحة وتوافق المخطط مع بنية المشاهد"""
+    assert parse_scenes('لا يوجد JSON هنا') == ([], False)
+    assert parse_scenes('{"sentiments": [{"emotion": "فرح"}]}') == ([], True)
+
+    item = STORYBOARD_SCHEMA['properties']['sentiments']['items']
+    assert set(item['required']) == set(scene(1))
@@ -0,0 +1,28 @@
+import json
+from seo_fusion import parse_fused_seo
+
+
+def test_json_sections_parsed():
+    """اختبار تحليل الأقسام الثلاثة من استجابة JSON داخل كتلة Markdown"""
+    text = '```json\n' + json.dumps({
+        'keywords': ['تاريخ مصر', 'أسرار الفراعنة'],
+        'description': 'وصف الفيديو',
+        'title': 'عنوان 🔥'
+    }, ensure_ascii=False) + '\n```'
+
+    assert parse_fused_seo(text) == {
+        'keywords': 'تاريخ مصر, أسرار الفراعنة',
+        'description': 'وصف الفيديو',
+        'title': 'عنوان 🔥'
+    }
+
+
+def test_labelled_sections_and_missing_parts():
+    """اختبار الأقسام بعناوين نصية وإسقاط الأقسام الفارغة أو المفقودة"""
+    text = '**Keywords:** كلمة، كلمة أخرى\n\n**Description:** سطر أول\nسطر ثانٍ\n\nTitle: '
+
+    assert parse_fused_seo(text) == {
+        'keywords': 'كلمة، كلمة أخرى',
+        'description': 'سطر أول\nسطر ثانٍ'
+    }
+    assert parse_fused_seo('') == {}
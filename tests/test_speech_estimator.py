@@ -0,0 +1,24 @@
+from speech_estimator import SpeechDurationEstimator, text_units
+
+
+SCRIPT = "هذا نص قصير لتجربة تقدير مدة الكلام قبل توليد الصوت"
+
+
+def test_text_units_counts_arabic_words():
+    """اختبار عد الكلمات والحروف العربية"""
+    units = text_units(SCRIPT)
+
+    assert units['words'] == 10
+    assert units['chars'] == len(SCRIPT.replace(' ', ''))
+
+
+def test_calibration_per_voice():
+    """اختبار معايرة التقدير لكل صوت على حدة"""
+    estimator = SpeechDurationEstimator()
+    default_estimate = estimator.estimate('voice_a', SCRIPT)
+
+    estimator.observe('voice_a', SCRIPT, 8.0)
+
+    assert estimator.is_calibrated('voice_a')
+    assert estimator.estimate('voice_a', SCRIPT) == 8.0
+    assert estimator.estimate('voice_b', SCRIPT) == default_estimate
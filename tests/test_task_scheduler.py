@@ -0,0 +1,66 @@
+import asyncio
+from task_scheduler import TaskGraphScheduler, compute_critical_path
+
+
+PREREQUISITES = {
+    2: [1],
+    3: [2],
+    4: [3],
+    5: [1, 2, 4],
+    6: [2, 4, 5],
+    7: [2, 4, 5],
+    8: [4],
+    9: [4, 8],
+    10: [9],
+    11: [8, 10]
+}
+
+
+def test_independent_tasks_overlap():
+    """اختبار تشغيل المهام المستقلة بالتوازي"""
+    running = set()
+    overlaps = []
+
+    async def runner(task_number):
+        running.add(task_number)
+        if {6, 7} <= running or {5, 8} <= running:
+            overlaps.append(set(running))
+        await asyncio.sleep(0.01)
+        running.discard(task_number)
+        return True
+
+    scheduler = TaskGraphScheduler(PREREQUISITES, range(1, 12), max_concurrency=5)
+    report = asyncio.run(scheduler.run(runner))
+
+    assert sorted(report['completed_tasks']) == list(range(1, 12))
+    assert overlaps
+    assert report['critical_path']['tasks'][0] == 1
+
+
+def test_critical_failure_skips_dependents():
+    """اختبار تخطي المهام التابعة عند فشل مهمة حرجة"""
+    async def runner(task_number):
+        return task_number != 4
+
+    scheduler = TaskGraphScheduler(PREREQUISITES, range(1, 12))
+    report = asyncio.run(scheduler.run(runner, can_continue=lambda n: n not in [1, 4]))
+
+    assert report['completed_tasks'] == [1, 2, 3]
+    assert report['failed_tasks'] == [4]
+    assert sorted(report['skipped_tasks']) == list(range(5, 12))
+
+
+def test_compute_critical_path():
+    """اختبار حساب المسار الحرج"""
+    timings = {
+        1: {'start': 0.0, 'end': 1.0, 'duration': 1.0},
+        2: {'start': 1.0, 'end': 2.0, 'duration': 1.0},
+        3: {'start': 1.0, 'end': 5.0, 'duration': 4.0},
+        4: {'start': 5.0, 'end': 6.0, 'duration': 1.0}
+    }
+    path = compute_critical_path({2: [1], 3: [1], 4: [2, 3]}, timings)
+
+    assert path['tasks'] == [1, 3, 4]
+    assert path['duration'] == 6.0
+    assert path['wall_time'] == 6.0
+    assert compute_critical_path({2: [1]}, {}) == {'tasks': [], 'duration': 0.0, 'wall_time': 0.0}
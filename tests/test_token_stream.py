@@ -0,0 +1,61 @@
+import asyncio
+from gemini_client import GeminiClient
+from token_stream import DeltaCoalescer
+
+
+class Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class StreamingResponse:
+    """استجابة متدفقة تكشف النص الكامل بعد استهلاك الأجزاء"""
+
+    def __init__(self, parts):
+        self.parts = parts
+
+    async def __aiter__(self):
+        for part in self.parts:
+            await asyncio.sleep(0)
+            yield Chunk(part)
+
+    @property
+    def text(self):
+        return ''.join(self.parts)
+
+
+class StreamingModel:
+    async def generate_content_async(self, prompt, stream=False, request_options=None):
+        assert stream
+        return StreamingResponse(['مرحبا', ' ', 'بالعالم'])
+
+
+def test_chunks_coalesced_into_deltas():
+    """اختبار تجميع الأجزاء في دفعات مع علامة البداية في أولها فقط"""
+    published = []
+
+    async def publish(delta, reset):
+        published.append((delta, reset))
+
+    async def run():
+        coalescer = DeltaCoalescer(publish, interval=60, max_chars=10)
+        for part in ['abc', 'def', 'ghij', 'k', None, 'l']:
+            await coalescer.add(part)
+        await coalescer.flush()
+
+    asyncio.run(run())
+
+    assert published == [('abcdefghij', True), ('kl', False)]
+
+
+def test_stream_forwards_text_and_returns_full_response():
+    """اختبار تمرير الأجزاء وإعادة الاستجابة المكتملة"""
+    received = []
+
+    async def on_text(text):
+        received.append(text)
+
+    response = asyncio.run(GeminiClient().generate_stream(StreamingModel(), 'topic', on_text))
+
+    assert received == ['مرحبا', ' ', 'بالعالم']
+    assert response.text == 'مرحبا بالعالم'
@@ -0,0 +1,75 @@
+import asyncio
+from topic_similarity import MinHasher, TopicSimilarityIndex, jaccard, normalize_arabic, topic_id, topic_shingles
+
+
+class FakeRedis:
+    """تخزين Redis مبسط للمفاتيح والمجموعات"""
+
+    def __init__(self):
+        self.data = {}
+        self.sets = {}
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    async def get(self, key):
+        return self.data.get(key)
+
+    async def sadd(self, key, member):
+        self.sets.setdefault(key, set()).add(member)
+
+    async def smembers(self, key):
+        return self.sets.get(key, set())
+
+    async def expire(self, key, ttl):
+        return True
+
+
+def test_arabic_normalization():
+    """اختبار توحيد التشكيل والتطويل وأشكال الألف والهمزة وترتيب الكلمات"""
+    assert normalize_arabic('القُضَاةُ فـــي الإسلامِ') == 'القضاه في الاسلام'
+    assert normalize_arabic('أمير المؤمنين') == normalize_arabic('امير المومنين')
+    assert topic_id('قصص الخلفاء الراشدين') == topic_id('الراشدين قِصَص الخُلَفَاء')
+
+
+def test_near_duplicate_topic_reuses_result():
+    """اختبار إيجاد موضوع سابق مشابه وإهمال المواضيع المختلفة"""
+    redis = FakeRedis()
+    index = TopicSimilarityIndex(lambda: redis, threshold=0.8)
+
+    async def run():
+        await index.add('قصص القضاة في الإسلام', 'نتيجة القضاة')
+        await index.add('حياة البدو في الصحراء', 'نتيجة البدو')
+        return (
+            await index.find('قِصَص القُضاة فـي الاسلام'),
+            await index.find('الإسلام قصص القضاة في'),
+            await index.find('تاريخ الخلفاء العباسيين')
+        )
+
+    diacritics, reordered, unrelated = asyncio.run(run())
+
+    assert diacritics['result'] == 'نتيجة القضاة'
+    assert reordered['similarity'] == 1.0
+    assert unrelated is None
+
+
+def test_different_era_not_reused():
+    """اختبار رفض موضوع يختلف بكلمة جوهرية رغم تجاوز تقدير MinHash للعتبة"""
+    abbasid = 'أشهر القضاة في العصر العباسي وقصصهم العجيبة'
+    umayyad = 'أشهر القضاة في العصر الأموي وقصصهم العجيبة'
+    redis = FakeRedis()
+    index = TopicSimilarityIndex(lambda: redis, threshold=0.8)
+
+    estimate = MinHasher.similarity(index.signature(abbasid), index.signature(umayyad))
+    assert estimate >= 0.8
+    assert jaccard(topic_shingles(abbasid), topic_shingles(umayyad)) < 0.8
+
+    async def run():
+        await index.add(abbasid, 'مواضيع العصر العباسي')
+        return await index.find(umayyad), await index.find('العجيبة وقصصهم العباسي العصر في القضاة أشهر')
+
+    different, same = asyncio.run(run())
+
+    assert different is None
+    assert same['result'] == 'مواضيع العصر العباسي'
+
@@ -0,0 +1,69 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+from prometheus_client import Counter
+
+
+STREAM_DELTAS = Counter(
+    'token_stream_deltas_total',
+    'Coalesced partial-output deltas published to run streams'
+)
+STREAM_CHUNKS = Counter(
+    'token_stream_chunks_total',
+    'Partial-output chunks received from the model'
+)
+
+
+class DeltaCoalescer:
+    """تجميع أجزاء النص المتدفقة في دفعات زمنية صغيرة قبل نشرها"""
+
+    def __init__(
+            self,
+            publish: Callable[[str, bool], Awaitable[None]],
+            interval: float = 0.25,
+            max_chars: int = 1024
+    ):
+        self._publish = publish
+        self.interval = interval
+        self.max_chars = max_chars
+
+        self._buffer: list = []
+        self._buffered_chars = 0
+        self._last_flush = time.monotonic()
+        # أول دفعة تُعلم المشترك ببدء محاولة جديدة (يمسح ما عرضه من محاولة سابقة)
+        self._reset = True
+        self._lock = asyncio.Lock()
+        self.published = 0
+
+    async def add(self, text: Optional[str]) -> None:
+        """إضافة جزء ونشر الدفعة عند انقضاء الفترة أو امتلاء الحجم"""
+        if not text:
+            return
+        STREAM_CHUNKS.inc()
+        self._buffer.append(text)
+        self._buffered_chars += len(text)
+
+        if (self._buffered_chars >= self.max_chars
+                or time.monotonic() - self._last_flush >= self.interval):
+            await self.flush()
+
+    async def flush(self) -> None:
+        """نشر ما تبقى في المخزن المؤقت (فشل النشر لا يوقف التوليد)"""
+        async with self._lock:
+            if not self._buffer:
+                return
+            delta = ''.join(self._buffer)
+            reset = self._reset
+            self._buffer = []
+            self._buffered_chars = 0
+            self._last_flush = time.monotonic()
+            self._reset = False
+
+            try:
+                await self._publish(delta, reset)
+                self.published += 1
+                STREAM_DELTAS.inc()
+            except Exception as e:
+                logging.warning(f"Publishing stream delta failed: {str(e)}")
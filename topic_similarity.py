@@ -0,0 +1,208 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from prometheus_client import Counter
+
+
+TOPIC_INDEX_PREFIX = 'topic_index'
+
+# التشكيل وعلامة المد وألف الخنجرية
+ARABIC_DIACRITICS = re.compile(r'[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED]')
+TATWEEL = '\u0640'
+ARABIC_LETTER_VARIANTS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه'
+})
+NON_WORD = re.compile(r'[^\w\s]|_')
+
+# عدد صحيح أولي لتوليد التبديلات (مرسين 61)
+MERSENNE_PRIME = (1 << 61) - 1
+
+TOPIC_MATCHES = Counter(
+    'topic_similarity_lookups_total',
+    'Near-duplicate topic lookups',
+    ['result']
+)
+
+
+def normalize_arabic(text: str) -> str:
+    """توحيد النص العربي: إزالة التشكيل والتطويل وتوحيد الألف والهمزة والياء والتاء المربوطة"""
+    text = ARABIC_DIACRITICS.sub('', text or '').replace(TATWEEL, '')
+    text = text.translate(ARABIC_LETTER_VARIANTS).lower()
+    text = NON_WORD.sub(' ', text)
+    return ' '.join(text.split())
+
+
+def topic_tokens(text: str) -> List[str]:
+    """كلمات الموضوع الموحدة دون أداة التعريف"""
+    tokens = []
+    for token in normalize_arabic(text).split():
+        if token.startswith('ال') and len(token) > 4:
+            token = token[2:]
+        tokens.append(token)
+    return tokens
+
+
+def topic_shingles(text: str, size: int = 3) -> Set[str]:
+    """مقاطع حرفية لكل كلمة (لا تتأثر بترتيب الكلمات وتتحمل اختلاف الصيغ)"""
+    shingles = set()
+    for token in topic_tokens(text):
+        padded = f'#{token}#'
+        if len(padded) <= size:
+            shingles.add(padded)
+            continue
+        shingles.update(padded[i:i + size] for i in range(len(padded) - size + 1))
+    return shingles
+
+
+def jaccard(first: Set[str], second: Set[str]) -> float:
+    """تشابه جاكارد الفعلي بين مجموعتين"""
+    if not first and not second:
+        return 1.0
+    return len(first & second) / len(first | second)
+
+
+def topic_id(text: str) -> str:
+    """معرف ثابت للموضوع بعد التوحيد وترتيب الكلمات"""
+    canonical = ' '.join(sorted(topic_tokens(text)))
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+class MinHasher:
+    """توقيع MinHash ثابت بين العمليات (بذرة ثابتة للتبديلات)"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        generator = random.Random(seed)
+        self.num_perm = num_perm
+        self._permutations = [
+            (generator.randrange(1, MERSENNE_PRIME), generator.randrange(0, MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, shingles: Set[str]) -> List[int]:
+        if not shingles:
+            return [MERSENNE_PRIME] * self.num_perm
+        hashes = [
+            int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), 'big')
+            for s in shingles
+        ]
+        return [
+            min((a * h + b) % MERSENNE_PRIME for h in hashes)
+            for a, b in self._permutations
+        ]
+
+    @staticmethod
+    def similarity(first: List[int], second: List[int]) -> float:
+        """تقدير تشابه جاكارد من نسبة القيم المتطابقة"""
+        if not first or len(first) != len(second):
+            return 0.0
+        return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+
+class TopicSimilarityIndex:
+    """فهرس LSH في Redis للمواضيع السابقة لإعادة استخدام نتائج المواضيع شبه المكررة"""
+
+    def __init__(
+            self,
+            redis_getter: Callable[[], Any],
+            threshold: Optional[float] = None,
+            num_perm: int = 64,
+            bands: int = 16,
+            ttl: Optional[int] = None,
+            exact_threshold: Optional[float] = None
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+
+        self._redis_getter = redis_getter
+        # عتبة تقدير MinHash لاختيار المرشحين فقط
+        self.threshold = threshold or float(os.getenv('TOPIC_SIMILARITY_THRESHOLD', 0.8))
+        # شرط إعادة الاستخدام: نفس الكلمات الموحدة أو تشابه جاكارد فعلي لا يقل عن هذه العتبة
+        self.exact_threshold = exact_threshold or float(os.getenv('TOPIC_EXACT_SIMILARITY', 0.95))
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.ttl = ttl or int(os.getenv('TOPIC_INDEX_TTL', 7 * 24 * 3600))
+        self.hasher = MinHasher(num_perm)
+
+    def signature(self, text: str) -> List[int]:
+        return self.hasher.signature(topic_shingles(text))
+
+    def _band_keys(self, signature: List[int]) -> List[str]:
+        keys = []
+        for band in range(self.bands):
+            rows = signature[band * self.rows:(band + 1) * self.rows]
+            bucket = hashlib.blake2b(repr(rows).encode(), digest_size=8).hexdigest()
+            keys.append(f'{TOPIC_INDEX_PREFIX}:band:{band}:{bucket}')
+        return keys
+
+    async def add(self, topic: str, result: Any) -> Optional[str]:
+        """تسجيل موضوع ونتيجته في الفهرس"""
+        client = self._redis_getter()
+        if client is None:
+            return None
+
+        identifier = topic_id(topic)
+        signature = self.signature(topic)
+        try:
+            await client.set(
+                f'{TOPIC_INDEX_PREFIX}:entry:{identifier}',
+                json.dumps({'topic': topic, 'signature': signature, 'result': result}),
+                ex=self.ttl
+            )
+            for key in self._band_keys(signature):
+                await client.sadd(key, identifier)
+                await client.expire(key, self.ttl)
+            return identifier
+        except Exception as e:
+            logging.warning(f"Topic index write failed: {str(e)}")
+            return None
+
+    def is_same_topic(self, topic: str, other: str) -> bool:
+        """تحقق فعلي بعد تقدير MinHash (العصر الأموي والعصر العباسي يتشابهان تقديرياً بنسبة 0.83)"""
+        if set(topic_tokens(topic)) == set(topic_tokens(other)):
+            return True
+        return jaccard(topic_shingles(topic), topic_shingles(other)) >= self.exact_threshold
+
+    async def find(self, topic: str) -> Optional[Dict]:
+        """أقرب موضوع سابق بتشابه لا يقل عن العتبة"""
+        client = self._redis_getter()
+        if client is None:
+            return None
+
+        shingles = topic_shingles(topic)
+        signature = self.hasher.signature(shingles)
+        try:
+            candidates: Set[str] = set()
+            for key in self._band_keys(signature):
+                members = await client.smembers(key)
+                candidates.update(m.decode() if isinstance(m, bytes) else m for m in members)
+
+            best = None
+            for identifier in candidates:
+                raw = await client.get(f'{TOPIC_INDEX_PREFIX}:entry:{identifier}')
+                if not raw:
+                    continue
+                entry = json.loads(raw)
+                if MinHasher.similarity(signature, entry['signature']) < self.threshold:
+                    continue
+                if not self.is_same_topic(topic, entry['topic']):
+                    continue
+                score = jaccard(shingles, topic_shingles(entry['topic']))
+                if best is None or score > best['similarity']:
+                    best = {
+                        'topic_id': identifier,
+                        'topic': entry['topic'],
+                        'similarity': round(score, 3),
+                        'result': entry['result']
+                    }
+        except Exception as e:
+            logging.warning(f"Topic index lookup failed: {str(e)}")
+            return None
+
+        TOPIC_MATCHES.labels(result='hit' if best else 'miss').inc()
+        return best